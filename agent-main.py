@@ -1,5 +1,12 @@
 # agent_main.py
+import argparse
+import functools
+import json
 import os
+import sys
+import time
+from collections import Counter
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables FIRST
@@ -8,167 +15,653 @@ load_dotenv()
 from langchain_groq import ChatGroq
 from langchain.tools import tool
 from langchain.agents import create_agent
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import AIMessage
 from tools.proxmox_reader import (
     list_all_vms,
     get_vm_config,
+    get_vm_configs,
     list_storage_pools,
     get_cluster_resources,
     get_all_nodes,
-    get_node_vms
+    get_node_vms,
+    get_cache_stats,
+    get_columnar_inventory,
+    get_data_source,
+    get_snapshot_stats,
+    get_inventory_fingerprint,
+    pinned_inventory,
+    get_recent_changes,
+    get_sync_stats,
+    is_sync_running,
+    start_sync,
+    METRICS_INTERVAL,
+    get_metric_store,
+    start_metrics_collection,
+    get_cluster_names,
+    get_cluster_stats,
+    is_federated
 )
+from tools.clusters import PROXMOX_CLUSTER_NAME, left_out_clusters
+from tools.inventory_sync import PROXMOX_SYNC_INTERVAL
+from tools.metrics_store import GUEST_KINDS, KINDS, METRICS, STATS
+from tools.columnar import capacity_report
+from tools.placement import PlacementError, get_placement_model
+from tools.chat_history import ChatHistory
+from tools.router import WRITE_INTENT, IntentRouter, normalize
+from tools.response_cache import ResponseCache
+from tools.streaming import stream_turn
+from tools.rate_limit import TokenUsageCallback, get_groq_limiter
+from tools.telemetry import (
+    TELEMETRY_METRICS_PORT,
+    LLMTelemetryCallback,
+    annotate,
+    debug,
+    enabled as telemetry_enabled,
+    start_metrics_server,
+    summary as telemetry_summary,
+    traced
+)
+from tools.inventory import register_invalidation_hook
+from tools.formatting import TOOL_OUTPUT_MAX_TOKENS, clip_text, format_gib, format_mapping, format_table
+
+# Column layouts shared by the table-producing tools
+VM_COLUMNS = [
+    ("VMID", "vmid"),
+    ("Name", "name"),
+    ("Type", "type"),
+    ("Status", "status"),
+    ("Node", "node"),
+    ("CPUs", "maxcpu"),
+    ("Mem", lambda vm: format_gib(vm.get("maxmem"))),
+]
+VM_CONFIG_COLUMNS = [
+    ("VMID", "vmid"),
+    ("Name", lambda c: c.get("name") or c.get("hostname")),
+    ("Node", "node"),
+    ("Type", "type"),
+    ("Status", "status"),
+    ("Cores", lambda c: c.get("cores", 1)),
+    ("Sockets", lambda c: c.get("sockets", 1)),
+    ("Memory(MB)", "memory"),
+]
+STORAGE_COLUMNS = [
+    ("Storage", "storage"),
+    ("Type", "type"),
+    ("Content", "content"),
+    ("Nodes", "nodes"),
+]
+
+def _by_memory(row):
+    return row.get("maxmem") or 0
+
+def _cluster_layout(rows, columns, group_by):
+    """Adds a Cluster column and grouping when the rows come from several clusters."""
+    if any("cluster" in row for row in rows):
+        return [("Cluster", "cluster")] + columns, ("cluster",) + tuple(group_by)
+    return columns, group_by
+
+def _format_age(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return f"{int(seconds)}s"
+    if minutes < 60:
+        return f"{minutes}m"
+    if minutes < 24 * 60:
+        return f"{minutes // 60}h {minutes % 60}m"
+    return f"{minutes // (24 * 60)}d {minutes // 60 % 24}h"
+
+def _freshness_note(left_out=None):
+    """
+    Warning lines for answers built on a saved snapshot or mock data, or
+    without the clusters in `left_out` ({name: reason}, collected with
+    left_out_clusters() around the reads); '' while everything is live.
+    """
+    source = get_data_source()
+    notes = []
+    if source["source"] == "snapshot":
+        why = "a live refresh is running" if source["refreshing"] else "Proxmox is unreachable"
+        where = f" for cluster '{get_cluster_names()[0]}'" if is_federated() else ""
+        notes.append(f"⚠️ Stale data{where}: snapshot saved {_format_age(time.time() - source['saved'])} ago; {why}.")
+    # Several clusters never serve mock data; an unreachable one is left out instead
+    elif source["source"] == "mock" and not is_federated():
+        notes.append("⚠️ Mock data: Proxmox is unreachable.")
+    for name, reason in (left_out or {}).items():
+        notes.append(f"⚠️ Partial results: cluster '{name}' did not answer ({reason}).")
+    return "\n".join(notes)
+
+def marks_stale(fn):
+    """
+    Decorator for read tools: appends _freshness_note() to the answer while
+    data is not live or the tool's own reads left clusters out.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with left_out_clusters() as left_out:
+            result = fn(*args, **kwargs)
+        note = _freshness_note(left_out)
+        return f"{result}\n{note}" if note and isinstance(result, str) else result
+    return wrapper
 
 # 1. Define Tools with better error handling
 @tool
-def get_proxmox_vms():
+@traced("tool:get_proxmox_vms")
+@marks_stale
+def get_proxmox_vms(cluster: Optional[str] = None):
     """
     Get a list of all VMs and containers running on the Proxmox cluster.
     Returns VMs with their node assignment and status.
     Use this for questions like 'how many VMs', 'list VMs', 'what VMs exist'.
+    With several clusters, pass `cluster` to list only one of them.
     """
     try:
-        result = list_all_vms()
-        print(f"DEBUG: get_proxmox_vms returned: {result}")
+        result = list_all_vms(cluster=cluster)
         
         if isinstance(result, list):
             if len(result) == 0:
                 return "No VMs or containers found in the cluster."
             
-            # Format nicely
-            vm_summary = f"Found {len(result)} VMs/containers:\n"
-            for vm in result:
-                vm_summary += f"  - {vm.get('name')} (ID: {vm.get('vmid')}, Type: {vm.get('type', 'qemu')}, Status: {vm.get('status')}, Node: {vm.get('node')})\n"
-            return vm_summary
+            columns, group_by = _cluster_layout(result, VM_COLUMNS, ("status", "node", "type"))
+            return format_table(
+                result,
+                columns,
+                title=f"Found {len(result)} VMs/containers:",
+                group_by=group_by,
+                top_key=_by_memory,
+                top_label="allocated memory"
+            )
         
         return str(result)
     except Exception as e:
-        print(f"DEBUG: get_proxmox_vms exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("get_proxmox_vms exception: %s: %s", type(e).__name__, e)
         return f"Error fetching VMs: {str(e)}"
 
 @tool
-def get_proxmox_cluster_info():
+@traced("tool:get_proxmox_cluster_info")
+@marks_stale
+def get_proxmox_cluster_info(cluster: Optional[str] = None):
     """
     Get detailed cluster information including all nodes, VMs, containers, and storage.
     Use this when the user asks for a complete overview of the infrastructure.
+    With several clusters it summarizes each; pass `cluster` for only one of them.
     """
     try:
-        result = get_cluster_resources()
-        print(f"DEBUG: get_proxmox_cluster_info returned: {result}")
+        result = get_cluster_resources(cluster=cluster)
         
-        summary = "Proxmox Cluster Information:\n"
-        summary += f"Nodes: {len(result.get('nodes', []))} - {', '.join([n.get('node') for n in result.get('nodes', [])])}\n"
-        summary += f"VMs/Containers: {len(result.get('vms', []))}\n"
-        summary += f"Storage Pools: {len(result.get('storage', []))}\n"
-        
-        return summary
+        nodes = result.get('nodes', [])
+        lines = [
+            "Proxmox Cluster Information:",
+            f"Nodes: {len(nodes)} - {', '.join('/'.join(filter(None, (n.get('cluster'), n.get('node')))) for n in nodes)}",
+            f"VMs/Containers: {len(result.get('vms', []))}",
+            f"Storage Pools: {len(result.get('storage', []))}",
+        ]
+        if any("cluster" in n for n in nodes):
+            per_cluster = Counter()
+            for key in ("nodes", "vms", "storage"):
+                for row in result.get(key, []):
+                    per_cluster[(row.get("cluster"), key)] += 1
+            lines.append("Per cluster:")
+            for name in dict.fromkeys(n.get("cluster") for n in nodes):
+                lines.append(
+                    f"  {name}: {per_cluster[(name, 'nodes')]} nodes, {per_cluster[(name, 'vms')]} VMs/containers, "
+                    f"{per_cluster[(name, 'storage')]} storage pools"
+                )
+        summary = "\n".join(lines)
+        return clip_text(summary, hint="Use get_node_vms_info or get_proxmox_vms for details.")
     except Exception as e:
-        print(f"DEBUG: get_proxmox_cluster_info exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("get_proxmox_cluster_info exception: %s: %s", type(e).__name__, e)
         return f"Error fetching cluster info: {str(e)}"
 
 @tool
-def get_node_vms_info(node: str):
+@traced("tool:get_node_vms_info")
+@marks_stale
+def get_node_vms_info(node: str, cluster: Optional[str] = None):
     """
     Get all VMs running on a specific node.
     Use this when the user asks about VMs on a specific node.
+    With several clusters, pass `cluster` when the node name exists in more than one.
     """
     try:
-        result = get_node_vms(node)
-        print(f"DEBUG: get_node_vms_info returned: {result}")
+        result = get_node_vms(node, cluster=cluster)
         
         if len(result) == 0:
             return f"No VMs found on node {node}."
         
-        vm_summary = f"VMs on node {node}:\n"
-        for vm in result:
-            vm_summary += f"  - {vm.get('name')} (ID: {vm.get('vmid')}, Status: {vm.get('status')})\n"
-        return vm_summary
+        columns, group_by = _cluster_layout(result, VM_COLUMNS, ("status", "type"))
+        return format_table(
+            result,
+            columns,
+            title=f"VMs on node {node}:",
+            group_by=group_by,
+            top_key=_by_memory,
+            top_label="allocated memory"
+        )
     except Exception as e:
-        print(f"DEBUG: get_node_vms_info exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("get_node_vms_info exception: %s: %s", type(e).__name__, e)
         return f"Error fetching VMs on node {node}: {str(e)}"
 
 @tool
-def get_specific_vm_config(vmid: int):
+@traced("tool:get_specific_vm_config")
+@marks_stale
+def get_specific_vm_config(vmid: int, cluster: Optional[str] = None):
     """
     Get detailed configuration for a specific VM by ID.
     Use this when the user asks about a specific VM's configuration.
+    With several clusters, pass `cluster` if the VM ID exists in more than one.
     """
     try:
-        result = get_vm_config(vmid)
-        print(f"DEBUG: get_specific_vm_config({vmid}) returned: {result}")
+        result = get_vm_config(vmid, cluster=cluster)
+        if isinstance(result, dict):
+            return format_mapping(result, title=f"Config of VM {vmid}:")
         return str(result)
     except Exception as e:
-        print(f"DEBUG: get_specific_vm_config exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("get_specific_vm_config exception: %s: %s", type(e).__name__, e)
         return f"Error fetching VM config: {str(e)}"
 
 @tool
-def get_proxmox_storage():
+@traced("tool:get_bulk_vm_configs")
+@marks_stale
+def get_bulk_vm_configs(
+    vmids: Optional[list[int]] = None,
+    node: Optional[str] = None,
+    vm_type: Optional[str] = None,
+    status: Optional[str] = None,
+    cluster: Optional[str] = None
+):
+    """
+    Get the configuration (cores, sockets, memory) of many VMs/containers in ONE call.
+    Pass a list of vmids, or filter by node, vm_type ('qemu' or 'lxc') and status
+    ('running', 'stopped'). With no arguments it returns every guest.
+    Use this instead of calling get_specific_vm_config repeatedly, e.g. for
+    'which VMs have more than 8 cores' or 'memory of all VMs on pve2'.
+    With several clusters, pass `cluster` to search only one of them.
+    """
+    try:
+        result = get_vm_configs(vmids=vmids, node=node, vm_type=vm_type, status=status, cluster=cluster)
+        annotate(configs=len(result))
+        
+        if len(result) == 0:
+            return "No matching VMs found."
+        
+        columns, group_by = _cluster_layout(result, VM_CONFIG_COLUMNS, ("node", "status"))
+        if any("error" in config for config in result):
+            columns = columns + [("Error", "error")]
+        return format_table(
+            result,
+            columns,
+            title=f"{len(result)} VM configs:",
+            group_by=group_by,
+            top_key=lambda c: int(c.get("memory") or 0),
+            top_label="memory"
+        )
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("get_bulk_vm_configs exception: %s: %s", type(e).__name__, e)
+        return f"Error fetching VM configs: {str(e)}"
+
+@tool
+@traced("tool:get_proxmox_storage")
+@marks_stale
+def get_proxmox_storage(cluster: Optional[str] = None):
     """
     Get a list of all storage pools available on the Proxmox cluster.
     Use this for questions like 'what storage', 'list storage', 'available storage'.
+    With several clusters, pass `cluster` to list only one of them.
     """
     try:
-        result = list_storage_pools()
-        print(f"DEBUG: get_proxmox_storage returned: {result}")
+        result = list_storage_pools(cluster=cluster)
         
         if isinstance(result, list):
             if len(result) == 0:
                 return "No storage pools found."
             
-            storage_summary = f"Found {len(result)} storage pools:\n"
-            for storage in result:
-                storage_summary += f"  - {storage.get('storage')} (Type: {storage.get('type')}, Content: {storage.get('content')})\n"
-            return storage_summary
+            columns, group_by = _cluster_layout(result, STORAGE_COLUMNS, ("type",))
+            return format_table(
+                result,
+                columns,
+                title=f"Found {len(result)} storage pools:",
+                group_by=group_by
+            )
         
         return str(result)
     except Exception as e:
-        print(f"DEBUG: get_proxmox_storage exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("get_proxmox_storage exception: %s: %s", type(e).__name__, e)
         return f"Error fetching storage: {str(e)}"
 
+CAPACITY_NODE_COLUMNS = [
+    ("Node", "node"),
+    ("Guests", "guests"),
+    ("Running", "running"),
+    ("CPUs", "cpus"),
+    ("CPU%", "cpu_pct"),
+    ("Mem%", "mem_pct"),
+    ("Disk%", "disk_pct"),
+    ("vCPU/CPU", "vcpu_overcommit"),
+    ("Mem alloc/phys", "mem_overcommit"),
+]
+CONSUMER_COLUMNS = [
+    ("VMID", "vmid"),
+    ("Name", "name"),
+    ("Node", "node"),
+    ("Cores used", lambda g: f"{g['cpu_cores']}/{g['maxcpu']}"),
+    ("Mem used", lambda g: f"{format_gib(g['mem'])}/{format_gib(g['maxmem'])}"),
+]
+
+@tool
+@traced("tool:get_cluster_capacity")
+@marks_stale
+def get_cluster_capacity(node: Optional[str] = None, top: int = 5):
+    """
+    Get capacity and utilization: per-node and cluster CPU/memory/disk usage,
+    overcommit ratios (vCPUs and memory allocated to running guests vs.
+    physical capacity) and the top consumers by memory and CPU.
+    Optionally restrict the node table and top consumers to one `node`.
+    Use this for 'how full is the cluster', 'which node has room',
+    'what uses the most memory', or before placing new VMs.
+    """
+    try:
+        report = capacity_report(get_columnar_inventory(), node=node, top=top)
+        if node and not report["nodes"]:
+            return f"Node {node} not found."
+        cluster = report["cluster"]
+        lines = [
+            f"Cluster: {cluster['nodes']} nodes, {cluster['guests']} guests ({cluster['running']} running); "
+            f"CPU {cluster['cpu_pct']}%, memory {cluster['mem_pct']}%, disk {cluster['disk_pct']}% used; "
+            f"overcommit vCPU {cluster['vcpu_overcommit']}x, memory {cluster['mem_overcommit']}x",
+            format_table(report["nodes"], CAPACITY_NODE_COLUMNS, title="Per node:",
+                         budget=TOOL_OUTPUT_MAX_TOKENS // 2, top_key=lambda r: r["mem_pct"], top_label="memory use"),
+        ]
+        if report["top_memory"]:
+            lines.append(format_table(report["top_memory"], CONSUMER_COLUMNS, title="Top memory consumers:"))
+        if report["top_cpu"]:
+            lines.append(format_table(report["top_cpu"], CONSUMER_COLUMNS, title="Top CPU consumers:"))
+        return clip_text("\n".join(lines))
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("get_cluster_capacity exception: %s: %s", type(e).__name__, e)
+        return f"Error computing capacity: {str(e)}"
+
+@tool
+@traced("tool:get_cluster_changes")
+def get_cluster_changes(minutes: int = 60):
+    """
+    Get what changed in the cluster over the last `minutes`: guests started,
+    stopped, rebooted, created, destroyed or migrated, failed tasks and
+    nodes going offline, oldest first. Use this for 'what happened',
+    'what changed recently' or 'did VM 104 restart'.
+    """
+    try:
+        if not is_sync_running():
+            return "Change tracking is off (start the agent with PROXMOX_SYNC_INTERVAL set)."
+        changes = get_recent_changes(max_age=minutes * 60)
+        if not changes:
+            return f"No changes in the last {minutes} minutes."
+        lines = [f"{len(changes)} changes in the last {minutes} minutes:"]
+        lines += [f"{time.strftime('%H:%M:%S', time.localtime(c['time']))} {c['message']}" for c in changes]
+        return clip_text("\n".join(lines))
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("get_cluster_changes exception: %s: %s", type(e).__name__, e)
+        return f"Error reading cluster changes: {str(e)}"
+
+def _format_usage(metric, value):
+    if metric in ("cpu", "mem_pct"):
+        return f"{value:.1f}%"
+    if metric == "cpu_cores":
+        return f"{value:.2f}"
+    if metric == "mem":
+        return format_gib(value)
+    return f"{value / 1024 ** 2:.2f}MB/s"
+
+def _usage_error(metric, stat="mean"):
+    """Message for arguments the metric store cannot answer, or None."""
+    if metric not in METRICS:
+        return f"Unknown metric {metric!r}; use one of: {', '.join(METRICS)}."
+    if stat not in STATS:
+        return f"Unknown stat {stat!r}; use one of: {', '.join(STATS)}."
+    if not len(get_metric_store()):
+        return "No usage history collected yet (start the agent with METRICS_INTERVAL set)."
+    return None
+
+@tool
+@traced("tool:get_top_usage")
+def get_top_usage(metric: str = "cpu", minutes: int = 60, stat: str = "mean", top: int = 10, scope: str = "guests"):
+    """
+    Rank guests (scope='guests') or nodes (scope='nodes') by recorded usage
+    over the last `minutes`. metric: cpu (% of own CPUs), cpu_cores, mem,
+    mem_pct, netin, netout, diskread or diskwrite (bytes/s). stat: mean,
+    max, p50, p90, p95 or p99 over the window. Each row has a trend per
+    hour (positive = rising). Use this for 'busiest VMs over the last hour'
+    or 'which node is trending toward saturation'.
+    """
+    try:
+        error = _usage_error(metric, stat)
+        if error:
+            return error
+        kinds = [KINDS["node"]] if scope == "nodes" else list(GUEST_KINDS)
+        ranked = get_metric_store().top(metric, minutes * 60, stat, top, kinds)
+        if not ranked:
+            return f"No {scope} samples in the last {minutes} minutes."
+        # Usage history is the primary cluster's only, so join against its guests
+        guests = ({f"{vm.get('type')}/{vm.get('vmid')}": vm for vm in list_all_vms(cluster=PROXMOX_CLUSTER_NAME)}
+                  if scope != "nodes" else {})
+        rows = []
+        for entry in ranked:
+            vm = guests.get(entry["id"], {})
+            rows.append({
+                "id": entry["id"].split("/", 1)[1],
+                "name": vm.get("name"),
+                "node": vm.get("node"),
+                "value": _format_usage(metric, entry["value"]),
+                "trend": ("+" if entry["trend_per_hour"] >= 0 else "-") + _format_usage(metric, abs(entry["trend_per_hour"])),
+                "samples": entry["samples"],
+            })
+        columns = [("Node", "id")] if scope == "nodes" else [("VMID", "id"), ("Name", "name"), ("Node", "node")]
+        columns += [(f"{metric} {stat}", "value"), ("Trend/h", "trend"), ("Samples", "samples")]
+        title = f"Top {len(rows)} {scope} by {stat} {metric} ({METRICS[metric]}) over the last {minutes} minutes:"
+        return format_table(rows, columns, title=title)
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("get_top_usage exception: %s: %s", type(e).__name__, e)
+        return f"Error ranking usage: {str(e)}"
+
+@tool
+@traced("tool:get_usage_percentiles")
+def get_usage_percentiles(metric: str = "cpu", minutes: int = 60, vmid: Optional[int] = None, node: Optional[str] = None):
+    """
+    Percentiles (p50/p90/p95/p99) and max of recorded usage over the last
+    `minutes`: of one guest's samples (vmid), of one node's samples (node),
+    or, with neither, of every guest's average (how load is spread across
+    guests). metric as in get_top_usage.
+    """
+    try:
+        error = _usage_error(metric)
+        if error:
+            return error
+        store = get_metric_store()
+        if vmid is not None:
+            series = next((s for s in (f"qemu/{vmid}", f"lxc/{vmid}") if s in store), None)
+            if series is None:
+                return f"No usage history for VM {vmid}."
+            subject = f"VM {vmid} samples"
+        elif node:
+            series = f"node/{node}"
+            if series not in store:
+                return f"No usage history for node {node}."
+            subject = f"node {node} samples"
+        else:
+            series = None
+            subject = "guest averages"
+        result = store.percentiles(metric, minutes * 60, series)
+        if result is None:
+            return f"No samples in the last {minutes} minutes."
+        values = ", ".join(f"{k} {_format_usage(metric, result[k])}" for k in ("p50", "p90", "p95", "p99", "max"))
+        return f"{metric} ({METRICS[metric]}) over the last {minutes} minutes, {result['count']} {subject}: {values}"
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("get_usage_percentiles exception: %s: %s", type(e).__name__, e)
+        return f"Error computing usage percentiles: {str(e)}"
+
 @tool
-def plan_infrastructure_changes(hcl_code: str):
+@traced("tool:place_vms")
+@marks_stale
+def place_vms(
+    cores: int,
+    memory_mb: int,
+    disk_gb: int = 32,
+    count: int = 1,
+    vm_type: str = "qemu",
+    strategy: str = "spread",
+    anti_affinity: bool = True,
+    avoid_nodes: Optional[list[str]] = None,
+    separate_from: Optional[list[str]] = None
+):
+    """
+    Chooses target_node and storage for new VMs/containers from live capacity.
+    ALWAYS call this before writing HCL that creates guests, and use the
+    returned target_node / storage values in the HCL.
+    cores, memory_mb, disk_gb: shape of ONE guest; count: how many.
+    vm_type: 'qemu' or 'lxc'. strategy: 'spread' (most headroom, default)
+    or 'pack' (fill nodes tightly). anti_affinity: put the guests of this
+    batch on different nodes while possible. avoid_nodes: nodes to skip.
+    separate_from: name prefixes of existing guests whose nodes to avoid
+    (e.g. ['db-'] to keep new DB replicas apart from existing ones).
+    """
+    try:
+        inventory = get_columnar_inventory()
+        # Placement only covers the PROXMOX_HOST cluster; other clusters' pools are not its nodes'
+        model = get_placement_model(inventory, list_storage_pools(cluster=PROXMOX_CLUSTER_NAME))
+        result = model.place(
+            cores, memory_mb, disk_gb=disk_gb, count=count, vm_type=vm_type, strategy=strategy,
+            anti_affinity=anti_affinity, avoid_nodes=avoid_nodes or (),
+            separate_from=separate_from or (), inv=inventory
+        )
+        annotate(placed=len(result["placements"]), unplaced=result["unplaced"])
+        lines = [f"Placed {len(result['placements'])} of {count} x ({cores} cores, {memory_mb} MB, {disk_gb} GB {vm_type}):"]
+        if count <= 20:
+            lines += [f"#{p['index']}: target_node={p['node']} storage={p['storage'] or '-'}" for p in result["placements"]]
+        elif result["placements"]:
+            # Index-ordered lists map directly onto count.index in HCL
+            nodes = [p["node"] for p in result["placements"]]
+            storages = [p["storage"] or "-" for p in result["placements"]]
+            lines.append(f"target_node by index: {json.dumps(nodes)}")
+            if len(set(storages)) == 1:
+                lines.append(f"storage for all: {storages[0]}")
+            else:
+                lines.append(f"storage by index: {json.dumps(storages)}")
+        if result["unplaced"]:
+            lines.append(f"⚠️ {result['unplaced']} could not be placed: {result['reason']}.")
+        if result["nodes"]:
+            lines.append(format_table(
+                [dict(node=name, **headroom) for name, headroom in result["nodes"].items()],
+                [("Node", "node"), ("vCPUs free after", "vcpus_free"), ("Mem free after (GiB)", "mem_free_gib"), ("CPU load %", "cpu_load_pct")],
+                title="Headroom after placement:",
+                budget=TOOL_OUTPUT_MAX_TOKENS // 2
+            ))
+        return clip_text("\n".join(lines))
+    except PlacementError as e:
+        return f"Invalid placement request: {str(e)}"
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("place_vms exception: %s: %s", type(e).__name__, e)
+        return f"Error placing VMs: {str(e)}"
+
+@tool
+@traced("tool:plan_infrastructure_changes")
+def plan_infrastructure_changes(hcl_code: str, workspace: str = "default"):
     """
     Plans infrastructure changes using Terraform.
     First generates HCL code based on the user's request, then shows the plan.
     The user must approve before applying.
+    Use a separate `workspace` name for an independent change set so it does
+    not overwrite the HCL and state of another one; otherwise leave 'default'.
     """
     try:
         from tools.terraform_manager import generate_and_plan_infrastructure
-        result = generate_and_plan_infrastructure(hcl_code)
-        print(f"DEBUG: plan_infrastructure_changes returned: {result}")
-        return str(result)
+        result = generate_and_plan_infrastructure(hcl_code, workspace=workspace)
+        return clip_text(str(result), hint="Use show_full_terraform_plan for the complete plan.")
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("plan_infrastructure_changes exception: %s: %s", type(e).__name__, e)
+        return f"Error planning infrastructure: {str(e)}"
+
+@tool
+@traced("tool:plan_independent_changes")
+def plan_independent_changes(changes: dict[str, str]):
+    """
+    Plans several INDEPENDENT infrastructure changes at the same time, one
+    Terraform workspace each. `changes` maps a workspace name (letters, digits,
+    '-', '_') to the HCL code of that change, e.g. {"web": "...", "db": "..."}.
+    Use this instead of calling plan_infrastructure_changes once per change when
+    the user asks for unrelated changes together. Each plan is applied separately
+    with execute_infrastructure_changes(workspace=...) after the user approves it.
+    """
+    try:
+        from tools.terraform_manager import plan_many
+        results = plan_many(changes)
+        return clip_text(
+            "\n\n".join(f"=== Workspace '{name}' ===\n{result}" for name, result in results.items()),
+            hint="Use show_full_terraform_plan(workspace=...) for a complete plan."
+        )
     except Exception as e:
-        print(f"DEBUG: plan_infrastructure_changes exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("plan_independent_changes exception: %s: %s", type(e).__name__, e)
         return f"Error planning infrastructure: {str(e)}"
 
 @tool
-def execute_infrastructure_changes():
+@traced("tool:show_full_terraform_plan")
+def show_full_terraform_plan(workspace: str = "default"):
+    """
+    Returns the complete text of the saved Terraform plan.
+    plan_infrastructure_changes only returns a compact summary; call this
+    only if the user asks for the full plan or the summary is not enough.
+    """
+    try:
+        from tools.terraform_manager import show_full_plan
+        return clip_text(
+            show_full_plan(workspace=workspace),
+            hint="The complete plan was streamed to the operator's terminal."
+        )
+    except Exception as e:
+        annotate(error=type(e).__name__)
+        debug("show_full_terraform_plan exception: %s: %s", type(e).__name__, e)
+        return f"Error showing plan: {str(e)}"
+
+@tool
+@traced("tool:execute_infrastructure_changes")
+def execute_infrastructure_changes(workspace: str = "default"):
     """
-    Applies the currently staged Terraform plan.
+    Applies the currently staged Terraform plan of the given workspace.
     ONLY call this after 'plan_infrastructure_changes' has been
     run AND the user has given explicit approval.
     """
     try:
         from tools.terraform_manager import apply_infrastructure_plan
-        result = apply_infrastructure_plan()
-        print(f"DEBUG: execute_infrastructure_changes returned: {result}")
-        return str(result)
+        result = apply_infrastructure_plan(workspace=workspace)
+        return clip_text(str(result))
     except Exception as e:
-        print(f"DEBUG: execute_infrastructure_changes exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("execute_infrastructure_changes exception: %s: %s", type(e).__name__, e)
         return f"Error applying infrastructure: {str(e)}"
 
 @tool
-def destroy_all_managed_infrastructure():
+@traced("tool:destroy_all_managed_infrastructure")
+def destroy_all_managed_infrastructure(workspace: str = "default"):
     """
-    Destroys all infrastructure managed by the terraform file.
+    Destroys all infrastructure managed by the terraform file of the given workspace.
     Get explicit user confirmation before using.
     """
     try:
         from tools.terraform_manager import destroy_infrastructure
-        result = destroy_infrastructure()
-        print(f"DEBUG: destroy_all_managed_infrastructure returned: {result}")
-        return str(result)
+        result = destroy_infrastructure(workspace=workspace)
+        return clip_text(str(result))
     except Exception as e:
-        print(f"DEBUG: destroy_all_managed_infrastructure exception: {type(e).__name__}: {str(e)}")
+        annotate(error=type(e).__name__)
+        debug("destroy_all_managed_infrastructure exception: %s: %s", type(e).__name__, e)
         return f"Error destroying infrastructure: {str(e)}"
 
 tools = [
@@ -176,17 +669,173 @@ tools = [
     get_proxmox_cluster_info,
     get_node_vms_info,
     get_specific_vm_config,
+    get_bulk_vm_configs,
     get_proxmox_storage,
+    get_cluster_capacity,
+    get_cluster_changes,
+    get_top_usage,
+    get_usage_percentiles,
+    place_vms,
     plan_infrastructure_changes,
+    plan_independent_changes,
+    show_full_terraform_plan,
     execute_infrastructure_changes,
     destroy_all_managed_infrastructure
 ]
 
+# Tools whose answers depend only on the inventory; a turn that calls
+# anything else (Terraform, plan inspection, live usage,
+# placement) is never cached
+READ_ONLY_TOOLS = {
+    get_proxmox_vms.name,
+    get_proxmox_cluster_info.name,
+    get_node_vms_info.name,
+    get_specific_vm_config.name,
+    get_bulk_vm_configs.name,
+    get_proxmox_storage.name,
+}
+
+def _read_only_turn(new_messages):
+    """True if the turn called at least one tool and only read-only ones."""
+    called = [
+        call["name"]
+        for message in new_messages
+        for call in (getattr(message, "tool_calls", None) or [])
+    ]
+    return bool(called) and all(name in READ_ONLY_TOOLS for name in called)
+
+response_cache = ResponseCache()
+# Apply/destroy change the cluster behind the inventory's back
+register_invalidation_hook(response_cache.clear)
+
+# 1b. Fast path: simple read questions answered from the inventory, no LLM
+GUESTS = r"(?P<kind>vms|virtual machines|guests|machines|containers|lxcs?|lxc containers|vms and containers|vms containers)"
+
+def _guest_type(kind):
+    """The guest type a GUESTS word asks for: 'lxc', 'qemu', or None for both."""
+    if not kind or kind in ("guests", "machines") or "vms" in kind and "container" in kind:
+        return None
+    if "container" in kind or kind.startswith("lxc"):
+        return "lxc"
+    return "qemu"
+
+def _filter_guests(kind=None, state=None, state2=None, vms=None):
+    vms = list_all_vms() if vms is None else vms
+    guest_type = _guest_type(kind)
+    if guest_type:
+        vms = [vm for vm in vms if vm.get("type") == guest_type]
+    status = state or state2
+    if status:
+        vms = [vm for vm in vms if vm.get("status") == status]
+    return vms
+
+def _route_count_guests(kind=None, state=None, state2=None):
+    vms = _filter_guests(kind, state, state2)
+    by_type = Counter(vm.get("type") for vm in vms)
+    by_status = Counter(vm.get("status") for vm in vms)
+    label = f"{state or state2} {kind}" if (state or state2) else kind
+    return (
+        f"There are {len(vms)} {label} "
+        f"({by_type.get('qemu', 0)} qemu VMs, {by_type.get('lxc', 0)} LXC containers; "
+        + ", ".join(f"{n} {status}" for status, n in by_status.most_common())
+        + ")."
+    )
+
+def _route_list_guests(kind=None, state=None, state2=None):
+    vms = _filter_guests(kind, state, state2)
+    if not vms:
+        return f"No matching {kind} found."
+    columns, group_by = _cluster_layout(vms, VM_COLUMNS, ("status", "node", "type"))
+    return format_table(
+        vms,
+        columns,
+        title=f"Found {len(vms)} {kind}:",
+        group_by=group_by,
+        top_key=_by_memory,
+        top_label="allocated memory"
+    )
+
+def _route_node_guests(node, kind=None, state=None):
+    # Unknown node names may be typos or aliases; let the agent handle them
+    if node not in {n.get("node") for n in get_all_nodes()}:
+        return None
+    if not _guest_type(kind) and not state:
+        return get_node_vms_info.invoke({"node": node})
+    vms = _filter_guests(kind, state, vms=get_node_vms(node))
+    label = " ".join(filter(None, (state, kind or "guests")))
+    if not vms:
+        return f"No {label} found on node {node}."
+    columns, group_by = _cluster_layout(vms, VM_COLUMNS, ("status", "type"))
+    return format_table(
+        vms,
+        columns,
+        title=f"{len(vms)} {label} on node {node}:",
+        group_by=group_by,
+        top_key=_by_memory,
+        top_label="allocated memory"
+    )
+
+def _route_list_nodes():
+    nodes = get_all_nodes()
+    columns, group_by = _cluster_layout(
+        nodes,
+        [("Node", "node"), ("Status", "status"), ("CPUs", "maxcpu"),
+         ("Mem", lambda n: format_gib(n.get("maxmem")))],
+        ("status",)
+    )
+    return format_table(nodes, columns, title=f"Found {len(nodes)} nodes:", group_by=group_by)
+
+router = IntentRouter()
+router.add_route(
+    "count_guests",
+    rf"(how many|count|number of|count of|total)( the| my)?( (?P<state>running|stopped))? {GUESTS}"
+    rf"( are| do i have| exist| there| in (the|my) cluster)*( (?P<state2>running|stopped))?( in (the|my) cluster)?",
+    _route_count_guests
+)
+router.add_route(
+    "list_guests",
+    rf"((list|show|get|display|what are|what) )?(all )?(the |my )?((?P<state>running|stopped) )?{GUESTS}"
+    rf"( are| do i have| exist| there| in (the|my) cluster)*( (?P<state2>running|stopped))?( in (the|my) cluster)?",
+    _route_list_guests
+)
+router.add_route(
+    "node_guests",
+    rf"((list|show|get|what|what is|what are)( the| all)? )?({GUESTS} )?((is|are) )?((?P<state>running|stopped) )?on (node )?(?P<node>[a-z0-9][\w.-]*)",
+    _route_node_guests
+)
+router.add_route(
+    "list_nodes",
+    r"((list|show|get|what are)( all)?( the| my)?( cluster)? nodes( in (the|my) cluster)?|how many nodes( are there| do i have)?)",
+    lambda: _route_list_nodes()
+)
+router.add_route(
+    "list_storage",
+    r"(list|show|get|what|what is|what are)( all)?( the| my)?( available)? (storage|storages|storage pools|datastores)"
+    r"( pools)?( are there| do i have| available| is available| are available| exist)?",
+    lambda: get_proxmox_storage.invoke({})
+)
+router.add_route(
+    "vm_config",
+    r"((show|get|what is|whats|what s)( the)? )?(config|configuration|settings) (of|for) (vm |container |ct |vmid )?(?P<vmid>\d+)"
+    r"|(vm|vmid|container|ct) (?P<vmid2>\d+) (config|configuration|settings)",
+    lambda vmid=None, vmid2=None: get_specific_vm_config.invoke({"vmid": int(vmid or vmid2)})
+)
+
 # 2. Define the LLM
+# One token bucket for every model call in this process (all server sessions);
+# it is switched on for --serve and --batch only, since a single CLI user
+# shares the quota with no one and would just wait before every call
+groq_limiter = get_groq_limiter()
+if groq_limiter:
+    groq_limiter.enabled = False
 llm = ChatGroq(
     model_name="llama-3.3-70b-versatile",
     temperature=0,
-    timeout=60
+    timeout=60,
+    rate_limiter=groq_limiter,
+    # Times every model call (a no-op unless TELEMETRY is on) and charges
+    # its tokens to the limiter's per-minute quota
+    callbacks=[LLMTelemetryCallback()] + ([TokenUsageCallback(groq_limiter)] if groq_limiter else [])
 )
 
 # 3. Define the Master Prompt
@@ -198,63 +847,215 @@ You have access to a set of tools to read from and write to a Proxmox cluster.
 IMPORTANT RULES:
 1.  **READ-ONLY:** For any question that just asks for information (list, get, show, what is), 
     use the read-only tools like `get_proxmox_vms` or `get_proxmox_storage`.
+    For utilization, free capacity or top consumers use `get_cluster_capacity`.
+    For what changed recently (guests started, stopped, migrated, created) use `get_cluster_changes`.
+    For usage over time (busiest VMs over the last hour, nodes trending toward saturation,
+    percentiles) use `get_top_usage` and `get_usage_percentiles`.
 2.  **WRITE/DESTROY:** For any request that involves creating, deleting, or modifying 
     a resource (VM, network, etc.), you MUST use the Terraform workflow.
 3.  **TERRAFORM WORKFLOW:**
-    a.  First, call the `plan_infrastructure_changes` tool. You must generate the HCL code 
+    a.  If the change creates VMs or containers, first call `place_vms` with the shape
+        and number of the new guests. Use the target_node and storage it returns in the
+        HCL; never guess them. If it cannot place all guests, tell the user why.
+    b.  Then call the `plan_infrastructure_changes` tool. You must generate the HCL code 
         for the user's request. The user must not provide the code.
-    b.  Show the output (the 'plan') to the user.
-    c.  Ask the user for explicit confirmation (e.g., "Do you want to apply this plan?").
-    d.  If and ONLY IF the user says yes, call the `execute_infrastructure_changes` tool.
+        For several unrelated changes requested together, call `plan_independent_changes`
+        once with one workspace per change instead.
+    c.  Show the output (the plan summary) to the user.
+    d.  Ask the user for explicit confirmation (e.g., "Do you want to apply this plan?").
+    e.  If and ONLY IF the user says yes, call the `execute_infrastructure_changes` tool.
 4.  **Context:** Be aware of the user's environment. You can use read tools to 
     find out available nodes, templates, and storage pools to make better HCL.
 
 Begin!
 """
 
+# Several clusters: name them and point the model at the tools' cluster filter
+if is_federated():
+    cluster_names = get_cluster_names()
+    master_prompt = master_prompt.replace("Begin!", f"""5.  **CLUSTERS:** You manage {len(cluster_names)} Proxmox clusters: {', '.join(cluster_names)}.
+    The VM, node, config and storage tools answer for all of them and show a Cluster column;
+    pass `cluster` to read only one. VM IDs and node names may repeat across clusters.
+    Capacity, usage, changes, placement and Terraform only cover the '{cluster_names[0]}' cluster.
+
+Begin!""")
+
 # 4. Create agent
 agent_executor = create_agent(llm, tools, system_prompt=master_prompt)
 
+def answer_turn(history, user_input, out=None):
+    """
+    Answers one user message in the context of `history` and records the
+    exchange in it: the fast-path router first, then the response cache,
+    then a streamed agent turn whose tokens and tool events go to `out`.
+    Shared by the CLI and the server (one history per session).
+    Returns (answer, source, timings); source is 'routed', 'cached' or
+    'agent' and timings is None unless the agent ran.
+    """
+    out = out or sys.stdout
+    # Simple reads are answered from the inventory without the LLM
+    with left_out_clusters() as left_out:
+        routed = router.route(user_input)
+    if routed is not None:
+        note = _freshness_note(left_out)
+        if note and note not in routed:
+            routed = f"{routed}\n{note}"
+        history.add_turn(user_input, AIMessage(content=routed))
+        return routed, "routed", None
+
+    # Repeated read-only questions against an unchanged inventory; write
+    # requests are never cached, so they skip the inventory fingerprint
+    cacheable = not WRITE_INTENT.search(normalize(user_input))
+    cached = response_cache.get(user_input, get_inventory_fingerprint()) if cacheable else None
+    if cached is not None:
+        history.add_turn(user_input, AIMessage(content=cached))
+        return cached, "cached", None
+
+    out.write("Agent is thinking...\n\n")
+    messages = history.messages(user_input)
+    # Tokens and tool events are written as they arrive; the tools' reads
+    # report the clusters they left out into this turn's collection
+    with left_out_clusters() as left_out:
+        result, timings = stream_turn(agent_executor, messages, out)
+    if len(result["messages"]) <= len(messages):
+        return None, "agent", timings
+
+    response = result["messages"][-1].content
+    # Only completed exchanges go into the history
+    history.add_turn(user_input, result["messages"][-1])
+    # Answers built on a stale snapshot, mock data or without some clusters are not kept
+    if cacheable and _read_only_turn(result["messages"][len(messages):]) and not _freshness_note(left_out):
+        with left_out_clusters() as left_out:
+            # Keyed on the snapshot the tools just read
+            fingerprint = get_inventory_fingerprint()
+        if not left_out:
+            response_cache.put(user_input, fingerprint, response)
+    return response, "agent", timings
+
+def service_stats():
+    """Counters of everything the sessions share, for the server's /stats."""
+    stats = {
+        "data_source": get_data_source(),
+        "inventory_cache": get_cache_stats(),
+        "router": router.stats(),
+        "response_cache": response_cache.stats(),
+    }
+    if groq_limiter and groq_limiter.enabled:
+        stats["groq_limiter"] = groq_limiter.stats()
+    if is_federated():
+        stats["clusters"] = get_cluster_stats()
+    if is_sync_running():
+        stats["sync"] = get_sync_stats()
+    if get_snapshot_stats():
+        stats["snapshot"] = get_snapshot_stats()
+    if telemetry_enabled():
+        stats["telemetry"] = telemetry_summary()
+    return stats
+
 def run_cli_chat():
     """Run the CLI chat loop."""
-    chat_history = []
+    history = ChatHistory()
+    # Last change feed entry shown, so each change is printed once
+    seen_change = 0
     
     while True:
         try:
+            for change in get_recent_changes(seen_change):
+                print(f"📣 {time.strftime('%H:%M:%S', time.localtime(change['time']))} {change['message']}")
+                seen_change = change["seq"]
             user_input = input("User: ").strip()
             
             if user_input.lower() == 'exit':
+                print(f"Inventory cache: {get_cache_stats()}")
+                print(f"Chat history: {history.stats()}")
+                print(f"Fast-path router: {router.stats()}")
+                print(f"Response cache: {response_cache.stats()}")
+                if groq_limiter and groq_limiter.enabled:
+                    print(f"Groq limiter: {groq_limiter.stats()}")
+                if is_federated():
+                    print(f"Clusters: {get_cluster_stats()}")
+                if is_sync_running():
+                    print(f"Inventory sync: {get_sync_stats()}")
+                if get_snapshot_stats():
+                    print(f"Snapshot: {get_snapshot_stats()}")
+                if len(get_metric_store()):
+                    print(f"Metrics: {get_metric_store().stats()}")
+                if telemetry_enabled():
+                    print(f"Telemetry: {telemetry_summary()}")
                 print("Goodbye!")
                 break
             
             if not user_input:
                 continue
             
-            print("Agent is thinking...\n")
-            
             try:
-                result = agent_executor.invoke({
-                    "messages": chat_history + [HumanMessage(content=user_input)]
-                })
-                
-                if result.get("messages"):
-                    response = result["messages"][-1].content
-                    print(f"Agent: {response}\n")
-                    # Update chat history with the full exchange
-                    chat_history.append(HumanMessage(content=user_input))
-                    chat_history.append(result["messages"][-1])
+                answer, source, timings = answer_turn(history, user_input)
+                if source == "routed":
+                    print(f"Agent: {answer}\n")
+                elif source == "cached":
+                    print(f"Agent (cached): {answer}\n")
                 else:
-                    print("Agent: No response received\n")
+                    print(f"{timings}\n")
+                    if answer is None:
+                        print("Agent: No response received\n")
                     
+            except KeyboardInterrupt:
+                # Ctrl-C during a turn cancels the turn, not the session
+                from tools.terraform_manager import cancel_running
+                if cancel_running(wait=False):
+                    print("\nStopping Terraform cleanly (releasing state lock)...")
+                    cancel_running(wait=True)
+                print("\n⚠️ Cancelled.\n")
             except Exception as e:
+                # The failed turn is simply not recorded; earlier history stays valid
                 print(f"❌ Error: {type(e).__name__}: {str(e)}\n")
-                # Reset chat history on error to prevent corruption
-                chat_history = []
                 
         except KeyboardInterrupt:
             print("\nGoodbye!")
             break
 
 if __name__ == "__main__":
-    print("Proxmox Agent is ready. Type 'exit' to quit.\n")
-    run_cli_chat()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Proxmox agent: interactive CLI, or a multi-session chat server.")
+    parser.add_argument("--serve", action="store_true", help="serve chat sessions over HTTP/WebSocket instead of the CLI")
+    parser.add_argument("--host", help="address to listen on (default CHAT_SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="port to listen on (default CHAT_SERVER_PORT)")
+    parser.add_argument("--batch", metavar="PROMPTS_JSONL", help="answer every prompt of a JSONL file and exit")
+    parser.add_argument("--output", help="JSONL results of --batch; rerun with the same file to resume "
+                                         "(default: PROMPTS.results.jsonl)")
+    parser.add_argument("--workers", type=int, help="prompts of --batch answered at once (default BATCH_WORKERS)")
+    args = parser.parse_args()
+
+    # Concurrent sessions and batch workers share one Groq quota
+    if groq_limiter and (args.serve or args.batch):
+        groq_limiter.enabled = True
+    if TELEMETRY_METRICS_PORT and telemetry_enabled():
+        start_metrics_server(int(TELEMETRY_METRICS_PORT))
+        print(f"Prometheus metrics on http://127.0.0.1:{TELEMETRY_METRICS_PORT}/metrics")
+    # A batch reads one pinned snapshot; the sync would patch it underneath
+    if PROXMOX_SYNC_INTERVAL > 0 and not args.batch:
+        start_sync(PROXMOX_SYNC_INTERVAL)
+        print(f"Following cluster tasks every {PROXMOX_SYNC_INTERVAL:g}s")
+    if METRICS_INTERVAL > 0:
+        start_metrics_collection(METRICS_INTERVAL)
+        print(f"Collecting usage history every {METRICS_INTERVAL:g}s")
+    if get_data_source()["source"] == "snapshot":
+        print(_freshness_note())
+    if args.batch:
+        from tools.batch import run_batch
+        output = args.output or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+        try:
+            summary = run_batch(answer_turn, args.batch, output, workers=args.workers, pin=pinned_inventory)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"Batch: {summary}")
+        if groq_limiter and groq_limiter.enabled:
+            print(f"Groq limiter: {groq_limiter.stats()}")
+        print(f"Results in {output}")
+        sys.exit(1 if summary["errors"] or summary["interrupted"] else 0)
+    elif args.serve:
+        from tools.chat_server import ChatServer
+        ChatServer(answer_turn, stats=service_stats, host=args.host, port=args.port).run()
+    else:
+        print("Proxmox Agent is ready. Type 'exit' to quit.\n")
+        run_cli_chat()
\ No newline at end of file
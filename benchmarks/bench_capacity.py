@@ -0,0 +1,132 @@
+# benchmarks/bench_capacity.py
+"""
+Memory and speed of the columnar inventory against the plain dicts
+returned by /cluster/resources, for the capacity aggregates.
+
+    python -m benchmarks.bench_capacity --guests 1000 10000 50000
+
+For each size:
+  dict_kib / columnar_kib   memory retained by the snapshot in each form
+                            (guest name strings are shared, so counted once)
+  build_ms                  one-off cost of building the columnar copy
+  dict_ms / columnar_ms     one capacity report (per-node utilization,
+                            overcommit, top 5 by memory and CPU)
+"""
+import argparse
+import gc
+import heapq
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_proxmox import SyntheticCluster
+from tools.columnar import ColumnarInventory, capacity_report
+
+
+def dict_capacity(resources, top=5):
+    """The same report computed by iterating over the resource dicts."""
+    nodes = {}
+    for r in resources:
+        if r.get("type") == "node":
+            nodes[r["node"]] = {"cpus": r.get("maxcpu") or 0, "mem": r.get("maxmem") or 0,
+                                "load": (r.get("cpu") or 0) * (r.get("maxcpu") or 0), "mem_used": r.get("mem") or 0,
+                                "disk": 0, "maxdisk": 0, "vcpus": 0, "guest_mem": 0, "guests": 0, "running": 0}
+    running = []
+    for r in resources:
+        stats = nodes.get(r.get("node"))
+        if stats is None:
+            continue
+        if r.get("type") == "storage":
+            stats["disk"] += r.get("disk") or 0
+            stats["maxdisk"] += r.get("maxdisk") or 0
+        elif r.get("type") in ("qemu", "lxc"):
+            stats["guests"] += 1
+            if r.get("status") == "running":
+                stats["running"] += 1
+                stats["vcpus"] += r.get("maxcpu") or 0
+                stats["guest_mem"] += r.get("maxmem") or 0
+                running.append(r)
+    rows = [
+        {
+            "node": name,
+            "cpu_pct": s["load"] / s["cpus"] * 100 if s["cpus"] else 0,
+            "mem_pct": s["mem_used"] / s["mem"] * 100 if s["mem"] else 0,
+            "disk_pct": s["disk"] / s["maxdisk"] * 100 if s["maxdisk"] else 0,
+            "vcpu_overcommit": s["vcpus"] / s["cpus"] if s["cpus"] else 0,
+            "mem_overcommit": s["guest_mem"] / s["mem"] if s["mem"] else 0,
+        }
+        for name, s in nodes.items()
+    ]
+    return {
+        "nodes": rows,
+        "top_memory": heapq.nlargest(top, running, key=lambda r: r.get("mem") or 0),
+        "top_cpu": heapq.nlargest(top, running, key=lambda r: (r.get("cpu") or 0) * (r.get("maxcpu") or 0)),
+    }
+
+
+def _retained(build):
+    """Bytes still allocated after build() returns (its result kept alive)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def _best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def run(guest_counts, repeat):
+    results = []
+    for guests in guest_counts:
+        # Parse from JSON like the reader does, so strings are not shared with the generator
+        payload = json.dumps(SyntheticCluster(guests).resources)
+        resources, dict_bytes = _retained(lambda: json.loads(payload))
+        columnar, columnar_bytes = _retained(lambda: ColumnarInventory(resources))
+
+        dict_report = dict_capacity(resources)
+        report = capacity_report(columnar)
+        assert [r["vmid"] for r in dict_report["top_memory"]] == [r["vmid"] for r in report["top_memory"]]
+
+        row = {
+            "guests": guests,
+            "dict_kib": dict_bytes // 1024,
+            "columnar_kib": columnar_bytes // 1024,
+            "build_ms": _best_ms(lambda: ColumnarInventory(resources), max(1, repeat // 5)),
+            "dict_ms": _best_ms(lambda: dict_capacity(resources), repeat),
+            "columnar_ms": _best_ms(lambda: capacity_report(columnar), repeat),
+        }
+        row["memory_ratio"] = round(row["dict_kib"] / max(1, row["columnar_kib"]), 1)
+        row["speedup"] = round(row["dict_ms"] / row["columnar_ms"], 1) if row["columnar_ms"] else None
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.guests, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
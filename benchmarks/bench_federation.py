@@ -0,0 +1,132 @@
+# benchmarks/bench_federation.py
+"""
+Fan-out reads over several clusters: one fake Proxmox API per cluster,
+the first as PROXMOX_HOST and the rest in PROXMOX_CLUSTERS, one of them
+slower than the others.
+
+    python -m benchmarks.bench_federation --clusters 5 --guests 2000 --latency-ms 50
+    python -m benchmarks.bench_federation --clusters 5 --slow-ms 3000 --timeout 1 --json federation.json
+
+Every read starts cold (all snapshots dropped). For each reader:
+  fanout_ms      one call across every cluster at once
+  sequential_ms  the same read asked of each cluster in turn (cluster=...)
+  rows           merged rows of the fan-out
+Then, with the slow cluster past its PROXMOX_<NAME>_FANOUT_TIMEOUT:
+  partial_ms     a cold list_all_vms(), which answers without it
+  answered       clusters in that answer; unavailable: why the rest are missing
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_readers import _git_commit, _quiet
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+
+READERS = ("list_all_vms", "get_cluster_resources", "list_storage_pools")
+
+
+def _configure(servers, timeout):
+    """Points PROXMOX_HOST at the first server and PROXMOX_CLUSTERS at the rest."""
+    names = [f"c{i}" for i in range(len(servers))]
+    os.environ.update(PROXMOX_HOST=servers[0].url, PROXMOX_USER="root@pam", PROXMOX_PASSWORD="benchmark",
+                      PROXMOX_CLUSTER_NAME=names[0], PROXMOX_CLUSTERS=",".join(names[1:]),
+                      PROXMOX_FANOUT_TIMEOUT=str(timeout))
+    os.environ.pop("PROXMOX_TOKEN_ID", None)
+    os.environ.pop("PROXMOX_TOKEN_SECRET", None)
+    for name, server in zip(names[1:], servers[1:]):
+        prefix = f"PROXMOX_{name.upper()}_"
+        os.environ.update({f"{prefix}HOST": server.url, f"{prefix}USER": "root@pam", f"{prefix}PASSWORD": "benchmark"})
+    return names
+
+
+def _cold_ms(reader, call, repeat):
+    samples = []
+    for _ in range(repeat):
+        reader.invalidate_inventory()
+        start = time.perf_counter()
+        with _quiet():
+            call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def run(clusters, guests, latency_ms, slow_ms, timeout, repeat):
+    servers = [FakeProxmoxServer(SyntheticCluster(guests, seed=i), latency_ms=latency_ms).start()
+               for i in range(clusters)]
+    try:
+        names = _configure(servers, timeout)
+        with _quiet():
+            from tools import proxmox_reader as reader
+            from tools.clusters import left_out_clusters
+        deadline = time.monotonic() + 15
+        while any(not s["connected"] for s in reader.get_cluster_stats()["clusters"].values()):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"clusters did not connect: {reader.get_cluster_stats()}")
+            time.sleep(0.05)
+
+        results = []
+        for name in READERS:
+            read = getattr(reader, name)
+            with _quiet():
+                merged = read()
+            rows = len(merged["vms"]) if isinstance(merged, dict) else len(merged)
+            row = {
+                "reader": name,
+                "fanout_ms": _cold_ms(reader, read, repeat),
+                "sequential_ms": _cold_ms(reader, lambda: [read(cluster=n) for n in names], repeat),
+                "rows": rows,
+            }
+            results.append(row)
+            print(json.dumps(row))
+
+        partial = None
+        if clusters > 1 and slow_ms:
+            servers[-1].latency_ms = slow_ms
+            reader.invalidate_inventory()
+            start = time.perf_counter()
+            with _quiet(), left_out_clusters() as left_out:
+                vms = reader.list_all_vms()
+            partial = {
+                "slow_ms": slow_ms,
+                "timeout_s": timeout,
+                "partial_ms": round((time.perf_counter() - start) * 1000, 1),
+                "answered": sorted({vm["cluster"] for vm in vms}),
+                "unavailable": left_out,
+            }
+            print(json.dumps(partial))
+    finally:
+        for server in servers:
+            server.stop()
+    return {
+        "meta": {"commit": _git_commit(), "clusters": clusters, "guests": guests, "latency_ms": latency_ms,
+                 "repeat": repeat, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+        "partial": partial,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, default=5)
+    parser.add_argument("--guests", type=int, default=2000, help="guests per cluster")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="delay each fake API adds per request")
+    parser.add_argument("--slow-ms", type=float, default=3000.0, help="latency of the slow cluster (0 = skip)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="PROXMOX_FANOUT_TIMEOUT in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="cold calls per measurement")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = run(args.clusters, args.guests, args.latency_ms, args.slow_ms, args.timeout, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
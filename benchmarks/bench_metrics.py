@@ -0,0 +1,161 @@
+# benchmarks/bench_metrics.py
+"""
+Usage-history queries answered from the metric ring buffers against the
+same queries over the raw rrddata rows kept as dicts, and the time to
+collect rrddata from the fake API at several concurrency limits.
+
+    python -m benchmarks.bench_metrics --guests 1000 10000
+    python -m benchmarks.bench_metrics --guests 2000 --collect --workers 1 8 32 --latency-ms 5
+
+For each size:
+  ingest_ms                    appending one rrddata answer per running guest
+  store_kib / dict_kib         memory held by the ring buffers / by the parsed rows
+  top_ms / dict_top_ms         top 10 guests by p95 CPU over the last hour
+  spread_ms / dict_spread_ms   percentiles of every guest's mean CPU over the last hour
+With --collect, per worker count:
+  collect_s, requests          one collect_metrics() run against the fake server
+"""
+import argparse
+import gc
+import heapq
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+from tools.metrics_store import MetricStore
+
+WINDOW = 3600
+
+
+def _best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def _retained(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def _p95(values):
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * 0.95
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def dict_top(rows_by_id, now, k=10):
+    """Top k guests by p95 CPU over the window, from the raw rows."""
+    scored = []
+    for sid, rows in rows_by_id.items():
+        cpu = [r["cpu"] * 100 for r in rows if r.get("cpu") is not None and r["time"] >= now - WINDOW]
+        if cpu:
+            scored.append((_p95(cpu), sid))
+    return heapq.nlargest(k, scored)
+
+
+def dict_spread(rows_by_id, now):
+    means = []
+    for rows in rows_by_id.values():
+        cpu = [r["cpu"] * 100 for r in rows if r.get("cpu") is not None and r["time"] >= now - WINDOW]
+        if cpu:
+            means.append(sum(cpu) / len(cpu))
+    return statistics.quantiles(means, n=100)
+
+
+def run_queries(guests, repeat):
+    cluster = SyntheticCluster(guests)
+    running = [r for r in cluster.guests.values() if r["status"] == "running"]
+    payload = json.dumps({r["id"]: cluster.rrddata(r) for r in running})
+    rows_by_id, dict_bytes = _retained(lambda: json.loads(payload))
+
+    def ingest():
+        store = MetricStore(path=None)
+        for sid, rows in rows_by_id.items():
+            store.ingest(sid, rows)
+        return store
+
+    store, store_bytes = _retained(ingest)
+    now = time.time()
+    top = store.top("cpu", WINDOW, "p95", 10, now=now)
+    # Ties (CPU pinned at 100%) may order differently; the values must agree
+    expected = [value for value, _ in dict_top(rows_by_id, now)]
+    assert all(abs(t["value"] - v) < 0.01 for t, v in zip(top, expected))
+    row = {
+        "guests": guests,
+        "series": len(store),
+        "ingest_ms": _best_ms(ingest, max(1, repeat // 5)),
+        "store_kib": store_bytes // 1024,
+        "dict_kib": dict_bytes // 1024,
+        "top_ms": _best_ms(lambda: store.top("cpu", WINDOW, "p95", 10, now=now), repeat),
+        "dict_top_ms": _best_ms(lambda: dict_top(rows_by_id, now), repeat),
+        "spread_ms": _best_ms(lambda: store.percentiles("cpu", WINDOW, now=now), repeat),
+        "dict_spread_ms": _best_ms(lambda: dict_spread(rows_by_id, now), repeat),
+    }
+    row["top_speedup"] = round(row["dict_top_ms"] / row["top_ms"], 1) if row["top_ms"] else None
+    return row
+
+
+def run_collect(guest_counts, workers, latency_ms):
+    from benchmarks.bench_readers import _connect, _quiet
+    server = FakeProxmoxServer(SyntheticCluster(guest_counts[0]), latency_ms=latency_ms).start()
+    try:
+        reader, _ = _connect(server)
+        rows = []
+        for guests in guest_counts:
+            server.set_cluster(SyntheticCluster(guests))
+            reader.invalidate_inventory()
+            for count in workers:
+                requests = server.requests
+                with _quiet():
+                    result = reader.collect_metrics(max_workers=count)
+                rows.append({
+                    "guests": guests, "workers": count, "collect_s": result.get("seconds"),
+                    "series": result["series"], "errors": result["errors"], "requests": server.requests - requests,
+                })
+                print(json.dumps(rows[-1]))
+        return rows
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--collect", action="store_true", help="also time collection from the fake API")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="delay the fake API adds per request")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {"queries": [], "collect": []}
+    for guests in args.guests:
+        row = run_queries(guests, args.repeat)
+        results["queries"].append(row)
+        print(json.dumps(row))
+    if args.collect:
+        results["collect"] = run_collect(args.guests, args.workers, args.latency_ms)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
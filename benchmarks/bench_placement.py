@@ -0,0 +1,81 @@
+# benchmarks/bench_placement.py
+"""
+Time to place a batch of new VMs with the placement engine on synthetic
+clusters (no API server needed).
+
+    python -m benchmarks.bench_placement --guests 1000 10000 50000 --batch 100
+
+For each size:
+  model_ms    one-off build of the per-node free capacity (once per snapshot)
+  spread_ms   placing --batch VMs with the default strategy and anti-affinity
+  pack_ms     the same with best-fit packing and no anti-affinity
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_proxmox import SyntheticCluster
+from tools.columnar import ColumnarInventory
+from tools.placement import PlacementModel
+
+
+def _best_ms(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3), result
+
+
+def run(guest_counts, batch, cores, memory_mb, disk_gb, repeat):
+    results = []
+    for guests in guest_counts:
+        cluster = SyntheticCluster(guests)
+        inv = ColumnarInventory(cluster.resources)
+        pools = cluster.storage()
+        model_ms, model = _best_ms(lambda: PlacementModel(inv, pools), repeat)
+        spread_ms, spread = _best_ms(lambda: model.place(cores, memory_mb, disk_gb, count=batch), repeat)
+        pack_ms, pack = _best_ms(
+            lambda: model.place(cores, memory_mb, disk_gb, count=batch, strategy="pack", anti_affinity=False), repeat
+        )
+        row = {
+            "guests": guests,
+            "nodes": len(model.nodes),
+            "batch": batch,
+            "model_ms": model_ms,
+            "spread_ms": spread_ms,
+            "spread_nodes_used": len({p["node"] for p in spread["placements"]}),
+            "pack_ms": pack_ms,
+            "pack_nodes_used": len({p["node"] for p in pack["placements"]}),
+            "unplaced": spread["unplaced"],
+        }
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--cores", type=int, default=4)
+    parser.add_argument("--memory-mb", type=int, default=8192)
+    parser.add_argument("--disk-gb", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.guests, args.batch, args.cores, args.memory_mb, args.disk_gb, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
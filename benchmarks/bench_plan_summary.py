@@ -0,0 +1,174 @@
+# benchmarks/bench_plan_summary.py
+"""
+Compares what the LLM receives for large Terraform plans: the raw
+human-readable plan text versus the compact summary built from
+'terraform show -json'.
+
+    python -m benchmarks.bench_plan_summary --vms 10 100 500
+    python -m benchmarks.bench_plan_summary --vms 100 --llm   # also time Groq
+
+Token counts are estimated at ~4 characters per token. With --llm (and
+GROQ_API_KEY set) each payload is also sent to the model once to measure
+end-to-end latency.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.plan_summary import format_plan_summary, summarize_plan
+
+# Roughly what telmate/proxmox puts in a proxmox_vm_qemu plan
+VM_ATTRIBUTES = {
+    "agent": 1, "balloon": 0, "bios": "seabios", "boot": "order=scsi0", "bootdisk": None,
+    "ciuser": "ubuntu", "clone": "ubuntu-2204-template", "cores": 4, "cpu": "host",
+    "define_connection_info": True, "desc": "managed by terraform", "force_create": False,
+    "full_clone": True, "hotplug": "network,disk,usb", "ipconfig0": "ip=dhcp",
+    "kvm": True, "memory": 8192, "nameserver": None, "numa": False, "onboot": True,
+    "os_type": "cloud-init", "pool": None, "qemu_os": "l26", "scsihw": "virtio-scsi-pci",
+    "searchdomain": None, "sockets": 1, "sshkeys": "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAI...",
+    "tablet": True, "tags": "web", "target_node": "pve1", "vcpus": 0, "vga": [],
+    "disk": [{"size": "32G", "storage": "local-lvm", "type": "scsi"}],
+    "network": [{"bridge": "vmbr0", "model": "virtio", "firewall": False}],
+}
+UNKNOWN_ATTRIBUTES = ("id", "default_ipv4_address", "ssh_host", "ssh_port", "unused_disk", "reboot_required")
+
+
+def synthetic_plan(n_vms, n_updates=0):
+    """Builds a 'terraform show -json' document creating n_vms VMs and updating n_updates."""
+    changes = []
+    for i in range(n_vms):
+        after = dict(VM_ATTRIBUTES, name=f"web-{i:03d}", target_node=f"pve{i % 8 + 1}")
+        changes.append({
+            "address": f"proxmox_vm_qemu.web[{i}]",
+            "type": "proxmox_vm_qemu",
+            "name": "web",
+            "index": i,
+            "change": {
+                "actions": ["create"],
+                "before": None,
+                "after": after,
+                "after_unknown": {k: True for k in UNKNOWN_ATTRIBUTES},
+                "after_sensitive": {"sshkeys": True},
+            },
+        })
+    for i in range(n_updates):
+        before = dict(VM_ATTRIBUTES, name=f"db-{i:03d}")
+        after = dict(before, memory=16384, cores=8)
+        changes.append({
+            "address": f"proxmox_vm_qemu.db[{i}]",
+            "type": "proxmox_vm_qemu",
+            "name": "db",
+            "index": i,
+            "change": {"actions": ["update"], "before": before, "after": after, "after_unknown": {}},
+        })
+    return {"format_version": "1.2", "resource_changes": changes}
+
+
+def _render_value(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(value)
+
+
+def render_human_plan(plan):
+    """Approximates the text 'terraform plan' prints for the same changes."""
+    lines = ["", "Terraform will perform the following actions:", ""]
+    adds = changes = 0
+    for rc in plan["resource_changes"]:
+        action = rc["change"]["actions"][0]
+        before = rc["change"].get("before") or {}
+        after = rc["change"].get("after") or {}
+        if action == "create":
+            adds += 1
+            lines.append(f"  # {rc['address']} will be created")
+            lines.append(f'  + resource "{rc["type"]}" "{rc["name"]}" {{')
+            for key in sorted(set(after) | set(rc["change"].get("after_unknown", {}))):
+                if key in rc["change"].get("after_unknown", {}):
+                    lines.append(f"      + {key:<24} = (known after apply)")
+                elif isinstance(after[key], list):
+                    for block in after[key]:
+                        lines.append(f"      + {key} {{")
+                        for bk, bv in block.items():
+                            lines.append(f"          + {bk:<20} = {_render_value(bv)}")
+                        lines.append("        }")
+                else:
+                    lines.append(f"      + {key:<24} = {_render_value(after[key])}")
+            lines.append("    }")
+        else:
+            changes += 1
+            lines.append(f"  # {rc['address']} will be updated in-place")
+            lines.append(f'  ~ resource "{rc["type"]}" "{rc["name"]}" {{')
+            for key in sorted(after):
+                if before.get(key) != after.get(key):
+                    lines.append(f"      ~ {key:<24} = {_render_value(before.get(key))} -> {_render_value(after[key])}")
+            lines.append(f"        # ({len(after) - 2} unchanged attributes hidden)")
+            lines.append("    }")
+        lines.append("")
+    lines.append(f"Plan: {adds} to add, {changes} to change, 0 to destroy.")
+    return "\n".join(lines)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def time_llm(payload):
+    from langchain_groq import ChatGroq
+    llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0, timeout=120)
+    start = time.perf_counter()
+    llm.invoke(f"Summarize this Terraform plan for an operator in 3 sentences:\n\n{payload}")
+    return time.perf_counter() - start
+
+
+def run(vm_counts, updates, use_llm):
+    results = []
+    for n in vm_counts:
+        plan = synthetic_plan(n, updates)
+        raw = render_human_plan(plan)
+
+        start = time.perf_counter()
+        summary = format_plan_summary(summarize_plan(plan))
+        summarize_ms = (time.perf_counter() - start) * 1000
+
+        row = {
+            "vms": n,
+            "updates": updates,
+            "raw_tokens": estimate_tokens(raw),
+            "summary_tokens": estimate_tokens(summary),
+            "summarize_ms": round(summarize_ms, 2),
+        }
+        row["reduction"] = round(row["raw_tokens"] / row["summary_tokens"], 1)
+        if use_llm:
+            row["llm_raw_s"] = round(time_llm(raw), 2)
+            row["llm_summary_s"] = round(time_llm(summary), 2)
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vms", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--updates", type=int, default=5)
+    parser.add_argument("--llm", action="store_true", help="also time one Groq call per payload")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.llm and not os.getenv("GROQ_API_KEY"):
+        parser.error("--llm needs GROQ_API_KEY")
+    results = run(args.vms, args.updates, args.llm)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
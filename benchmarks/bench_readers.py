@@ -0,0 +1,202 @@
+# benchmarks/bench_readers.py
+"""
+Latency, throughput and peak memory of every Proxmox reader and read
+@tool, against the local fake API server at several cluster sizes.
+
+    python -m benchmarks.bench_readers --guests 10 1000 10000 50000
+    python -m benchmarks.bench_readers --guests 5000 --latency-ms 20 --json after.json
+    python -m benchmarks.bench_readers --guests 5000 --compare before.json
+
+For each function:
+  cold_ms   first call after the snapshot cache was dropped (includes the fetch)
+  p50/p95   warm calls, repeated for up to --seconds per function
+  ops_per_s warm throughput
+  peak_kib  peak Python allocation of a cold call (tracemalloc)
+  requests  API requests made by the cold call
+
+The Terraform tools are not included; see bench_plan_summary.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+
+# Upper bound on guests fetched by the bulk config cases
+CONFIG_SAMPLE = 100
+
+
+def _percentile(sorted_values, share):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+@contextlib.contextmanager
+def _quiet():
+    # The readers and tools print progress; keep it out of the timings and the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _cases(reader, agent, cluster):
+    """(name, kind, callable) for every read path, with arguments valid for this cluster."""
+    guest = cluster.guests[min(cluster.guests)] if cluster.guests else {"vmid": 100, "name": "vm-100", "node": "pve1"}
+    node = guest["node"]
+    sample = sorted(cluster.guests)[:CONFIG_SAMPLE]
+    return [
+        ("get_all_nodes", "reader", reader.get_all_nodes),
+        ("get_cluster_resources", "reader", reader.get_cluster_resources),
+        ("list_all_vms", "reader", reader.list_all_vms),
+        ("find_vms_by_name", "reader", lambda: reader.find_vms_by_name(guest["name"])),
+        ("get_vm_config", "reader", lambda: reader.get_vm_config(guest["vmid"])),
+        ("get_vm_configs[vmids]", "reader", lambda: reader.get_vm_configs(vmids=sample)),
+        ("list_storage_pools", "reader", reader.list_storage_pools),
+        ("get_node_vms", "reader", lambda: reader.get_node_vms(node)),
+        ("get_proxmox_vms", "tool", lambda: agent.get_proxmox_vms.invoke({})),
+        ("get_proxmox_cluster_info", "tool", lambda: agent.get_proxmox_cluster_info.invoke({})),
+        ("get_node_vms_info", "tool", lambda: agent.get_node_vms_info.invoke({"node": node})),
+        ("get_specific_vm_config", "tool", lambda: agent.get_specific_vm_config.invoke({"vmid": guest["vmid"]})),
+        ("get_bulk_vm_configs", "tool", lambda: agent.get_bulk_vm_configs.invoke({"vmids": sample})),
+        ("get_proxmox_storage", "tool", lambda: agent.get_proxmox_storage.invoke({})),
+    ]
+
+
+def measure(fn, reader, server, seconds, max_iterations):
+    """Cold call, warm loop, then a traced cold call for peak memory."""
+    with _quiet():
+        reader.invalidate_inventory()
+        requests_before = server.requests
+        start = time.perf_counter()
+        fn()
+        cold = time.perf_counter() - start
+        requests = server.requests - requests_before
+
+        latencies = []
+        loop_start = time.perf_counter()
+        while len(latencies) < max_iterations and time.perf_counter() - loop_start < seconds:
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+        loop_time = time.perf_counter() - loop_start
+
+        reader.invalidate_inventory()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "cold_ms": round(cold * 1000, 2),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "ops_per_s": round(len(latencies) / loop_time, 1),
+        "iterations": len(latencies),
+        "peak_kib": peak // 1024,
+        "requests": requests,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _connect(server):
+    """Points the reader at the fake server and waits until it is live."""
+    os.environ["PROXMOX_HOST"] = server.url
+    os.environ["PROXMOX_USER"] = "root@pam"
+    os.environ["PROXMOX_PASSWORD"] = "benchmark"
+    os.environ.pop("PROXMOX_TOKEN_ID", None)
+    os.environ.pop("PROXMOX_TOKEN_SECRET", None)
+    from benchmarks.bench_router import load_agent
+    with _quiet():
+        agent = load_agent()
+    from tools import proxmox_reader as reader
+    deadline = time.monotonic() + 10
+    while reader.is_mock_mode() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if reader.is_mock_mode():
+        raise RuntimeError(f"reader did not connect to the fake server: {reader.get_connection_status()}")
+    return reader, agent
+
+
+def run(guest_counts, latency_ms, jitter_ms, seconds, max_iterations, only=None):
+    server = FakeProxmoxServer(SyntheticCluster(guest_counts[0]), latency_ms=latency_ms, jitter_ms=jitter_ms).start()
+    try:
+        reader, agent = _connect(server)
+        results = []
+        for guests in guest_counts:
+            cluster = SyntheticCluster(guests)
+            server.set_cluster(cluster)
+            for name, kind, fn in _cases(reader, agent, cluster):
+                if only and name not in only:
+                    continue
+                row = {"guests": guests, "function": name, "kind": kind}
+                row.update(measure(fn, reader, server, seconds, max_iterations))
+                results.append(row)
+                print(json.dumps(row))
+    finally:
+        server.stop()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline_path, report):
+    """Prints p50/cold/peak ratios against a previous run (>1.0 means slower or bigger now)."""
+    with open(baseline_path) as f:
+        baseline = {(r["guests"], r["function"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for row in report["results"]:
+        old = baseline.get((row["guests"], row["function"]))
+        if not old:
+            continue
+        ratios = {
+            key: round(row[key] / old[key], 2) if old[key] else None
+            for key in ("cold_ms", "p50_ms", "peak_kib")
+        }
+        print(f"{row['guests']:>6} {row['function']:<26} " + "  ".join(f"{k} x{v}" for k, v in ratios.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay the fake API adds per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seconds", type=float, default=2.0, help="time budget for the warm loop per function")
+    parser.add_argument("--iterations", type=int, default=200, help="max warm calls per function")
+    parser.add_argument("--only", nargs="+", help="function names to run")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    args = parser.parse_args()
+
+    report = run(args.guests, args.latency_ms, args.jitter_ms, args.seconds, args.iterations, args.only)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_router.py
+"""
+Measures the deterministic fast path: which share of a typical question
+mix the intent router answers without the LLM, and how long those
+answers take compared with a full agent turn.
+
+    python -m benchmarks.bench_router
+    python -m benchmarks.bench_router --repeat 200 --llm   # also time the agent
+
+Runs against the reader's mock data unless PROXMOX_HOST points at a
+reachable cluster. With --llm (and GROQ_API_KEY set) every routed question
+is also sent once through the agent to measure the latency saved.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# A mix of lookups the router should answer and questions it must not
+QUESTIONS = [
+    "How many VMs do I have?",
+    "how many running vms",
+    "How many containers are there?",
+    "List all VMs",
+    "Show me all my containers",
+    "what vms are running",
+    "VMs on pve1",
+    "what is running on node pve2",
+    "List all storage pools",
+    "What storage is available?",
+    "list nodes",
+    "What's the config of VM 100?",
+    "vm 101 config",
+    "Which VM uses the most memory?",
+    "Create an Ubuntu VM with 4 cores on pve1",
+    "Why is VM 101 stopped?",
+    "Compare pve1 and pve2",
+    "Destroy everything",
+    "yes",
+    "Plan a new container on pve2",
+]
+
+
+def load_agent():
+    os.environ.setdefault("PROXMOX_HOST", "127.0.0.1")
+    os.environ.setdefault("GROQ_API_KEY", "unused")
+    spec = importlib.util.spec_from_file_location("agent_main", os.path.join(ROOT, "agent-main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def run(repeat, use_llm):
+    agent = load_agent()
+    router = agent.router
+    routed, timings = [], []
+    for question in QUESTIONS:
+        answer = router.route(question)
+        if answer is not None:
+            routed.append(question)
+    for _ in range(repeat):
+        for question in routed:
+            start = time.perf_counter()
+            router.route(question)
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    result = {
+        "questions": len(QUESTIONS),
+        "routed": len(routed),
+        "hit_rate": round(len(routed) / len(QUESTIONS), 3),
+        "router_p50_ms": _ms(statistics.median(timings)) if timings else None,
+        "router_p99_ms": _ms(timings[int(len(timings) * 0.99) - 1]) if timings else None,
+    }
+    if use_llm:
+        llm_timings = []
+        for question in routed:
+            start = time.perf_counter()
+            agent.agent_executor.invoke({"messages": [agent.HumanMessage(content=question)]})
+            llm_timings.append(time.perf_counter() - start)
+        result["llm_p50_ms"] = _ms(statistics.median(llm_timings))
+        result["speedup"] = round(result["llm_p50_ms"] / result["router_p50_ms"]) if result["router_p50_ms"] else None
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="router passes over the routed questions")
+    parser.add_argument("--llm", action="store_true", help="also time one agent turn per routed question")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.llm and not os.getenv("GROQ_API_KEY"):
+        parser.error("--llm needs GROQ_API_KEY")
+    result = run(args.repeat, args.llm)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# benchmarks/bench_server.py
+"""
+Load test of the chat server: N simulated sessions talk to one in-process
+ChatServer over WebSocket (or HTTP), which reads the fake Proxmox API and
+calls a scripted stand-in for Groq that answers after --llm-ms and goes
+through the same shared rate limiter as ChatGroq.
+
+    python -m benchmarks.bench_server --sessions 1 10 50
+    python -m benchmarks.bench_server --sessions 100 --turns 5 --rpm 600 --transport http --json server.json
+
+Every session asks --turns questions from a mix of router-answered
+lookups and agent questions (a tool call, then the answer); sessions
+start at different points of the mix, so the response cache fills from
+whichever session asks first. For each session count:
+  p50_ms / p99_ms        latency of a turn as the client sees it
+  by_source              the same per answer source (routed, cached, agent)
+  first_event_p50_ms     agent turns: until the first streamed event (WebSocket only)
+  turns_per_s            completed turns per second of wall-clock time
+  api_requests           requests the fake Proxmox API served (shared pool and inventory)
+  llm_calls              calls made to the stand-in model
+  limiter_waits          model calls that waited for the rate limiter
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from benchmarks.bench_readers import _connect, _git_commit, _quiet
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+from tools.chat_server import OP_CLOSE, OP_TEXT, ChatServer, _encode_frame, _read_frame
+from tools.rate_limit import GroqRateLimiter
+
+# (question, tool the stand-in model calls for it, or None if the router answers)
+QUESTIONS = [
+    ("How many VMs do I have?", None),
+    ("Which VMs use the most memory?", "get_proxmox_vms"),
+    ("How much capacity is left in the cluster?", "get_cluster_capacity"),
+    ("list nodes", None),
+    ("Which storage pool has the most free space?", "get_proxmox_storage"),
+    ("Give me an overview of the cluster", "get_proxmox_cluster_info"),
+    ("what vms are running", None),
+    ("Is the cluster overcommitted?", "get_cluster_capacity"),
+]
+TOOL_FOR = {question: tool for question, tool in QUESTIONS}
+
+
+class ScriptedModel(BaseChatModel):
+    """Stand-in for ChatGroq: calls the tool the question needs, then answers."""
+
+    delay: float = 0.3
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        self.calls += 1
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"Done: the tool returned {len(str(last.content))} characters.")
+        else:
+            tool = TOOL_FOR.get(last.content, "get_proxmox_vms")
+            message = AIMessage(content="", tool_calls=[{"name": tool, "args": {}, "id": f"call-{self.calls}"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+async def _ws_session(port, session_id, questions, samples):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        f"GET /sessions/{session_id}/ws HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\n"
+        f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode()
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 101"):
+        raise RuntimeError(f"WebSocket handshake failed: {head[:200]!r}")
+    await _read_frame(reader, require_mask=False)  # the 'session' event
+    for question in questions:
+        start = time.perf_counter()
+        first = None
+        writer.write(_encode_frame(OP_TEXT, json.dumps({"message": question}).encode(), mask=os.urandom(4)))
+        while True:
+            _fin, _opcode, payload = await _read_frame(reader, require_mask=False)
+            event = json.loads(payload)
+            if event["type"] == "output":
+                first = first or time.perf_counter()
+                continue
+            samples.append({
+                "seconds": time.perf_counter() - start,
+                "first_event": (first - start) if first else None,
+                "source": event.get("source", "error"),
+            })
+            break
+    writer.write(_encode_frame(OP_CLOSE, b"\x03\xe8", mask=os.urandom(4)))
+    await writer.drain()
+    writer.close()
+
+
+async def _http_session(port, session_id, questions, samples):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for question in questions:
+        body = json.dumps({"message": question}).encode()
+        start = time.perf_counter()
+        writer.write(
+            f"POST /sessions/{session_id}/messages HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+        result = json.loads(await reader.readexactly(length))
+        samples.append({"seconds": time.perf_counter() - start, "first_event": None,
+                        "source": result.get("source", "error")})
+    writer.close()
+
+
+async def _drive(agent, sessions, turns, transport, workers):
+    server = await ChatServer(agent.answer_turn, stats=agent.service_stats, port=0, workers=workers,
+                              host="127.0.0.1", token="").start()
+    samples = []
+    client = _ws_session if transport == "ws" else _http_session
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            client(server.port, f"s{i}", [QUESTIONS[(i + t) % len(QUESTIONS)][0] for t in range(turns)], samples)
+            for i in range(sessions)
+        ))
+        return samples, time.perf_counter() - start, server.stats()
+    finally:
+        await server.close()
+
+
+def run(session_counts, turns, transport, guests, latency_ms, llm_ms, rpm, workers):
+    server = FakeProxmoxServer(SyntheticCluster(guests), latency_ms=latency_ms).start()
+    results = []
+    try:
+        reader, agent = _connect(server)
+        for sessions in session_counts:
+            # Every run starts cold: no inventory, no cached answers
+            reader.invalidate_inventory()
+            agent.response_cache.clear()
+            agent.groq_limiter = GroqRateLimiter(rpm, burst=max(1, int(rpm // 60))) if rpm > 0 else None
+            model = ScriptedModel(delay=llm_ms / 1000, rate_limiter=agent.groq_limiter)
+            agent.agent_executor = agent.create_agent(model, agent.tools, system_prompt=agent.master_prompt)
+            requests = server.requests
+            with _quiet():
+                samples, wall, stats = asyncio.run(_drive(agent, sessions, turns, transport, workers))
+            seconds = sorted(s["seconds"] for s in samples)
+            by_source = {}
+            for source in sorted({s["source"] for s in samples}):
+                values = sorted(s["seconds"] for s in samples if s["source"] == source)
+                by_source[source] = {"turns": len(values), "p50_ms": _ms(_percentile(values, 50)),
+                                     "p99_ms": _ms(_percentile(values, 99))}
+            first = sorted(s["first_event"] for s in samples if s["source"] == "agent" and s["first_event"])
+            row = {
+                "sessions": sessions,
+                "turns": len(samples),
+                "p50_ms": _ms(_percentile(seconds, 50)),
+                "p99_ms": _ms(_percentile(seconds, 99)),
+                "by_source": by_source,
+                "first_event_p50_ms": _ms(_percentile(first, 50)) if first else None,
+                "turns_per_s": round(len(samples) / wall, 1),
+                "api_requests": server.requests - requests,
+                "llm_calls": model.calls,
+                "limiter_waits": stats.get("groq_limiter", {}).get("requests", {}).get("waits", 0),
+                "errors": stats["errors"],
+            }
+            results.append(row)
+            print(json.dumps(row))
+    finally:
+        server.stop()
+    return {
+        "meta": {"commit": _git_commit(), "transport": transport, "guests": guests, "latency_ms": latency_ms,
+                 "llm_ms": llm_ms, "rpm": rpm, "workers": workers, "threads": threading.active_count(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--turns", type=int, default=4, help="questions per session")
+    parser.add_argument("--transport", choices=("ws", "http"), default="ws")
+    parser.add_argument("--guests", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="delay the fake API adds per request")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="time the stand-in model takes per call")
+    parser.add_argument("--rpm", type=float, default=0, help="model calls per minute for the shared limiter (0 = off)")
+    parser.add_argument("--workers", type=int, help="server turn workers (default CHAT_SERVER_WORKERS)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = run(args.sessions, args.turns, args.transport, args.guests, args.latency_ms,
+                 args.llm_ms, args.rpm, args.workers)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/bench_snapshot.py
+"""
+Startup with and without the on-disk snapshot: each size is recorded
+from the fake API with record_snapshot(), replayed through
+SyntheticCluster.from_snapshot() (checked against the original), then a
+fresh process imports the reader and asks for the guest list.
+
+    python -m benchmarks.bench_snapshot --guests 1000 10000 50000
+    python -m benchmarks.bench_snapshot --guests 10000 --latency-ms 50 --json snapshot.json
+
+For each size:
+  record_s              record_snapshot() with every guest config
+  file_kib              size of the snapshot file
+  load_ms               opening the file and decoding the inventory (best of --repeat)
+  replay_ok             the replayed cluster serves the recorded inventory and configs
+  import_ms             new process: importing the reader (snapshot load included when warm)
+  cold_first_ms         no snapshot: from import to the first list_all_vms() answer
+  warm_first_ms         with snapshot: the same, answered stale from disk
+  warm_live_ms          with snapshot: from import until the background refresh made the data live
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_readers import _connect, _git_commit, _quiet
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+from tools.snapshot_store import SnapshotStore
+
+# Run in a fresh interpreter so nothing is cached from this process
+STARTUP = """
+import json, time
+start = time.perf_counter()
+from tools import proxmox_reader as reader
+imported = time.perf_counter()
+guests = len(reader.list_all_vms())
+first = time.perf_counter()
+source = reader.get_data_source()["source"]
+while reader.get_data_source()["source"] != "live" or reader.get_data_source()["refreshing"]:
+    time.sleep(0.005)
+    reader.list_all_vms()
+print(json.dumps({"guests": guests, "source": source, "import_ms": (imported - start) * 1000,
+                  "first_ms": (first - imported) * 1000, "live_ms": (time.perf_counter() - imported) * 1000}))
+"""
+
+
+def _startup(server, snapshot_path):
+    env = {**os.environ, "PROXMOX_HOST": server.url, "PROXMOX_USER": "root@pam", "PROXMOX_PASSWORD": "benchmark",
+           "PROXMOX_SNAPSHOT_PATH": snapshot_path or "", "TELEMETRY": "off"}
+    env.pop("PROXMOX_TOKEN_ID", None)
+    env.pop("PROXMOX_TOKEN_SECRET", None)
+    if not snapshot_path:
+        env.pop("PROXMOX_SNAPSHOT_PATH")
+    out = subprocess.run([sys.executable, "-c", STARTUP], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(f"startup run failed: {out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def _replay_ok(store, cluster):
+    replayed = SyntheticCluster.from_snapshot(store)
+    sample = sorted(cluster.guests)[:50]
+    return replayed.resources == cluster.resources and all(replayed.config(v) == cluster.config(v) for v in sample)
+
+
+def run(guest_counts, latency_ms, repeat, workers):
+    server = FakeProxmoxServer(SyntheticCluster(guest_counts[0]), latency_ms=latency_ms).start()
+    results = []
+    try:
+        reader, _ = _connect(server)
+        with tempfile.TemporaryDirectory() as tmp:
+            for guests in guest_counts:
+                cluster = SyntheticCluster(guests)
+                server.set_cluster(cluster)
+                reader.invalidate_inventory()
+                path = os.path.join(tmp, f"snapshot-{guests}.db")
+                store = SnapshotStore(path)
+                start = time.perf_counter()
+                with _quiet():
+                    reader.record_snapshot(store, max_workers=workers)
+                row = {"guests": guests, "record_s": round(time.perf_counter() - start, 2),
+                       "file_kib": os.path.getsize(path) // 1024}
+
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    SnapshotStore(path).get("/cluster/resources")
+                    best = min(best, time.perf_counter() - start)
+                row["load_ms"] = round(best * 1000, 1)
+                row["replay_ok"] = _replay_ok(store, cluster)
+
+                cold = _startup(server, None)
+                warm = _startup(server, path)
+                row.update(
+                    cold_import_ms=round(cold["import_ms"], 1),
+                    warm_import_ms=round(warm["import_ms"], 1),
+                    cold_first_ms=round(cold["first_ms"], 1),
+                    warm_first_ms=round(warm["first_ms"], 1),
+                    warm_source=warm["source"],
+                    warm_live_ms=round(warm["live_ms"], 1),
+                )
+                results.append(row)
+                print(json.dumps(row))
+    finally:
+        server.stop()
+    return {
+        "meta": {"commit": _git_commit(), "latency_ms": latency_ms, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="delay the fake API adds per request")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=32, help="concurrent config requests while recording")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = run(args.guests, args.latency_ms, args.repeat, args.workers)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
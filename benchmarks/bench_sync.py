@@ -0,0 +1,175 @@
+# benchmarks/bench_sync.py
+"""
+API traffic of keeping the inventory fresh: full /cluster/resources
+polling against the incremental sync, at the same poll interval and
+while the fake cluster runs a steady stream of guest tasks.
+
+    python -m benchmarks.bench_sync --guests 1000 10000 --interval 2 --seconds 30
+    python -m benchmarks.bench_sync --guests 50000 --tasks-per-minute 120 --json sync.json
+
+For each size and mode:
+  bytes_per_min      response bytes served by the fake API, scaled to a minute
+  requests_per_min   API requests, scaled to a minute
+  amortized_per_min  sync only: plus one full refetch every PROXMOX_SYNC_FULL_INTERVAL
+  stale_guests       guests whose status or node differ from the fake cluster
+                     one interval after the task stream stopped
+  changes            feed events published by the sync
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_readers import _connect, _git_commit, _quiet
+from benchmarks.fake_proxmox import FakeProxmoxServer, SyntheticCluster
+
+
+class TaskStream:
+    """Runs random guest tasks on the cluster at a fixed rate on a thread."""
+
+    def __init__(self, cluster, per_minute, seed=1):
+        self.cluster = cluster
+        self.period = 60.0 / per_minute if per_minute else None
+        self.rng = random.Random(seed)
+        self.count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="task-stream", daemon=True)
+
+    def __enter__(self):
+        if self.period:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.cluster.random_task(self.rng)
+            self.count += 1
+
+
+def _stale_guests(reader, cluster):
+    with cluster.lock:
+        truth = {vmid: (r["status"], r["node"]) for vmid, r in cluster.guests.items()}
+    seen = {r["vmid"]: (r.get("status"), r.get("node")) for r in reader.list_all_vms()}
+    return sum(1 for vmid in truth.keys() | seen.keys() if truth.get(vmid) != seen.get(vmid))
+
+
+def _measure(server, seconds, poll=None):
+    bytes_before, requests_before = server.bytes_sent, server.requests
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        if poll:
+            poll()
+        time.sleep(poll.interval if poll else min(1.0, seconds))
+    elapsed = time.monotonic() - start
+    scale = 60 / elapsed
+    return {
+        "bytes_per_min": int((server.bytes_sent - bytes_before) * scale),
+        "requests_per_min": round((server.requests - requests_before) * scale, 1),
+    }
+
+
+def run_full(reader, server, cluster, interval, seconds, per_minute):
+    """Refetches /cluster/resources every interval, as readers do when the TTL equals it."""
+    def poll():
+        reader.invalidate_inventory()
+        reader.list_all_vms()
+    poll.interval = interval
+
+    with _quiet(), TaskStream(cluster, per_minute) as stream:
+        row = _measure(server, seconds, poll)
+    with _quiet():
+        poll()
+        row["stale_guests"] = _stale_guests(reader, cluster)
+    row["tasks"] = stream.count
+    return row
+
+
+def run_sync(reader, server, cluster, interval, seconds, per_minute, full_interval):
+    with _quiet():
+        resyncs = sum(reader.get_sync_stats()["resyncs"].values())
+        reader.invalidate_inventory()
+        reader.start_sync(interval)
+        # The initial full fetch is not part of the steady state
+        deadline = time.monotonic() + 60
+        while sum(reader.get_sync_stats()["resyncs"].values()) == resyncs and time.monotonic() < deadline:
+            time.sleep(0.05)
+        first_change = reader.get_recent_changes()[-1]["seq"] if reader.get_recent_changes() else 0
+        full_bytes = len(server._resources())
+        with TaskStream(cluster, per_minute) as stream:
+            row = _measure(server, seconds)
+        time.sleep(interval * 1.5)
+        stats = reader.get_sync_stats()
+        reader.stop_sync()
+        row["stale_guests"] = _stale_guests(reader, cluster)
+    row["amortized_per_min"] = row["bytes_per_min"] + int(full_bytes * 60 / full_interval) if full_interval else None
+    row["tasks"] = stream.count
+    row["changes"] = len(reader.get_recent_changes(first_change))
+    row["resyncs"] = stats["resyncs"]
+    return row
+
+
+def run(guest_counts, interval, seconds, per_minute, latency_ms):
+    from tools.inventory_sync import PROXMOX_SYNC_FULL_INTERVAL
+    server = FakeProxmoxServer(SyntheticCluster(guest_counts[0]), latency_ms=latency_ms).start()
+    try:
+        reader, _ = _connect(server)
+        results = []
+        for guests in guest_counts:
+            for mode in ("full", "sync"):
+                # A fresh cluster per mode so both see the same task stream
+                cluster = SyntheticCluster(guests)
+                server.set_cluster(cluster)
+                if mode == "full":
+                    row = run_full(reader, server, cluster, interval, seconds, per_minute)
+                else:
+                    row = run_sync(reader, server, cluster, interval, seconds, per_minute, PROXMOX_SYNC_FULL_INTERVAL)
+                row = {"guests": guests, "mode": mode, **row}
+                results.append(row)
+                print(json.dumps(row))
+            full, sync = results[-2], results[-1]
+            print(json.dumps({
+                "guests": guests,
+                "bytes_reduction": round(full["bytes_per_min"] / max(1, sync["amortized_per_min"] or sync["bytes_per_min"]), 1),
+            }))
+    finally:
+        server.stop()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "interval": interval,
+            "tasks_per_minute": per_minute,
+            "latency_ms": latency_ms,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--interval", type=float, default=2.0, help="poll interval for both modes (seconds)")
+    parser.add_argument("--seconds", type=float, default=30.0, help="measurement time per mode")
+    parser.add_argument("--tasks-per-minute", type=float, default=60.0, help="guest tasks the fake cluster runs")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = run(args.guests, args.interval, args.seconds, args.tasks_per_minute, args.latency_ms)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
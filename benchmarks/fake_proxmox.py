@@ -0,0 +1,505 @@
+# benchmarks/fake_proxmox.py
+"""
+Local stand-in for the Proxmox VE API, serving a synthetic cluster of
+any size so the readers and tools can be measured without real hardware.
+
+    python -m benchmarks.fake_proxmox --guests 5000 --port 18006 --latency-ms 20
+
+then point the agent at it:
+
+    PROXMOX_HOST=http://127.0.0.1:18006 PROXMOX_USER=root@pam PROXMOX_PASSWORD=x
+
+Implements the endpoints the readers use: /access/ticket, /version,
+/nodes, /cluster/resources, /storage and /nodes/{node}/{qemu|lxc}[/{vmid}/config],
+plus what the incremental sync follows: /cluster/tasks, /cluster/log,
+/nodes/{node}/{qemu|lxc}/{vmid}/status/current and /nodes/{node}/tasks/{upid}/log,
+and rrddata for nodes and guests (a smooth per-resource load curve).
+Ticket cookies and API-token headers are both accepted (any credentials).
+Every request waits latency_ms (+/- jitter_ms) before answering.
+SyntheticCluster.run_task() changes a guest and records the task and log
+lines the way Proxmox does.
+
+A recording of a real cluster (benchmarks/record_cluster.py) can be
+served instead of a generated one:
+
+    python -m benchmarks.fake_proxmox --snapshot cluster.db --port 18006
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+GUESTS_PER_NODE = 50
+LXC_SHARE = 0.25
+STOPPED_SHARE = 0.15
+STORAGES = ("local", "local-lvm", "ceph-vm", "nfs-backup")
+TEMPLATES = ("ubuntu-2204-template", "debian-12-template", "rocky-9-template")
+GIB = 1024 ** 3
+TICKET = "PVE:fake:ticket"
+CSRF = "fake-csrf"
+# Finished tasks kept in /cluster/tasks and entries kept in the cluster log
+TASK_HISTORY = 200
+LOG_HISTORY = 5000
+TASK_PREFIX = {"qemu": "qm", "lxc": "vz"}
+# Samples per rrddata answer and seconds between them, per timeframe
+RRD_POINTS = 70
+RRD_STEPS = {"hour": 60, "day": 1800, "week": 10800, "month": 43200, "year": 518400}
+# Relative frequency of the tasks random_task() runs
+TASK_MIX = (("start", 30), ("stop", 25), ("reboot", 20), ("migrate", 10), ("create", 8), ("destroy", 7))
+
+
+class SyntheticCluster:
+    """
+    Deterministic cluster of `guests` VMs/containers spread over `nodes`
+    nodes. Configs are derived from the resource on request, so a 50k
+    guest cluster costs one resource list, not 50k config dicts.
+    """
+
+    def __init__(self, guests, nodes=None, seed=0):
+        rng = random.Random(seed)
+        self._init_state()
+        self.node_names = [f"pve{i + 1}" for i in range(nodes or max(1, -(-guests // GUESTS_PER_NODE)))]
+        self.resources = []
+        for name in self.node_names:
+            self.resources.append({
+                "id": f"node/{name}", "type": "node", "node": name, "status": "online",
+                "maxcpu": 128, "maxmem": 768 * GIB, "cpu": round(rng.random(), 3),
+                "mem": rng.randint(64, 600) * GIB, "uptime": rng.randint(10 ** 4, 10 ** 7),
+            })
+        # Shared storages report the same usage on every node, as in Proxmox
+        shared_usage = {s: rng.randint(10, 90) * 1024 * GIB for s in STORAGES[2:]}
+        for name in self.node_names:
+            for storage in STORAGES[:2]:
+                self.resources.append({
+                    "id": f"storage/{name}/{storage}", "type": "storage", "node": name,
+                    "storage": storage, "status": "available", "shared": 0,
+                    "maxdisk": 2048 * GIB, "disk": rng.randint(100, 1800) * GIB,
+                })
+            for storage, used in shared_usage.items():
+                self.resources.append({
+                    "id": f"storage/{name}/{storage}", "type": "storage", "node": name,
+                    "storage": storage, "status": "available", "shared": 1,
+                    "maxdisk": 100 * 1024 * GIB, "disk": used,
+                })
+        self.guests = {}
+        for i in range(guests):
+            vmid = 100 + i
+            gtype = "lxc" if rng.random() < LXC_SHARE else "qemu"
+            running = rng.random() >= STOPPED_SHARE
+            cores = rng.choice((1, 2, 2, 4, 4, 8, 16))
+            memory = rng.choice((1, 2, 4, 4, 8, 16, 32)) * GIB
+            resource = {
+                "id": f"{gtype}/{vmid}", "type": gtype, "vmid": vmid,
+                "name": f"{'ct' if gtype == 'lxc' else 'vm'}-{vmid}",
+                "node": self.node_names[rng.randrange(len(self.node_names))],
+                "status": "running" if running else "stopped",
+                "maxcpu": cores, "maxmem": memory, "maxdisk": rng.choice((8, 32, 64, 128)) * GIB,
+                "cpu": round(rng.random(), 3) if running else 0,
+                "mem": int(memory * rng.random()) if running else 0,
+                "uptime": rng.randint(60, 10 ** 7) if running else 0,
+                "template": 0, "tags": rng.choice(("", "web", "db", "ci;build")),
+            }
+            self.resources.append(resource)
+            self.guests[vmid] = resource
+
+    def _init_state(self):
+        # Guards the lists below while tasks change them under a running server
+        self.lock = threading.RLock()
+        # Bumped on every change so the server knows to re-encode /cluster/resources
+        self.revision = 0
+        self.tasks = []
+        self.log = []
+        self.task_logs = {}
+        self._log_uid = 0
+        self._pid = 4096
+        # Recorded answers that replace generated ones (see from_snapshot)
+        self._configs = {}
+        self._storage = None
+
+    @classmethod
+    def from_snapshot(cls, store):
+        """
+        Cluster replaying a recording (a tools.snapshot_store.SnapshotStore):
+        the recorded inventory, storage pools and guest configs instead of
+        generated ones. Tasks, rrddata and status work on top of it as usual.
+        """
+        resources, _ = store.get("/cluster/resources")
+        if resources is None:
+            raise ValueError(f"{store.path} has no recorded /cluster/resources")
+        cluster = cls.__new__(cls)
+        cluster._init_state()
+        cluster.resources = resources
+        cluster.node_names = [r["node"] for r in resources if r.get("type") == "node"]
+        cluster.guests = {r["vmid"]: r for r in resources if r.get("type") in TASK_PREFIX}
+        # Keys look like /nodes/{node}/{type}/{vmid}/config
+        cluster._configs = {int(key.split("/")[4]): config for key, config, _ in store.items("/nodes/", "/config")}
+        cluster._storage, _ = store.get("/storage")
+        return cluster
+
+    def config(self, vmid):
+        resource = self.guests.get(vmid)
+        if resource is None:
+            return None
+        if vmid in self._configs:
+            return self._configs[vmid]
+        cores = resource["maxcpu"]
+        memory_mb = resource["maxmem"] // (1024 * 1024)
+        size = f"{resource['maxdisk'] // GIB}G"
+        storage = STORAGES[vmid % 3]
+        if resource["type"] == "lxc":
+            return {
+                "hostname": resource["name"], "cores": cores, "memory": memory_mb, "swap": 512,
+                "ostype": "debian", "arch": "amd64", "rootfs": f"{storage}:vm-{vmid}-disk-0,size={size}",
+                "net0": f"name=eth0,bridge=vmbr0,ip=dhcp,hwaddr=BC:24:11:{vmid % 256:02X}:00:01",
+                "onboot": 1, "digest": f"{vmid:040x}",
+            }
+        return {
+            "name": resource["name"], "cores": cores, "sockets": 1, "memory": memory_mb,
+            "cpu": "host", "ostype": "l26", "scsihw": "virtio-scsi-pci", "boot": "order=scsi0",
+            "scsi0": f"{storage}:vm-{vmid}-disk-0,size={size}",
+            "net0": f"virtio=BC:24:11:{vmid % 256:02X}:00:00,bridge=vmbr0",
+            "agent": "1", "onboot": 1, "meta": f"creation-qemu=8.1.5,ctime={1700000000 + vmid}",
+            "smbios1": f"uuid=00000000-0000-4000-8000-{vmid:012d}", "vmgenid": f"{vmid:032x}",
+            "digest": f"{vmid:040x}", "description": f"clone of {TEMPLATES[vmid % 3]}",
+        }
+
+    def status(self, vmid):
+        """Answer of /nodes/{node}/{type}/{vmid}/status/current."""
+        resource = self.guests.get(vmid)
+        if resource is None:
+            return None
+        status = {k: resource.get(k) for k in ("status", "vmid", "name", "maxmem", "maxdisk", "cpu", "mem", "uptime", "tags", "template")}
+        status.update({"cpus": resource["maxcpu"], "disk": 0, "netin": 0, "netout": 0, "diskread": 0, "diskwrite": 0})
+        if resource["type"] == "qemu":
+            status["qmpstatus"] = resource["status"]
+        return status
+
+    def rrddata(self, resource, timeframe="hour"):
+        """
+        Answer of .../rrddata: RRD_POINTS samples ending now. Load follows a
+        slow wave around the resource's current cpu/mem with a phase and
+        drift of its own; stopped guests report samples without values.
+        """
+        step = RRD_STEPS.get(timeframe, 60)
+        end = int(time.time()) // step * step
+        rng = random.Random(zlib.crc32(resource["id"].encode()))
+        phase = rng.uniform(0, 2 * math.pi)
+        drift = rng.uniform(-0.3, 0.3)
+        is_node = resource["type"] == "node"
+        rows = []
+        for i in range(RRD_POINTS):
+            t = end - (RRD_POINTS - 1 - i) * step
+            if not is_node and resource["status"] != "running":
+                rows.append({"time": t})
+                continue
+            progress = i / (RRD_POINTS - 1)
+            level = 0.75 + 0.25 * math.sin(t / 900 + phase) + drift * (progress - 1)
+            cpu = min(1.0, max(0.0, (resource.get("cpu") or 0.05) * level))
+            mem = int(min(resource.get("maxmem") or 0, max(0, (resource.get("mem") or 0) * (0.9 + 0.1 * level))))
+            net = int(2 ** 20 * ((resource.get("maxcpu") or 1) * level))
+            row = {"time": t, "cpu": round(cpu, 4), "maxcpu": resource.get("maxcpu"),
+                   "netin": net, "netout": net // 2}
+            if is_node:
+                row.update(memused=mem, memtotal=resource.get("maxmem"), loadavg=round(cpu * (resource.get("maxcpu") or 1), 2))
+            else:
+                row.update(mem=mem, maxmem=resource.get("maxmem"), disk=0, maxdisk=resource.get("maxdisk"),
+                           diskread=net // 4, diskwrite=net // 8)
+            rows.append(row)
+        return rows
+
+    def run_task(self, action, vmid=None, target=None, fail=False, rng=random):
+        """
+        Runs a guest task (start, stop, reboot, migrate, create or destroy)
+        and records it in /cluster/tasks and /cluster/log. A failed task
+        changes nothing but is still recorded. Returns the UPID.
+        """
+        with self.lock:
+            if action == "create":
+                vmid = vmid or max(self.guests, default=99) + 1
+                gtype = "qemu"
+                node = target or self.node_names[rng.randrange(len(self.node_names))]
+            else:
+                resource = self.guests[vmid]
+                gtype = resource["type"]
+                node = resource["node"]
+            task_type = ("qmigrate" if gtype == "qemu" else "vzmigrate") if action == "migrate" else TASK_PREFIX[gtype] + action
+            now = int(time.time())
+            self._pid += 1
+            upid = f"UPID:{node}:{self._pid:08X}:{self._pid * 7:08X}:{now:08X}:{task_type}:{vmid}:root@pam:"
+            status = "command failed: fake failure" if fail else "OK"
+            lines = [f"task started by {task_type}"]
+            if not fail:
+                if action == "migrate":
+                    if target is None:
+                        others = [n for n in self.node_names if n != node] or [node]
+                        target = rng.choice(others)
+                    lines.append(f"starting migration of VM {vmid} to node '{target}' (10.0.0.{self.node_names.index(target) + 1})")
+                    lines.append("migration finished successfully")
+                self._apply(action, vmid, node, target, rng)
+            lines.append(f"TASK {status}")
+            self.task_logs[upid] = [{"n": i + 1, "t": t} for i, t in enumerate(lines)]
+            self.tasks.insert(0, {
+                "upid": upid, "node": node, "pid": self._pid, "pstart": self._pid * 7, "starttime": now,
+                "type": task_type, "id": str(vmid), "user": "root@pam", "endtime": now, "status": status,
+            })
+            del self.tasks[TASK_HISTORY:]
+            self._write_log(node, f"starting task {upid}", now)
+            self._write_log(node, f"end task {upid} {status}", now)
+            self.revision += 1
+            return upid
+
+    def random_task(self, rng):
+        """Runs one task picked from TASK_MIX against a random guest."""
+        actions, weights = zip(*TASK_MIX)
+        action = rng.choices(actions, weights)[0]
+        if action == "create" or not self.guests:
+            return self.run_task("create", rng=rng)
+        with self.lock:
+            vmid = rng.choice(tuple(self.guests))
+        return self.run_task(action, vmid, rng=rng)
+
+    def _apply(self, action, vmid, node, target, rng):
+        if action == "create":
+            resource = {
+                "id": f"qemu/{vmid}", "type": "qemu", "vmid": vmid, "name": f"vm-{vmid}", "node": node,
+                "status": "stopped", "maxcpu": 2, "maxmem": 4 * GIB, "maxdisk": 32 * GIB,
+                "cpu": 0, "mem": 0, "uptime": 0, "template": 0, "tags": "",
+            }
+            self.resources.append(resource)
+            self.guests[vmid] = resource
+            return
+        resource = self.guests[vmid]
+        if action == "destroy":
+            self.resources.remove(resource)
+            del self.guests[vmid]
+        elif action == "migrate":
+            resource["node"] = target
+        elif action in ("start", "reboot"):
+            resource.update(status="running", cpu=round(rng.random(), 3), uptime=0 if action == "reboot" else 1,
+                            mem=int(resource["maxmem"] * rng.random()))
+        elif action in ("stop", "shutdown"):
+            resource.update(status="stopped", cpu=0, mem=0, uptime=0)
+
+    def _write_log(self, node, msg, now):
+        self._log_uid += 1
+        self.log.insert(0, {"uid": self._log_uid, "time": now, "node": node, "pid": self._pid,
+                            "user": "root@pam", "tag": "pvedaemon", "pri": 6, "msg": msg})
+        del self.log[LOG_HISTORY:]
+
+    def storage(self):
+        if self._storage is not None:
+            return self._storage
+        # Node-local storages exist on every node, so no 'nodes' restriction
+        return [
+            {"storage": s, "type": t, "content": c, "shared": int(shared), "digest": "0" * 40}
+            for s, t, c, shared in (
+                ("local", "dir", "iso,vztmpl,backup", False),
+                ("local-lvm", "lvmthin", "images,rootdir", False),
+                ("ceph-vm", "rbd", "images,rootdir", True),
+                ("nfs-backup", "nfs", "backup", True),
+            )
+        ]
+
+
+class FakeProxmoxServer:
+    """
+    Threaded HTTP server around a SyntheticCluster. The cluster can be
+    swapped with set_cluster() while the server runs; latency applies
+    to every request.
+    """
+
+    def __init__(self, cluster, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.set_cluster(cluster)
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_cluster(self, cluster):
+        # /cluster/resources is by far the largest answer; encode it once per revision
+        self.cluster = cluster
+        self._resources_body = _encode(cluster.resources)
+        self._resources_revision = cluster.revision
+
+    def _resources(self):
+        cluster = self.cluster
+        with cluster.lock:
+            if self._resources_revision != cluster.revision:
+                self._resources_body = _encode(cluster.resources)
+                self._resources_revision = cluster.revision
+            return self._resources_body
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-proxmox", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0.0, ms) / 1000)
+
+    def count(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def resolve(self, path, query=None):
+        """Returns (status, encoded body) for a GET on an /api2/json path."""
+        cluster = self.cluster
+        query = query or {}
+        if path == "/version":
+            return 200, _encode({"version": "8.2.4", "release": "8.2", "repoid": "fake"})
+        if path == "/cluster/resources":
+            return 200, self._resources()
+        if path == "/storage":
+            return 200, _encode(cluster.storage())
+        with cluster.lock:
+            if path == "/nodes":
+                return 200, _encode([r for r in cluster.resources if r["type"] == "node"])
+            if path == "/cluster/tasks":
+                return 200, _encode(cluster.tasks)
+            if path == "/cluster/log":
+                return 200, _encode(cluster.log[:int(query.get("max", 50))])
+            match = re.fullmatch(r"/nodes/([\w.-]+)/tasks/(UPID:[^/]+)/log", path)
+            if match:
+                lines = cluster.task_logs.get(match.group(2))
+                if lines is None:
+                    return 500, _encode(None, "no such task")
+                return 200, _encode(lines[:int(query.get("limit", 50))])
+            match = re.fullmatch(r"/nodes/([\w.-]+)(?:/(qemu|lxc)/(\d+))?/rrddata", path)
+            if match:
+                node, gtype, vmid = match.groups()
+                if vmid is None:
+                    resource = next((r for r in cluster.resources if r["id"] == f"node/{node}"), None)
+                else:
+                    resource = cluster.guests.get(int(vmid))
+                    if resource is not None and (resource["node"] != node or resource["type"] != gtype):
+                        resource = None
+                if resource is None:
+                    return 500, _encode(None, f"no such resource on node '{node}'")
+                return 200, _encode(cluster.rrddata(resource, query.get("timeframe", "hour")))
+            match = re.fullmatch(r"/nodes/([\w.-]+)/(qemu|lxc)/(\d+)/status/current", path)
+            if match:
+                node, gtype, vmid = match.groups()
+                resource = cluster.guests.get(int(vmid))
+                if resource is None or resource["node"] != node or resource["type"] != gtype:
+                    return 500, _encode(None, f"Configuration file 'nodes/{node}/{gtype}/{vmid}.conf' does not exist")
+                return 200, _encode(cluster.status(int(vmid)))
+        match = re.fullmatch(r"/nodes/([\w.-]+)/(qemu|lxc)(?:/(\d+)/config)?", path)
+        if match:
+            node, gtype, vmid = match.groups()
+            if vmid is None:
+                return 200, _encode([
+                    r for r in cluster.guests.values() if r["node"] == node and r["type"] == gtype
+                ])
+            resource = cluster.guests.get(int(vmid))
+            if resource is None or resource["node"] != node or resource["type"] != gtype:
+                return 500, _encode(None, f"Configuration file 'nodes/{node}/{gtype}/{vmid}.conf' does not exist")
+            return 200, _encode(cluster.config(int(vmid)))
+        return 501, _encode(None, f"Method 'GET {path}' not implemented")
+
+
+def _encode(data, message=None):
+    payload = {"data": data}
+    if message:
+        payload["message"] = message
+    return json.dumps(payload).encode()
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle +
+        # delayed ACK adds ~40 ms to every keep-alive response
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            server.count(len(body))
+
+        def _authorized(self):
+            return (
+                f"PVEAuthCookie={TICKET}" in (self.headers.get("Cookie") or "")
+                or (self.headers.get("Authorization") or "").startswith("PVEAPIToken=")
+            )
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            server.delay()
+            if urlparse(self.path).path == "/api2/json/access/ticket":
+                return self._send(200, _encode({"ticket": TICKET, "CSRFPreventionToken": CSRF, "username": "root@pam"}))
+            self._send(501, _encode(None, "not implemented"))
+
+        def do_GET(self):
+            server.delay()
+            url = urlparse(self.path)
+            path = unquote(url.path)
+            if not path.startswith("/api2/json/"):
+                return self._send(404, _encode(None, "not found"))
+            if not self._authorized():
+                return self._send(401, _encode(None, "authentication failure"))
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._send(*server.resolve(path[len("/api2/json"):], query))
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, help=f"default: one per {GUESTS_PER_NODE} guests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18006)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--snapshot", help="replay a recorded cluster (SQLite snapshot) instead of generating one")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        from tools.snapshot_store import SnapshotStore
+        cluster = SyntheticCluster.from_snapshot(SnapshotStore(args.snapshot))
+    else:
+        cluster = SyntheticCluster(args.guests, args.nodes, args.seed)
+    server = FakeProxmoxServer(cluster, args.host, args.port, args.latency_ms, args.jitter_ms)
+    print(f"Fake Proxmox with {len(cluster.guests)} guests on {len(cluster.node_names)} nodes at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
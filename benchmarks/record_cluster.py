@@ -0,0 +1,60 @@
+# benchmarks/record_cluster.py
+"""
+Records a live cluster into a snapshot file: version, nodes, inventory,
+storage pools and every guest config, in the same SQLite format the
+reader keeps at PROXMOX_SNAPSHOT_PATH.
+
+    python -m benchmarks.record_cluster cluster.db
+    python -m benchmarks.record_cluster cluster.db --no-configs
+    python -m benchmarks.record_cluster cluster.db --info
+
+Connects with the PROXMOX_* settings from the environment or .env.
+A recording can then be replayed as the fake API
+
+    python -m benchmarks.fake_proxmox --snapshot cluster.db
+
+or served by the agent while Proxmox is unreachable, by pointing
+PROXMOX_SNAPSHOT_PATH at a copy of it.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.snapshot_store import SnapshotStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="snapshot file to write (created if missing)")
+    parser.add_argument("--no-configs", action="store_true", help="skip the per-guest config requests")
+    parser.add_argument("--workers", type=int, help="concurrent config requests (default PROXMOX_MAX_WORKERS)")
+    parser.add_argument("--info", action="store_true", help="show what the file holds and exit")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.path)
+    if not store.available:
+        sys.exit(1)
+    if args.info:
+        print(json.dumps({**store.meta(), **store.stats()}, indent=2))
+        return
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from tools import proxmox_reader
+
+    start = time.perf_counter()
+    try:
+        counts = proxmox_reader.record_snapshot(store, configs=not args.no_configs, max_workers=args.workers)
+    except ConnectionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Recorded {counts['guests']} guests and {counts['configs']} configs "
+          f"({counts['config_errors']} failed) to {args.path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# tools/batch.py
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from tools.chat_history import ChatHistory
+
+# Prompts answered at the same time; the Groq limiter still bounds the model call rate
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+
+class _Discard:
+    """Sink for the streamed tokens and tool events of a batch turn."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def read_prompts(path: str):
+    """
+    Reads a JSONL prompt file: one {"id": ..., "prompt": ...} object (or a
+    bare JSON string) per line. Ids default to the line number and must be
+    unique, since they are what a resumed run matches on.
+    Returns a list of (id, prompt).
+    """
+    items = []
+    seen = set()
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: not JSON ({e})")
+            if isinstance(entry, str):
+                entry = {"prompt": entry}
+            prompt = str(entry.get("prompt") or "").strip() if isinstance(entry, dict) else ""
+            if not prompt:
+                raise ValueError(f"{path}:{number}: no 'prompt'")
+            item_id = str(entry.get("id", f"line-{number}"))
+            if item_id in seen:
+                raise ValueError(f"{path}:{number}: duplicate id {item_id!r}")
+            seen.add(item_id)
+            items.append((item_id, prompt))
+    return items
+
+
+def completed_ids(path: str):
+    """Ids with a successful result in an earlier run's output; a torn last line is ignored."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "id" in record and not record.get("error"):
+                done.add(str(record["id"]))
+    return done
+
+
+def _percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_batch(answer_turn, prompts_path: str, output_path: str, workers: int = None, pin=None,
+              new_history=ChatHistory):
+    """
+    Answers every prompt of a JSONL file with `workers` threads and appends
+    one JSON result per prompt to output_path as soon as it is done:
+    id, prompt, answer, source (routed/cached/agent), inventory
+    fingerprint, timings (queued_s, seconds, ttft and per-step times) and,
+    for failures, error.
+
+    Prompts are independent (each gets a fresh history). The whole run
+    holds `pin` (proxmox_reader.pinned_inventory), so every answer reads
+    the same inventory snapshot. Running again with the same output file
+    resumes: prompts that already have a successful result are skipped and
+    failed ones are retried; the last line for an id is its result.
+
+    answer_turn(history, prompt, out) -> (answer, source, timings) is
+    agent-main's answer_turn. Returns a summary dict.
+    """
+    workers = max(1, workers or BATCH_WORKERS)
+    items = read_prompts(prompts_path)
+    done = completed_ids(output_path)
+    todo = [(item_id, prompt) for item_id, prompt in items if item_id not in done]
+    summary = {"prompts": len(items), "skipped": len(items) - len(todo), "ok": 0, "errors": 0, "interrupted": False}
+    print(f"📋 {len(items)} prompts, {summary['skipped']} already done, {len(todo)} to run with {workers} workers")
+    if not todo:
+        return summary
+
+    write_lock = threading.Lock()
+    seconds = []
+    start = time.perf_counter()
+
+    with (pin() if pin else nullcontext()) as fingerprint, open(output_path, "a+") as out:
+        # An interrupted run may have left half a line; start on a fresh one
+        out.seek(0, os.SEEK_END)
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+
+        def run_one(item_id, prompt):
+            queued = time.perf_counter() - start
+            item_start = time.perf_counter()
+            record = {"id": item_id, "prompt": prompt}
+            try:
+                answer, source, timings = answer_turn(new_history(), prompt, _Discard())
+                record.update(answer=answer, source=source)
+                if answer is None:
+                    record["error"] = "no response"
+            except Exception as e:
+                timings = None
+                record["error"] = f"{type(e).__name__}: {str(e)}"
+            elapsed = time.perf_counter() - item_start
+            record["inventory"] = fingerprint
+            record["timings"] = {"queued_s": round(queued, 3), "seconds": round(elapsed, 3),
+                                 **(timings.as_dict() if timings else {})}
+            record["finished"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            with write_lock:
+                # One flushed line per prompt is what makes the run resumable
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                if record.get("error"):
+                    summary["errors"] += 1
+                else:
+                    summary["ok"] += 1
+                    seconds.append(elapsed)
+                finished = summary["ok"] + summary["errors"]
+            status = f"❌ {record['error']}" if record.get("error") else f"✅ {record['source']}"
+            print(f"[{finished}/{len(todo)}] {item_id}: {status} ({elapsed:.2f}s)")
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        futures = [pool.submit(run_one, item_id, prompt) for item_id, prompt in todo]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except KeyboardInterrupt:
+            # Prompts already running finish and are written; the rest wait for the next run
+            summary["interrupted"] = True
+            print("\n⚠️ Interrupted: finishing the running prompts; run again to resume.")
+            pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            pool.shutdown()
+
+    seconds.sort()
+    summary.update(
+        seconds=round(time.perf_counter() - start, 2),
+        p50_s=round(_percentile(seconds, 50), 3) if seconds else None,
+        p95_s=round(_percentile(seconds, 95), 3) if seconds else None,
+    )
+    return summary
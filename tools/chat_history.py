@@ -0,0 +1,121 @@
+# tools/chat_history.py
+import os
+import re
+from collections import OrderedDict, deque
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from tools.formatting import estimate_tokens
+
+# Ceiling on the history (summary + recent turns + new question) sent per turn
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "4000"))
+# Turns kept verbatim; older ones are folded into the rolling summary
+CHAT_HISTORY_RECENT_TURNS = int(os.getenv("CHAT_HISTORY_RECENT_TURNS", "6"))
+# Share of the ceiling the rolling summary may use
+SUMMARY_SHARE = 0.25
+# Characters of each side of a folded turn kept in the summary
+SUMMARY_SNIPPET_CHARS = 160
+# Facts that must survive compaction, keyed by kind; the last few values win
+FACT_PATTERNS = {
+    "node": re.compile(r"\b(?:target_node|node)\b[\s:=\"'`]+([A-Za-z][\w.-]*)", re.IGNORECASE),
+    "storage": re.compile(r"\bstorage\b(?:\s+pool)?[\s:=\"'`]+([A-Za-z][\w.-]*)", re.IGNORECASE),
+    "vmid": re.compile(r"\b(?:vmid|vm\s*id|vm|container|ct|id)\b[\s:#=\"'`]*(\d{3,9})\b", re.IGNORECASE),
+    "workspace": re.compile(r"\bworkspace\b[\s:=\"'`]+([\w-]+)", re.IGNORECASE),
+}
+FACTS_PER_KIND = 5
+# Words the patterns above catch that are never real values
+FACT_STOPWORDS = {"is", "are", "was", "the", "a", "an", "and", "or", "to", "of", "on", "in", "for", "with", "pool", "pools", "name"}
+
+
+def _snippet(text, limit=SUMMARY_SNIPPET_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class ChatHistory:
+    """
+    Conversation memory for the CLI with a bounded prompt size.
+    The last `recent_turns` exchanges are resent verbatim; older ones are
+    folded into a rolling summary, and facts such as the chosen node,
+    storage and vmids are pinned so they survive the folding.
+    """
+
+    def __init__(self, max_tokens: int = None, recent_turns: int = None):
+        self.max_tokens = max_tokens or CHAT_HISTORY_MAX_TOKENS
+        self.recent_turns = recent_turns or CHAT_HISTORY_RECENT_TURNS
+        self.turns = deque()
+        self.summary = deque()
+        self.facts = {kind: OrderedDict() for kind in FACT_PATTERNS}
+        self.folded_turns = 0
+
+    def _pin_facts(self, text):
+        for kind, pattern in FACT_PATTERNS.items():
+            values = self.facts[kind]
+            for match in pattern.finditer(str(text)):
+                # Sentence punctuation is not part of a name
+                value = match.group(1).rstrip(".-")
+                if not value or value.lower() in FACT_STOPWORDS:
+                    continue
+                values.pop(value, None)
+                values[value] = True
+                while len(values) > FACTS_PER_KIND:
+                    values.popitem(last=False)
+
+    def _context_text(self):
+        lines = []
+        facts = [f"{kind}: {', '.join(values)}" for kind, values in self.facts.items() if values]
+        if facts:
+            lines.append("Pinned facts from this session (most recent last): " + "; ".join(facts))
+        if self.summary:
+            lines.append(f"Summary of {self.folded_turns} earlier exchanges:")
+            lines.extend(self.summary)
+        return "\n".join(lines)
+
+    def _fold_oldest(self):
+        user_text, ai_message = self.turns.popleft()
+        self.summary.append(f"- User: {_snippet(user_text)} | Agent: {_snippet(ai_message.content)}")
+        self.folded_turns += 1
+        # The summary itself is bounded too: forget the oldest lines first
+        budget = int(self.max_tokens * SUMMARY_SHARE)
+        while len(self.summary) > 1 and estimate_tokens("\n".join(self.summary)) > budget:
+            self.summary.popleft()
+
+    def _turn_tokens(self):
+        return sum(estimate_tokens(u) + estimate_tokens(str(a.content)) for u, a in self.turns)
+
+    def add_turn(self, user_input: str, ai_message: AIMessage):
+        """Records a completed exchange and compacts the history."""
+        self._pin_facts(user_input)
+        self._pin_facts(ai_message.content)
+        self.turns.append((user_input, ai_message))
+        while len(self.turns) > self.recent_turns:
+            self._fold_oldest()
+
+    def messages(self, user_input: str):
+        """Returns the messages to send for a new question, within max_tokens."""
+        # Fold until summary + verbatim turns + the new question fit the ceiling
+        new_tokens = estimate_tokens(user_input)
+        while self.turns and (
+            estimate_tokens(self._context_text()) + self._turn_tokens() + new_tokens > self.max_tokens
+        ):
+            self._fold_oldest()
+
+        messages = []
+        context = self._context_text()
+        if context:
+            messages.append(SystemMessage(content=context))
+        for user_text, ai_message in self.turns:
+            messages.append(HumanMessage(content=user_text))
+            messages.append(AIMessage(content=ai_message.content))
+        messages.append(HumanMessage(content=user_input))
+        return messages
+
+    def stats(self):
+        """Returns sizes useful for tuning the ceiling."""
+        return {
+            "recent_turns": len(self.turns),
+            "folded_turns": self.folded_turns,
+            "summary_lines": len(self.summary),
+            "history_tokens": estimate_tokens(self._context_text()) + self._turn_tokens(),
+            "max_tokens": self.max_tokens,
+        }
@@ -0,0 +1,519 @@
+# tools/chat_server.py
+import asyncio
+import base64
+import contextvars
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import re
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from tools.chat_history import ChatHistory
+from tools.terraform_manager import bind_session, set_lock_timeout
+
+# Address the chat server listens on
+CHAT_SERVER_HOST = os.getenv("CHAT_SERVER_HOST", "127.0.0.1")
+CHAT_SERVER_PORT = int(os.getenv("CHAT_SERVER_PORT", "8765"))
+# Shared secret clients send as 'Authorization: Bearer <token>' (or ?token= on
+# the WebSocket URL); required to listen on anything but loopback
+CHAT_SERVER_TOKEN = os.getenv("CHAT_SERVER_TOKEN", "")
+# Turns processed at the same time; further turns wait for a free worker
+CHAT_SERVER_WORKERS = int(os.getenv("CHAT_SERVER_WORKERS", "16"))
+# Open sessions allowed; new ones are refused (503) beyond this
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "500"))
+# Seconds without a message after which a session and its history are dropped
+CHAT_SESSION_IDLE_TIMEOUT = float(os.getenv("CHAT_SESSION_IDLE_TIMEOUT", "3600"))
+# How long a Terraform operation queues behind another session's on the same workspace
+CHAT_SERVER_TF_QUEUE_TIMEOUT = float(os.getenv("CHAT_SERVER_TF_QUEUE_TIMEOUT", "3600"))
+# Largest request body or WebSocket message accepted
+MAX_MESSAGE_BYTES = 64 * 1024
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# WebSocket opcodes (RFC 6455)
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class _ProtocolError(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _unmask(payload, mask):
+    # XOR as one big integer; far faster than a per-byte loop
+    n = len(payload)
+    key = int.from_bytes((mask * (n // 4 + 1))[:n], "big")
+    return (int.from_bytes(payload, "big") ^ key).to_bytes(n, "big")
+
+
+def _encode_frame(opcode, payload: bytes, mask: bytes = None):
+    """One final WebSocket frame. Servers send unmasked frames; clients must pass a mask."""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n | (0x80 if mask else 0))
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126 | (0x80 if mask else 0), n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127 | (0x80 if mask else 0), n)
+    if mask:
+        return header + mask + _unmask(payload, mask)
+    return header + payload
+
+
+async def _read_frame(reader, require_mask: bool = True):
+    """Reads one WebSocket frame and returns (fin, opcode, payload)."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_MESSAGE_BYTES:
+        raise _ProtocolError(1009, "message too big")
+    masked = bool(second & 0x80)
+    if require_mask and not masked:
+        raise _ProtocolError(1002, "client frames must be masked")
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    return bool(first & 0x80), first & 0x0F, _unmask(payload, mask) if mask else payload
+
+
+def _close_payload(code, reason=""):
+    return struct.pack("!H", code) + reason.encode()[:120]
+
+
+class _EventWriter:
+    """
+    File-like object handed to the turn (stream_turn, Terraform output):
+    every write from the worker thread becomes an 'output' event on the
+    session's WebSocket. Without a connection the text is dropped.
+    """
+
+    def __init__(self, loop, send=None):
+        self._loop = loop
+        self._send = send
+
+    def write(self, text):
+        if self._send and text:
+            self._loop.call_soon_threadsafe(self._send, {"type": "output", "text": text})
+        return len(text)
+
+    def line(self, text):
+        self.write(f"{text}\n")
+
+    def flush(self):
+        pass
+
+
+class ChatSession:
+    """One conversation: its own history; its turns run one at a time and in order."""
+
+    def __init__(self, session_id: str, history):
+        self.id = session_id
+        self.history = history
+        self.lock = asyncio.Lock()
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.turns = 0
+
+    def stats(self):
+        return {
+            "session": self.id,
+            "turns": self.turns,
+            "busy": self.lock.locked(),
+            "idle_s": round(time.monotonic() - self.last_used, 1),
+            "history": self.history.stats(),
+        }
+
+
+class ChatServer:
+    """
+    Hosts many chat sessions in one asyncio process over plain HTTP and
+    WebSocket (standard library only).
+
+        POST   /sessions                  new session -> {"session": id}
+        POST   /sessions/{id}/messages    {"message": ...} -> the answer as JSON
+        GET    /sessions/{id}/ws          WebSocket: send {"message": ...}, receive
+                                          'output' events while the turn runs, then 'answer'
+        GET    /sessions/{id}             session stats
+        DELETE /sessions/{id}             drop the session and its history
+        GET    /health, /stats
+
+    Every route but /health needs `token` when one is set; without one the
+    server only listens on loopback, since turns can run Terraform.
+
+    A session is created on first use of its id. Everything except the
+    history is shared by all sessions because it lives in the process:
+    the reader's Proxmox client pool and inventory cache, the response
+    cache, and the Groq rate limiter. Turns are blocking (LLM and Proxmox
+    calls), so they run on a pool of `workers` threads; Terraform calls in
+    a turn act for its session (bind_session), so output streams to that
+    session, only it can apply its plan, and operations on one workspace
+    queue behind each other for up to CHAT_SERVER_TF_QUEUE_TIMEOUT.
+
+    answer_turn(history, message, out) -> (answer, source, timings) does
+    the work (agent-main's answer_turn); stats() adds shared counters to /stats.
+    """
+
+    def __init__(self, answer_turn, stats=None, host: str = None, port: int = None, workers: int = None,
+                 max_sessions: int = None, idle_timeout: float = None, new_history=ChatHistory,
+                 token: str = None):
+        self.answer_turn = answer_turn
+        self.shared_stats = stats
+        self.host = host or CHAT_SERVER_HOST
+        self.token = CHAT_SERVER_TOKEN if token is None else token
+        self.port = CHAT_SERVER_PORT if port is None else port
+        self.workers = workers or CHAT_SERVER_WORKERS
+        self.max_sessions = max_sessions or CHAT_MAX_SESSIONS
+        self.idle_timeout = CHAT_SESSION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.new_history = new_history
+        self.sessions = {}
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chat-turn")
+        self._server = None
+        self._reaper = None
+        self.started = None
+        self.turns = 0
+        self.errors = 0
+        self.active = 0
+        self.connections = 0
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self):
+        """Starts listening; with port 0 the chosen port is in self.port afterwards."""
+        if not self.token and not _is_loopback(self.host):
+            raise ValueError(f"Refusing to serve on {self.host} without CHAT_SERVER_TOKEN "
+                             "(anyone reaching it could run Terraform)")
+        set_lock_timeout(CHAT_SERVER_TF_QUEUE_TIMEOUT)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_MESSAGE_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._reaper = asyncio.create_task(self._reap_idle())
+        self.started = time.monotonic()
+        return self
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        """Serves until Ctrl-C (the CLI's --serve)."""
+        async def main():
+            await self.start()
+            print(f"✅ Chat server on http://{self.host}:{self.port} "
+                  f"({self.workers} workers, up to {self.max_sessions} sessions)")
+            try:
+                await self._server.serve_forever()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(main())
+        except ValueError as e:
+            print(f"❌ {e}")
+        except KeyboardInterrupt:
+            from tools.terraform_manager import cancel_running
+            if cancel_running(wait=False):
+                print("\nStopping Terraform cleanly (releasing state lock)...")
+                cancel_running(wait=True)
+            print("\nGoodbye!")
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(60.0, max(1.0, self.idle_timeout / 4)))
+            cutoff = time.monotonic() - self.idle_timeout
+            for session_id, session in list(self.sessions.items()):
+                if session.last_used < cutoff and not session.lock.locked():
+                    del self.sessions[session_id]
+
+    # -- sessions and turns ------------------------------------------------
+
+    def _session(self, session_id: str = None, create: bool = True):
+        """Returns the session (creating it if allowed), None if unknown, or raises _HTTPError."""
+        if session_id is not None and not SESSION_ID.fullmatch(session_id):
+            raise _HTTPError(HTTPStatus.BAD_REQUEST, "session ids use letters, digits, '-' and '_' (max 64)")
+        session = self.sessions.get(session_id)
+        if session is None and create:
+            if len(self.sessions) >= self.max_sessions:
+                raise _HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, f"session limit ({self.max_sessions}) reached")
+            session_id = session_id or uuid.uuid4().hex
+            session = self.sessions[session_id] = ChatSession(session_id, self.new_history())
+        return session
+
+    async def turn(self, session: ChatSession, message: str, send=None):
+        """Runs one turn of the session on the worker pool and returns the result as a dict."""
+        async with session.lock:
+            session.last_used = time.monotonic()
+            loop = asyncio.get_running_loop()
+            out = _EventWriter(loop, send)
+
+            def work():
+                # Runs inside a copied context, so the binding ends with the turn
+                bind_session(session.id, out.line if send else None)
+                return self.answer_turn(session.history, message, out)
+
+            start = time.perf_counter()
+            self.active += 1
+            try:
+                answer, source, timings = await loop.run_in_executor(self._pool, contextvars.copy_context().run, work)
+            except Exception as e:
+                self.errors += 1
+                return {"session": session.id, "error": f"{type(e).__name__}: {str(e)}"}
+            finally:
+                self.active -= 1
+                session.last_used = time.monotonic()
+            session.turns += 1
+            self.turns += 1
+            return {
+                "session": session.id,
+                "answer": answer,
+                "source": source,
+                "seconds": round(time.perf_counter() - start, 3),
+                "timings": timings.as_dict() if timings else None,
+            }
+
+    def stats(self):
+        stats = {
+            "uptime_s": round(time.monotonic() - self.started, 1) if self.started else 0,
+            "sessions": len(self.sessions),
+            "connections": self.connections,
+            "turns": self.turns,
+            "errors": self.errors,
+            "active_turns": self.active,
+            "workers": self.workers,
+        }
+        if self.shared_stats:
+            stats.update(self.shared_stats())
+        return stats
+
+    # -- HTTP ----------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except _HTTPError as e:
+                    _write_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if not self._authorized(path, headers):
+                    _write_json(writer, HTTPStatus.UNAUTHORIZED, {"error": "missing or wrong token"},
+                                keep_alive=False)
+                    await writer.drain()
+                    break
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, path, headers)
+                    break
+                try:
+                    status, payload = await self._route(method, path, body)
+                except _HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                _write_json(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _authorized(self, path, headers):
+        if not self.token:
+            return True
+        url = urlsplit(path)
+        if url.path.rstrip("/") == "/health":
+            return True
+        scheme, _, given = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            given = (parse_qs(url.query).get("token") or [""])[0]
+        return hmac.compare_digest(given.strip().encode(), self.token.encode())
+
+    async def _route(self, method, path, body):
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+        if method == "GET" and parts == ["health"]:
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and parts == ["stats"]:
+            return HTTPStatus.OK, self.stats()
+        if parts == ["sessions"] and method == "POST":
+            return HTTPStatus.CREATED, {"session": self._session().id}
+        if parts == ["sessions"] and method == "GET":
+            return HTTPStatus.OK, {"sessions": [s.stats() for s in self.sessions.values()]}
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages" and method == "POST":
+            message = _message(body)
+            result = await self.turn(self._session(parts[1]), message)
+            return (HTTPStatus.INTERNAL_SERVER_ERROR if "error" in result else HTTPStatus.OK), result
+        if len(parts) == 2 and parts[0] == "sessions":
+            session = self._session(parts[1], create=False)
+            if session is None:
+                raise _HTTPError(HTTPStatus.NOT_FOUND, f"no session {parts[1]}")
+            if method == "GET":
+                return HTTPStatus.OK, session.stats()
+            if method == "DELETE":
+                self.sessions.pop(session.id, None)
+                return HTTPStatus.OK, {"session": session.id, "deleted": True}
+        raise _HTTPError(HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+
+    # -- WebSocket -----------------------------------------------------------
+
+    async def _websocket(self, reader, writer, path, headers):
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+        key = headers.get("sec-websocket-key")
+        try:
+            if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws":
+                raise _HTTPError(HTTPStatus.NOT_FOUND, f"no WebSocket at {path}")
+            if not key or headers.get("sec-websocket-version") != "13":
+                raise _HTTPError(HTTPStatus.BAD_REQUEST, "WebSocket version 13 handshake required")
+            session = self._session(parts[1])
+        except _HTTPError as e:
+            _write_json(writer, e.status, {"error": e.message}, keep_alive=False)
+            await writer.drain()
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+
+        def send(event):
+            if not writer.is_closing():
+                writer.write(_encode_frame(OP_TEXT, json.dumps(event).encode()))
+
+        async def run_turn(message):
+            result = await self.turn(session, message, send)
+            send({"type": "error", **result} if "error" in result else {"type": "answer", **result})
+            await writer.drain()
+
+        send({"type": "session", "session": session.id})
+        turns = set()
+        fragments, fragment_opcode = [], None
+        try:
+            while True:
+                fin, opcode, payload = await _read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(_encode_frame(OP_CLOSE, payload[:2]))
+                    break
+                if opcode == OP_PING:
+                    writer.write(_encode_frame(OP_PONG, payload))
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                if opcode == OP_CONTINUATION:
+                    if fragment_opcode is None:
+                        raise _ProtocolError(1002, "unexpected continuation frame")
+                elif opcode in (OP_TEXT, OP_BINARY):
+                    if fragment_opcode is not None:
+                        raise _ProtocolError(1002, "new message inside a fragmented one")
+                    fragment_opcode = opcode
+                else:
+                    raise _ProtocolError(1002, f"unknown opcode {opcode}")
+                fragments.append(payload)
+                if sum(map(len, fragments)) > MAX_MESSAGE_BYTES:
+                    raise _ProtocolError(1009, "message too big")
+                if not fin:
+                    continue
+                data, fragments, fragment_opcode = b"".join(fragments), [], None
+                try:
+                    message = _message(data)
+                except _HTTPError as e:
+                    send({"type": "error", "session": session.id, "error": e.message})
+                    continue
+                # Turns of one session queue on its lock; reading goes on so pings are answered
+                task = asyncio.create_task(run_turn(message))
+                turns.add(task)
+                task.add_done_callback(turns.discard)
+        except _ProtocolError as e:
+            writer.write(_encode_frame(OP_CLOSE, _close_payload(e.code, str(e))))
+        finally:
+            # Turns already running finish (and land in the history); their output is dropped
+            await asyncio.gather(*turns, return_exceptions=True)
+            await writer.drain()
+
+
+async def _read_request(reader):
+    """Reads one request; returns (method, path, headers, body) or None at end of stream."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise _HTTPError(HTTPStatus.BAD_REQUEST, "incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise _HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise _HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise _HTTPError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+    if length > MAX_MESSAGE_BYTES:
+        raise _HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body over {MAX_MESSAGE_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _message(body: bytes):
+    """The user message of a request: {"message": ...} JSON or plain text."""
+    text = body.decode("utf-8", errors="replace").strip()
+    if text.startswith("{"):
+        try:
+            text = str(json.loads(text).get("message") or "").strip()
+        except (ValueError, AttributeError):
+            raise _HTTPError(HTTPStatus.BAD_REQUEST, "body must be JSON with a 'message' field")
+    if not text:
+        raise _HTTPError(HTTPStatus.BAD_REQUEST, "empty message")
+    return text
+
+
+def _write_json(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, default=str).encode()
+    status = HTTPStatus(status)
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+        + body
+    )
@@ -0,0 +1,358 @@
+# tools/clusters.py
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import httpx
+
+from tools.inventory import Inventory, SnapshotCache, register_invalidation_hook
+from tools.proxmox_async import AsyncProxmoxClient
+from tools.proxmox_connection import ProxmoxConnection
+from tools.telemetry import debug, span
+
+# Clusters queried alongside PROXMOX_HOST, e.g. "lab,edge". Each one reads
+# PROXMOX_<NAME>_HOST, _USER, _PASSWORD, _TOKEN_ID, _TOKEN_SECRET, _PORT and _SCHEME
+PROXMOX_CLUSTERS = os.getenv("PROXMOX_CLUSTERS", "")
+# Name of the PROXMOX_HOST cluster in tagged results and the tools' cluster filter
+PROXMOX_CLUSTER_NAME = os.getenv("PROXMOX_CLUSTER_NAME", "default")
+# Seconds a fan-out waits for each cluster before answering without it;
+# PROXMOX_<NAME>_FANOUT_TIMEOUT overrides it for one cluster
+PROXMOX_FANOUT_TIMEOUT = float(os.getenv("PROXMOX_FANOUT_TIMEOUT", "10"))
+
+
+class ClusterUnavailable(ConnectionError):
+    """A cluster asked for by name is unreachable or did not answer in time."""
+
+
+# {name: reason} collecting what the fan-outs of the current block left out
+_left_out = contextvars.ContextVar("clusters_left_out", default=None)
+
+
+@contextmanager
+def left_out_clusters():
+    """
+    Collects {name: reason} for the clusters that fan-outs inside the
+    block (in this context, including tool threads started from it)
+    answered without. An enclosing block also gets them.
+    """
+    collected = {}
+    outer = _left_out.get()
+    token = _left_out.set(collected)
+    try:
+        yield collected
+    finally:
+        _left_out.reset(token)
+        if outer is not None:
+            outer.update(collected)
+
+
+def _env_prefix(name):
+    return f"PROXMOX_{name.upper().replace('-', '_')}_"
+
+
+def fanout_timeout(name: str):
+    """The fan-out deadline of one cluster in seconds."""
+    return float(os.getenv(f"{_env_prefix(name)}FANOUT_TIMEOUT", PROXMOX_FANOUT_TIMEOUT))
+
+
+class ClusterConfig:
+    """Address and credentials of one cluster."""
+
+    def __init__(self, name, host, port="8006", scheme="https", user=None, password=None,
+                 token_id=None, token_secret=None):
+        self.name = name
+        # Accept the host as a bare name or as a URL like https://pve.local:8006
+        if "://" in host:
+            url = urlparse(host)
+            scheme = url.scheme
+            host = url.hostname
+            if url.port:
+                port = str(url.port)
+        self.host = host
+        self.port = int(port)
+        self.scheme = scheme
+        self.user = user
+        self.password = password
+        self.token_secret = token_secret
+        # A token id is 'user@realm!name'; the user part may also come from _USER
+        self.token_name = None
+        if token_id:
+            user_part, _, self.token_name = token_id.rpartition("!")
+            self.user = user_part or user
+        self.timeout = fanout_timeout(name)
+
+    @classmethod
+    def from_env(cls, name: str):
+        prefix = _env_prefix(name)
+        host = os.getenv(f"{prefix}HOST")
+        if not host:
+            raise ValueError(f"{prefix}HOST environment variable not set (cluster '{name}' is in PROXMOX_CLUSTERS)")
+        return cls(
+            name,
+            host,
+            port=os.getenv(f"{prefix}PORT", "8006"),
+            scheme=os.getenv(f"{prefix}SCHEME", "https"),
+            user=os.getenv(f"{prefix}USER"),
+            password=os.getenv(f"{prefix}PASSWORD"),
+            token_id=os.getenv(f"{prefix}TOKEN_ID"),
+            token_secret=os.getenv(f"{prefix}TOKEN_SECRET"),
+        )
+
+
+def load_cluster_configs(names: str = None):
+    """Configs of the clusters named in PROXMOX_CLUSTERS (comma-separated)."""
+    names = PROXMOX_CLUSTERS if names is None else names
+    configs = []
+    for name in (n.strip() for n in names.split(",")):
+        if not name:
+            continue
+        if name == PROXMOX_CLUSTER_NAME or any(c.name == name for c in configs):
+            raise ValueError(f"Cluster name '{name}' is used twice (PROXMOX_CLUSTER_NAME / PROXMOX_CLUSTERS)")
+        configs.append(ClusterConfig.from_env(name))
+    return configs
+
+
+def connect_client(loop, host, port, scheme, user=None, password=None, token_name=None, token_value=None,
+                   timeout=60, max_connections=20):
+    """
+    Builds an authenticated client on `loop` (a LoopThread) and verifies it
+    with /version. Returns (client, version payload).
+    """
+    if token_name and token_value:
+        debug("Using token-based authentication...")
+    elif user and password:
+        debug("Using password-based authentication...")
+    else:
+        raise ValueError("No authentication credentials provided")
+    client = AsyncProxmoxClient(
+        host,
+        port=int(port),
+        user=user,
+        password=None if token_name and token_value else password,
+        token_name=token_name if token_value else None,
+        token_value=token_value,
+        verify_ssl=False,
+        timeout=timeout,
+        max_connections=max_connections,
+        scheme=scheme
+    )
+    try:
+        loop.run(client.login())
+        # Test the connection by getting version
+        debug("Testing connection with /api2/json/version...")
+        version = loop.run(client.get("/version"))
+    except Exception:
+        loop.run(client.aclose())
+        raise
+    return client, version
+
+
+class RemoteCluster:
+    """
+    A cluster from PROXMOX_CLUSTERS with its own credentials, background
+    connection, client pool and cached, indexed inventory. Unlike the
+    PROXMOX_HOST cluster it never serves mock or snapshot data: while it
+    is unreachable its reads raise ClusterUnavailable, so fan-outs answer
+    without it.
+    """
+
+    def __init__(self, config: ClusterConfig, loop, cache_ttl: float = 30.0, connect_wait: float = 5.0,
+                 request_timeout: float = 60, pool_size: int = 20, max_backoff: float = 60.0):
+        self.name = config.name
+        self.config = config
+        self.timeout = config.timeout
+        self._loop = loop
+        self._connect_wait = connect_wait
+        self._request_timeout = request_timeout
+        self._pool_size = pool_size
+        self.connection = ProxmoxConnection(
+            config.name, self._connect, max_backoff=max_backoff,
+            # Whatever was cached came from the old connection
+            on_state_change=lambda connected: self.cache.invalidate()
+        )
+        self.cache = SnapshotCache(self._fetch_resources, ttl=cache_ttl)
+        register_invalidation_hook(self.cache.invalidate)
+        self._inventory = Inventory()
+
+    def _connect(self):
+        client, version = connect_client(
+            self._loop, self.config.host, self.config.port, self.config.scheme,
+            user=self.config.user, password=self.config.password,
+            token_name=self.config.token_name, token_value=self.config.token_secret,
+            timeout=self._request_timeout, max_connections=self._pool_size
+        )
+        print(f"✅ Connected to Proxmox cluster '{self.name}' (version {version.get('version')})")
+        return client
+
+    def start(self):
+        self.connection.start()
+
+    def _client(self, wait: float = 0):
+        client = self.connection.get_client(wait=wait)
+        if client is None:
+            raise ClusterUnavailable(f"not connected ({self.connection.last_error or 'connecting'})")
+        return client
+
+    async def api_get(self, path, **params):
+        """GETs an API path of this cluster, dropping the client if the host went away."""
+        client = self._client()
+        try:
+            return await client.get(path, **params)
+        except httpx.TransportError as e:
+            self.connection.mark_failed(client, e)
+            raise
+
+    def _fetch_resources(self):
+        debug("Fetching cluster resources snapshot from cluster %s...", self.name)
+        return self._loop.run(self.api_get("/cluster/resources"))
+
+    def inventory(self):
+        """Returns the indexed inventory, re-indexing it if the snapshot changed."""
+        self._client(wait=self._connect_wait)
+        resources, version = self.cache.get_versioned()
+        if self._inventory.version != version:
+            with span("inventory:reindex", cluster=self.name, resources=len(resources)):
+                self._inventory.update(resources, version)
+        return self._inventory
+
+    def storage(self):
+        self._client(wait=self._connect_wait)
+        return self._loop.run(self.api_get("/storage"))
+
+    async def fetch_config(self, vm_resource):
+        """Fetches the config of one guest resource and adds hierarchy info."""
+        vmid, node, vm_type = vm_resource.get("vmid"), vm_resource.get("node"), vm_resource.get("type")
+        if vm_type not in ("qemu", "lxc"):
+            raise ValueError(f"Unknown VM type: {vm_type}")
+        config = await self.api_get(f"/nodes/{node}/{vm_type}/{vmid}/config")
+        config.update(vmid=vmid, node=node, type=vm_type, status=vm_resource.get("status", "unknown"))
+        return config
+
+    def status(self):
+        return {**self.connection.status(), "cache": self.cache.stats()}
+
+
+class ClusterRegistry:
+    """
+    The clusters the reader answers for, by name and in configuration
+    order. fan_out() runs one read on several of them at once, each with
+    its own deadline, and returns what arrived in time along with the
+    clusters it left out (a late read still finishes and fills its
+    cache). Each cluster reads on its own few threads, and one with a
+    late read still running is left out of new reads until it returns,
+    so a hung cluster cannot hold up the others. `unavailable` keeps
+    each cluster's last failure until its next successful read, for
+    stats() only.
+
+    Members provide name, timeout, inventory(), storage(),
+    fetch_config() and status().
+    """
+
+    def __init__(self):
+        self._clusters = {}
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._late = {}
+        self.unavailable = {}
+
+    def register(self, cluster):
+        self._clusters[cluster.name] = cluster
+        return cluster
+
+    def names(self):
+        return list(self._clusters)
+
+    def members(self):
+        return list(self._clusters.values())
+
+    def get(self, name: str):
+        try:
+            return self._clusters[name]
+        except KeyError:
+            raise ValueError(f"Unknown cluster '{name}' (known: {', '.join(self._clusters)})")
+
+    @property
+    def federated(self):
+        """True with more than one cluster configured."""
+        return len(self._clusters) > 1
+
+    def _executor(self, name):
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"cluster-{name}")
+            return pool
+
+    def _submit(self, read, member):
+        """Starts read(member), or returns None while an earlier read of it is past its deadline."""
+        with self._lock:
+            if self._late.get(member.name):
+                return None
+        return self._executor(member.name).submit(read, member)
+
+    def _running_late(self, name, future):
+        with self._lock:
+            self._late[name] = self._late.get(name, 0) + 1
+
+        def done(_):
+            with self._lock:
+                self._late[name] -= 1
+
+        future.add_done_callback(done)
+
+    def _mark(self, name, error):
+        with self._lock:
+            if error is None:
+                self.unavailable.pop(name, None)
+            else:
+                self.unavailable[name] = error
+        if error is not None:
+            print(f"⚠️ Cluster '{name}' left out: {error}")
+
+    def fan_out(self, read, cluster: str = None):
+        """
+        Calls read(member) on the named cluster, or on every cluster at
+        once. Returns ([(name, result)] in registry order for those that
+        answered within their timeout, {name: reason} for the others);
+        the left-out ones also go to an enclosing left_out_clusters().
+        Raises ClusterUnavailable when the one cluster asked for by name
+        did not answer.
+        """
+        members = [self.get(cluster)] if cluster else self.members()
+        start = time.monotonic()
+        futures = [(member, self._submit(read, member)) for member in members]
+        results = []
+        left_out = {}
+        with span("clusters:fan_out", clusters=len(members)) as current:
+            for member, future in futures:
+                remaining = max(0.0, member.timeout - (time.monotonic() - start))
+                if future is None:
+                    left_out[member.name] = "still busy with an earlier read past its deadline"
+                else:
+                    try:
+                        results.append((member.name, future.result(timeout=remaining)))
+                        self._mark(member.name, None)
+                    except FutureTimeout:
+                        left_out[member.name] = f"timed out after {member.timeout:g}s"
+                        self._running_late(member.name, future)
+                    except Exception as e:
+                        left_out[member.name] = f"{type(e).__name__}: {str(e)}"
+                if member.name in left_out:
+                    self._mark(member.name, left_out[member.name])
+            current.set(answered=len(results))
+        if cluster and not results:
+            raise ClusterUnavailable(f"Cluster '{cluster}' is unavailable: {left_out.get(cluster)}")
+        collected = _left_out.get()
+        if collected is not None:
+            collected.update(left_out)
+        return results, left_out
+
+    def stats(self):
+        return {
+            "clusters": {name: member.status() for name, member in self._clusters.items()},
+            "unavailable": dict(self.unavailable),
+        }
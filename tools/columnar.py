@@ -0,0 +1,182 @@
+# tools/columnar.py
+import sys
+
+import numpy as np
+
+from tools.inventory import GUEST_TYPES
+
+# Numeric fields of /cluster/resources kept as arrays (missing values are 0)
+NUMERIC_COLUMNS = ("cpu", "maxcpu", "mem", "maxmem", "disk", "maxdisk", "uptime")
+# Low-cardinality string fields stored as small integer codes
+CATEGORY_COLUMNS = ("type", "node", "status")
+
+
+class _Categories:
+    """Maps interned strings to dense integer codes and back."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(sys.intern(str(value)) if value is not None else "")
+        return code
+
+    def lookup(self, value):
+        """Code of an existing value, or -1."""
+        return self._codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ColumnarInventory:
+    """
+    Array-backed copy of a /cluster/resources snapshot, built once per
+    snapshot version. Node, status and type are interned and stored as
+    uint16 codes, numeric fields as float64 arrays, so aggregates over
+    50k guests are a handful of NumPy reductions instead of dict scans.
+    """
+
+    def __init__(self, resources, version=None):
+        self.version = version
+        self.categories = {column: _Categories() for column in CATEGORY_COLUMNS}
+        n = len(resources)
+        # Column by column: one tight loop per field beats one loop over fields per row
+        self.codes = {
+            column: np.fromiter(
+                (self.categories[column].code(r.get(column)) for r in resources), dtype=np.uint16, count=n
+            )
+            for column in CATEGORY_COLUMNS
+        }
+        self.columns = {
+            column: np.fromiter((r.get(column) or 0 for r in resources), dtype=np.float64, count=n)
+            for column in NUMERIC_COLUMNS
+        }
+        self.vmid = np.fromiter((r.get("vmid") or 0 for r in resources), dtype=np.int64, count=n)
+        self.name = [r.get("name") for r in resources]
+        self.storage = [r.get("storage") for r in resources]
+
+    def __len__(self):
+        return len(self.vmid)
+
+    def mask(self, column, *values):
+        """Boolean mask of rows whose category column is one of values."""
+        categories = self.categories[column]
+        wanted = [c for c in (categories.lookup(v) for v in values) if c >= 0]
+        return np.isin(self.codes[column], wanted)
+
+    def nbytes(self):
+        """Approximate memory held by the arrays and string lists."""
+        arrays = sum(a.nbytes for a in self.codes.values()) + sum(a.nbytes for a in self.columns.values())
+        lists = sys.getsizeof(self.name) + sys.getsizeof(self.storage)
+        return arrays + self.vmid.nbytes + lists
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+
+
+def capacity_report(inv: ColumnarInventory, node: str = None, top: int = 5):
+    """
+    Per-node and cluster utilization, overcommit and top consumers.
+
+    Utilization comes from the node rows (cpu is a 0..1 load fraction,
+    mem/maxmem bytes) and storage rows (disk/maxdisk). Overcommit is what
+    running guests are allocated (vCPUs, memory) over the node's physical
+    capacity. Top consumers rank running guests by memory and by cores in
+    use (a guest's cpu is a 0..1 fraction of its own vCPUs).
+    """
+    nodes = inv.categories["node"]
+    n_nodes = len(nodes.values)
+    node_codes = inv.codes["node"]
+    cols = inv.columns
+
+    is_node = inv.mask("type", "node")
+    is_guest = inv.mask("type", *GUEST_TYPES)
+    is_storage = inv.mask("type", "storage")
+    running = is_guest & inv.mask("status", "running")
+
+    def per_node(mask, values):
+        return np.bincount(node_codes[mask], weights=values[mask], minlength=n_nodes)
+
+    node_cpus = per_node(is_node, cols["maxcpu"])
+    node_mem = per_node(is_node, cols["maxmem"])
+    node_cpu_load = per_node(is_node, cols["cpu"] * cols["maxcpu"])
+    node_mem_used = per_node(is_node, cols["mem"])
+    disk_used = per_node(is_storage, cols["disk"])
+    disk_total = per_node(is_storage, cols["maxdisk"])
+    vcpus = per_node(running, cols["maxcpu"])
+    guest_mem = per_node(running, cols["maxmem"])
+    guests = np.bincount(node_codes[is_guest], minlength=n_nodes)
+    guests_running = np.bincount(node_codes[running], minlength=n_nodes)
+
+    cpu_pct = _ratio(node_cpu_load, node_cpus) * 100
+    mem_pct = _ratio(node_mem_used, node_mem) * 100
+    disk_pct = _ratio(disk_used, disk_total) * 100
+    cpu_overcommit = _ratio(vcpus, node_cpus)
+    mem_overcommit = _ratio(guest_mem, node_mem)
+
+    has_node_row = np.bincount(node_codes[is_node], minlength=n_nodes) > 0
+    rows = []
+    for code in np.flatnonzero(has_node_row):
+        name = nodes.values[code]
+        if node and name != node:
+            continue
+        rows.append({
+            "node": name,
+            "guests": int(guests[code]),
+            "running": int(guests_running[code]),
+            "cpus": int(node_cpus[code]),
+            "cpu_pct": round(float(cpu_pct[code]), 1),
+            "mem_pct": round(float(mem_pct[code]), 1),
+            "disk_pct": round(float(disk_pct[code]), 1),
+            "vcpu_overcommit": round(float(cpu_overcommit[code]), 2),
+            "mem_overcommit": round(float(mem_overcommit[code]), 2),
+        })
+
+    scope = running if not node else running & inv.mask("node", node)
+    cluster_cpus = node_cpus.sum()
+    cluster = {
+        "nodes": int(has_node_row.sum()),
+        "guests": int(guests.sum()),
+        "running": int(guests_running.sum()),
+        "cpu_pct": round(float(_ratio(node_cpu_load.sum(), cluster_cpus)) * 100, 1),
+        "mem_pct": round(float(_ratio(node_mem_used.sum(), node_mem.sum())) * 100, 1),
+        "disk_pct": round(float(_ratio(disk_used.sum(), disk_total.sum())) * 100, 1),
+        "vcpu_overcommit": round(float(_ratio(vcpus.sum(), cluster_cpus)), 2),
+        "mem_overcommit": round(float(_ratio(guest_mem.sum(), node_mem.sum())), 2),
+    }
+    return {
+        "cluster": cluster,
+        "nodes": rows,
+        "top_memory": _top(inv, scope, cols["mem"], top),
+        "top_cpu": _top(inv, scope, cols["cpu"] * cols["maxcpu"], top),
+    }
+
+
+def _top(inv, mask, values, k):
+    """The k rows under mask with the largest values, largest first."""
+    rows = np.flatnonzero(mask)
+    if not len(rows) or k <= 0:
+        return []
+    k = min(k, len(rows))
+    picked = rows[np.argpartition(values[rows], -k)[-k:]]
+    picked = picked[np.argsort(values[picked])[::-1]]
+    node_values = inv.categories["node"].values
+    return [
+        {
+            "vmid": int(inv.vmid[i]),
+            "name": inv.name[i],
+            "node": node_values[inv.codes["node"][i]],
+            "cpu_cores": round(float(inv.columns["cpu"][i] * inv.columns["maxcpu"][i]), 2),
+            "maxcpu": int(inv.columns["maxcpu"][i]),
+            "mem": int(inv.columns["mem"][i]),
+            "maxmem": int(inv.columns["maxmem"][i]),
+        }
+        for i in picked
+    ]
@@ -0,0 +1,118 @@
+# tools/formatting.py
+import os
+from collections import Counter
+
+# Upper bound on what a single tool result may cost the LLM, in tokens
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "1500"))
+# Rough but stable: Llama tokenizers average about 4 characters per token
+CHARS_PER_TOKEN = 4
+NARROW_HINT = "Narrow your query (filter by node, status, type or vmid) to see the rest."
+
+
+def estimate_tokens(text: str):
+    """Cheap token estimate used for budgeting tool output."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _budget_chars(budget):
+    return (budget or TOOL_OUTPUT_MAX_TOKENS) * CHARS_PER_TOKEN
+
+
+def _cell(value):
+    if value is None:
+        return "-"
+    # Keep the table parseable: no separators or newlines inside a cell
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def format_gib(value):
+    """Bytes -> '3.5G' (compact and good enough for the LLM)."""
+    if not value:
+        return "0"
+    return f"{value / 1024 ** 3:.1f}G"
+
+
+def format_table(rows, columns, title=None, budget=None, group_by=(), top_key=None, top_label=None):
+    """
+    Renders rows as a compact table: one header line, then one
+    pipe-separated line per row.
+
+    columns is a list of (header, getter) where getter is a dict key or a
+    callable. If the table does not fit the token budget, the output
+    becomes an aggregate summary (counts per `group_by` field) plus as many
+    rows as fit, ordered by `top_key` when given, and a hint to narrow
+    the query.
+    """
+    limit = _budget_chars(budget)
+    header = " | ".join(name for name, _ in columns)
+    getters = [g if callable(g) else (lambda r, k=g: r.get(k)) for _, g in columns]
+
+    def render(row):
+        return " | ".join(_cell(get(row)) for get in getters)
+
+    lines = [title] if title else []
+    lines.append(header)
+    used = sum(len(line) + 1 for line in lines)
+    body = []
+    for row in rows:
+        line = render(row)
+        used += len(line) + 1
+        if used > limit:
+            break
+        body.append(line)
+    if len(body) == len(rows):
+        return "\n".join(lines + body)
+
+    # Too big: summarize, then spend what is left on the top rows
+    summary = [f"{title or 'Result'} ({len(rows)} rows, truncated to fit the output budget)"]
+    for field in group_by:
+        counts = Counter(_cell(r.get(field)) for r in rows)
+        top = ", ".join(f"{value}: {n}" for value, n in counts.most_common(10))
+        more = f", +{len(counts) - 10} more" if len(counts) > 10 else ""
+        summary.append(f"By {field}: {top}{more}")
+    ordered = sorted(rows, key=top_key, reverse=True) if top_key else rows
+
+    footer_reserve = len(NARROW_HINT) + 60
+    used = sum(len(line) + 1 for line in summary) + len(header) + 1 + footer_reserve
+    body = []
+    for row in ordered:
+        line = render(row)
+        used += len(line) + 1
+        if used > limit:
+            break
+        body.append(line)
+    label = f"Top {len(body)} by {top_label}" if top_label else f"First {len(body)}"
+    return "\n".join(
+        summary
+        + [f"{label} of {len(rows)}:", header]
+        + body
+        + [NARROW_HINT]
+    )
+
+
+def format_mapping(mapping: dict, title=None, budget=None, max_value_chars=120):
+    """Renders a dict as compact 'key=value' lines within the token budget."""
+    limit = _budget_chars(budget)
+    lines = [title] if title else []
+    used = sum(len(line) + 1 for line in lines)
+    items = sorted(mapping.items())
+    for i, (key, value) in enumerate(items):
+        text = _cell(value)
+        if len(text) > max_value_chars:
+            text = text[:max_value_chars - 3] + "..."
+        line = f"{key}={text}"
+        used += len(line) + 1
+        if used > limit:
+            lines.append(f"... {len(items) - i} more keys omitted")
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def clip_text(text: str, budget=None, hint=None):
+    """Truncates free text (e.g. Terraform output) to the token budget."""
+    limit = _budget_chars(budget)
+    if len(text) <= limit:
+        return text
+    note = f"\n... truncated ({estimate_tokens(text)} tokens total). {hint or ''}".rstrip()
+    return text[:max(0, limit - len(note))] + note
@@ -0,0 +1,448 @@
+# tools/inventory.py
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+# Callbacks run by invalidate_all() whenever the cluster has been changed
+# behind our back (e.g. a Terraform apply/destroy).
+_invalidation_hooks = []
+
+
+def register_invalidation_hook(hook):
+    """Registers a zero-argument callable to run on invalidate_all()."""
+    _invalidation_hooks.append(hook)
+    return hook
+
+
+def invalidate_all():
+    """Drops every registered cached view of the cluster."""
+    for hook in list(_invalidation_hooks):
+        try:
+            hook()
+        except Exception as e:
+            print(f"❌ Error invalidating cache: {type(e).__name__}: {str(e)}")
+
+
+class _Flight:
+    """A single in-progress fetch that concurrent callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.version = None
+        self.error = None
+
+
+class SnapshotCache:
+    """
+    Caches the result of an expensive fetch for `ttl` seconds.
+    Concurrent callers that miss the cache share one in-flight fetch
+    instead of each hitting the API (single-flight).
+
+    A seeded snapshot (e.g. loaded from disk at startup) is stale: it is
+    returned at once while one background fetch replaces it.
+    """
+
+    def __init__(self, fetch, ttl: float = 30.0):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flight = None
+        self._value = None
+        self._fetched_at = 0.0
+        self._stale = False
+        # Bumped on invalidate so a fetch started before it is not stored
+        self._generation = 0
+        # Bumped every time a new snapshot is stored
+        self.version = 0
+        # While above 0 the snapshot does not expire (see pinned)
+        self._pins = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.stale_hits = 0
+
+    def _is_fresh(self):
+        return self._value is not None and (self._pins > 0 or time.monotonic() - self._fetched_at < self.ttl)
+
+    @property
+    def stale(self):
+        """True while a seeded snapshot is served and no fetch has replaced it."""
+        return self._stale
+
+    def get(self):
+        """Returns the cached snapshot, fetching it if missing or expired."""
+        return self.get_versioned()[0]
+
+    def get_versioned(self):
+        """Returns (snapshot, version) so callers can tell snapshots apart."""
+        with self._lock:
+            if self._stale:
+                self.stale_hits += 1
+                if self._flight is None:
+                    self.misses += 1
+                    flight = self._flight = _Flight()
+                    threading.Thread(
+                        target=self._refresh, args=(flight, self._generation), name="snapshot-refresh", daemon=True
+                    ).start()
+                return self._value, self.version
+            if self._is_fresh():
+                self.hits += 1
+                return self._value, self.version
+            if self._flight is not None:
+                self.waits += 1
+                flight = self._flight
+                leader = False
+            else:
+                self.misses += 1
+                flight = self._flight = _Flight()
+                generation = self._generation
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, flight.version
+
+        self._lead(flight, generation)
+        return flight.value, flight.version
+
+    def _lead(self, flight, generation):
+        """Runs the fetch for a flight, stores the result and wakes its waiters."""
+        try:
+            flight.value = self._fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    if generation == self._generation:
+                        self._value = flight.value
+                        self._fetched_at = time.monotonic()
+                        self._stale = False
+                    # Versions stay unique even for snapshots that were not stored
+                    self.version += 1
+                    flight.version = self.version
+                if self._flight is flight:
+                    self._flight = None
+            flight.done.set()
+
+    def _refresh(self, flight, generation):
+        # Background replacement of a stale snapshot; the next get() retries a failure
+        try:
+            self._lead(flight, generation)
+        except Exception as e:
+            print(f"❌ Error refreshing stale snapshot: {type(e).__name__}: {str(e)}")
+
+    def refresh(self):
+        """
+        Fetches a new snapshot now and returns (snapshot, version). Other
+        callers keep the current snapshot meanwhile (a stale one without
+        waiting); a fetch started before this one is not stored.
+        """
+        with self._lock:
+            self._generation += 1
+            self.misses += 1
+            flight = self._flight = _Flight()
+            generation = self._generation
+        self._lead(flight, generation)
+        return flight.value, flight.version
+
+    def seed(self, value):
+        """
+        Serves `value` as a stale snapshot until the first fetch replaces
+        it. Does nothing if a snapshot is already cached. Returns its
+        version, or None.
+        """
+        with self._lock:
+            if self._value is not None or value is None:
+                return None
+            self._value = value
+            self._stale = True
+            self.version += 1
+            return self.version
+
+    def put(self, value, base_version):
+        """
+        Stores a snapshot patched from version base_version (see
+        InventorySync) and returns its new version. Returns None and
+        stores nothing if the cache moved on or was invalidated since.
+        """
+        with self._lock:
+            if self._value is None or self.version != base_version:
+                return None
+            self._value = value
+            self._fetched_at = time.monotonic()
+            self.version += 1
+            return self.version
+
+    def touch(self):
+        """Marks the current snapshot as verified fresh without replacing it."""
+        with self._lock:
+            if self._value is not None:
+                self._fetched_at = time.monotonic()
+
+    @contextmanager
+    def pinned(self):
+        """
+        Keeps the current snapshot from expiring until the block ends, so a
+        long run of reads (a batch) all see the same one. invalidate() still
+        drops it (e.g. after an apply); the snapshot fetched next is kept instead.
+        """
+        with self._lock:
+            self._pins += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins -= 1
+
+    def invalidate(self):
+        """Forces the next get() to fetch a fresh snapshot."""
+        with self._lock:
+            self._value = None
+            self._stale = False
+            self._generation += 1
+
+    def stats(self):
+        """Returns hit/miss counters and the age of the current snapshot."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.waits
+            return {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "stale_hits": self.stale_hits,
+                "pinned": self._pins > 0,
+                "hit_ratio": round((self.hits + self.waits) / lookups, 3) if lookups else 0.0,
+                "version": self.version,
+                "age": round(time.monotonic() - self._fetched_at, 1) if self._value is not None else None,
+            }
+
+
+GUEST_TYPES = ("qemu", "lxc")
+# Usage counters that move on every poll; they do not change what a guest is
+VOLATILE_FIELDS = frozenset(("cpu", "mem", "disk", "uptime", "netin", "netout", "diskread", "diskwrite"))
+
+
+def _resource_id(resource):
+    """Returns the stable cluster id of a resource, e.g. 'qemu/100'."""
+    if resource.get("id"):
+        return resource["id"]
+    rtype = resource.get("type")
+    if rtype in GUEST_TYPES:
+        return f"{rtype}/{resource.get('vmid')}"
+    if rtype == "storage":
+        return f"storage/{resource.get('node')}/{resource.get('storage')}"
+    return f"{rtype}/{resource.get('node')}"
+
+
+def _index_key(resource):
+    """The fields the indexes are keyed on; other fields can change in place."""
+    return (resource.get("type"), resource.get("vmid"), resource.get("name"), resource.get("node"))
+
+
+def _content_digest(resource):
+    """Stable 64-bit digest of a resource, ignoring usage counters."""
+    # repr of a key-sorted dict is stable and cheaper than json.dumps(sort_keys=True)
+    stable = {k: resource[k] for k in sorted(resource) if k not in VOLATILE_FIELDS}
+    return int.from_bytes(hashlib.blake2b(repr(stable).encode(), digest_size=8).digest(), "big")
+
+
+class Inventory:
+    """
+    Indexed view of a /cluster/resources snapshot.
+    Lookups by vmid, name, node and type are dictionary hits instead of
+    scans, and update() only touches resources that changed.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.RLock()
+        # XOR of per-resource digests, maintained incrementally; None until
+        # first asked for, so the initial bulk load skips hashing
+        self._digest = None
+        self._by_id = {}
+        self._by_vmid = {}
+        self._by_name = {}
+        self._by_node = {}
+        self._by_type = {}
+
+    def _add(self, rid, resource):
+        self._by_id[rid] = resource
+        if self._digest is not None:
+            self._digest ^= _content_digest(resource)
+        rtype = resource.get("type")
+        self._by_type.setdefault(rtype, {})[rid] = resource
+        if rtype in GUEST_TYPES:
+            self._by_vmid[resource.get("vmid")] = resource
+            if resource.get("name"):
+                self._by_name.setdefault(resource["name"], {})[rid] = resource
+            self._by_node.setdefault(resource.get("node"), {})[rid] = resource
+
+    def _remove(self, rid):
+        resource = self._by_id.pop(rid, None)
+        if resource is None:
+            return
+        if self._digest is not None:
+            self._digest ^= _content_digest(resource)
+        rtype = resource.get("type")
+        self._discard(self._by_type, rtype, rid)
+        if rtype in GUEST_TYPES:
+            if self._by_vmid.get(resource.get("vmid")) is resource:
+                del self._by_vmid[resource.get("vmid")]
+            self._discard(self._by_name, resource.get("name"), rid)
+            self._discard(self._by_node, resource.get("node"), rid)
+
+    @staticmethod
+    def _discard(index, key, rid):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(rid, None)
+            if not bucket:
+                del index[key]
+
+    def _replace(self, rid, resource):
+        """Swaps in a refreshed resource whose index keys did not change."""
+        if self._digest is not None:
+            self._digest ^= _content_digest(self._by_id[rid]) ^ _content_digest(resource)
+        self._by_id[rid] = resource
+        self._by_type[resource.get("type")][rid] = resource
+        if resource.get("type") in GUEST_TYPES:
+            self._by_vmid[resource.get("vmid")] = resource
+            if resource.get("name"):
+                self._by_name[resource["name"]][rid] = resource
+            self._by_node[resource.get("node")][rid] = resource
+
+    def update(self, resources, version=None):
+        """
+        Brings the indexes in line with a new snapshot.
+        Returns counts of added, changed and removed resources.
+        """
+        with self._lock:
+            if version is not None and self.version is not None and version <= self.version:
+                # A slower caller is holding the same or an older snapshot; keep ours
+                return {"added": 0, "changed": 0, "removed": 0}
+            incoming = {_resource_id(r): r for r in resources}
+            removed = [rid for rid in self._by_id if rid not in incoming]
+            for rid in removed:
+                self._remove(rid)
+
+            added = changed = 0
+            for rid, resource in incoming.items():
+                current = self._by_id.get(rid)
+                if current is None:
+                    self._add(rid, resource)
+                    added += 1
+                elif current != resource:
+                    if _index_key(current) == _index_key(resource):
+                        self._replace(rid, resource)
+                    else:
+                        self._remove(rid)
+                        self._add(rid, resource)
+                    changed += 1
+            self.version = version
+            return {"added": added, "changed": changed, "removed": len(removed)}
+
+    def apply(self, upserts=(), removals=(), publish=None):
+        """
+        Patches single resources in place without a full snapshot: upserts
+        are complete resource dicts, removals are resource ids.
+        With publish, the patched resource list is first handed to
+        publish(resources) (SnapshotCache.put), all under the lock: the
+        indexes only change if it returns a version, which becomes this
+        inventory's version, so readers never see an unpublished patch.
+        Returns (old, new) resource pairs for everything that changed, or
+        None if publish stored nothing.
+        """
+        upserts = list(upserts)
+        with self._lock:
+            if publish is not None:
+                patched = dict(self._by_id)
+                for rid in removals:
+                    patched.pop(rid, None)
+                for resource in upserts:
+                    patched[_resource_id(resource)] = resource
+                if len(patched) == len(self._by_id) and all(
+                    self._by_id.get(rid) == resource for rid, resource in patched.items()
+                ):
+                    return []
+                version = publish(list(patched.values()))
+                if version is None:
+                    return None
+            changes = []
+            for rid in removals:
+                current = self._by_id.get(rid)
+                if current is not None:
+                    self._remove(rid)
+                    changes.append((current, None))
+            for resource in upserts:
+                rid = _resource_id(resource)
+                current = self._by_id.get(rid)
+                if current is None:
+                    self._add(rid, resource)
+                elif current == resource:
+                    continue
+                elif _index_key(current) == _index_key(resource):
+                    self._replace(rid, resource)
+                else:
+                    self._remove(rid)
+                    self._add(rid, resource)
+                changes.append((current, resource))
+            if publish is not None:
+                self.version = version
+        return changes
+
+    def resources(self):
+        """Returns every resource, as a list like /cluster/resources."""
+        with self._lock:
+            return list(self._by_id.values())
+
+    @property
+    def fingerprint(self):
+        """
+        Content hash of the snapshot, ignoring usage counters. Unlike
+        version it is the same across restarts for the same cluster state.
+        """
+        with self._lock:
+            if self._digest is None:
+                self._digest = 0
+                for resource in self._by_id.values():
+                    self._digest ^= _content_digest(resource)
+            return f"{self._digest:016x}"
+
+    def by_type(self, *types):
+        """Returns all resources of the given types, guests sorted by vmid."""
+        with self._lock:
+            items = [r for t in types for r in self._by_type.get(t, {}).values()]
+        if any(t in GUEST_TYPES for t in types):
+            items.sort(key=lambda r: r.get("vmid") or 0)
+        return items
+
+    def guests(self):
+        """Returns all VMs and containers."""
+        return self.by_type(*GUEST_TYPES)
+
+    def get_guest(self, vmid: int):
+        """Returns the VM or container with this vmid, or None."""
+        with self._lock:
+            return self._by_vmid.get(vmid)
+
+    def find_by_name(self, name: str):
+        """Returns all guests with this name (names are not unique)."""
+        with self._lock:
+            return list(self._by_name.get(name, {}).values())
+
+    def node_guests(self, node: str):
+        """Returns the guests placed on a node, sorted by vmid."""
+        with self._lock:
+            items = list(self._by_node.get(node, {}).values())
+        items.sort(key=lambda r: r.get("vmid") or 0)
+        return items
+
+    def __len__(self):
+        return len(self._by_id)
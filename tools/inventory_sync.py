@@ -0,0 +1,547 @@
+# tools/inventory_sync.py
+import collections
+import os
+import re
+import threading
+import time
+
+from tools.inventory import GUEST_TYPES, VOLATILE_FIELDS, _resource_id
+from tools.telemetry import debug, span
+
+# Seconds between polls of /cluster/tasks and /cluster/log; 0 leaves sync off
+PROXMOX_SYNC_INTERVAL = float(os.getenv("PROXMOX_SYNC_INTERVAL", "0"))
+# Full /cluster/resources refetch even without a gap; guest usage counters only move then
+PROXMOX_SYNC_FULL_INTERVAL = float(os.getenv("PROXMOX_SYNC_FULL_INTERVAL", "900"))
+# Node rows (status, CPU, memory) are refreshed from /nodes this often
+PROXMOX_SYNC_NODE_INTERVAL = float(os.getenv("PROXMOX_SYNC_NODE_INTERVAL", "60"))
+# Cluster log entries requested per poll; an answer made only of new entries means some were missed
+PROXMOX_SYNC_LOG_MAX = int(os.getenv("PROXMOX_SYNC_LOG_MAX", "200"))
+# Changes kept for the agent and the CLI
+CHANGE_FEED_SIZE = int(os.getenv("CHANGE_FEED_SIZE", "500"))
+# Log entries asked for first; only a window of nothing but new entries asks for log_max
+LOG_WINDOW = 20
+# A full resync that finds more changes than this reports one summary line
+MAX_RESYNC_EVENTS = 20
+# Log entries at the cursor's timestamp are remembered this long to skip repeats
+CURSOR_SLACK = 5
+
+# Task types that act on one guest (the task id is its vmid) and the verb for the feed
+GUEST_TASKS = {
+    "qmstart": "start", "qmstop": "stop", "qmshutdown": "shutdown", "qmreboot": "reboot",
+    "qmreset": "reset", "qmsuspend": "suspend", "qmpause": "pause", "qmresume": "resume",
+    "qmcreate": "create", "qmrestore": "restore", "qmdestroy": "destroy", "qmconfig": "reconfigure",
+    "qmtemplate": "template", "qmigrate": "migrate", "qmclone": "clone",
+    "vzstart": "start", "vzstop": "stop", "vzshutdown": "shutdown", "vzreboot": "reboot",
+    "vzsuspend": "suspend", "vzresume": "resume", "vzcreate": "create", "vzrestore": "restore",
+    "vzdestroy": "destroy", "vztemplate": "template", "vzmigrate": "migrate", "vzclone": "clone",
+}
+# Feed wording per task verb
+TASK_EVENTS = {
+    "start": "started", "stop": "stopped", "shutdown": "shut down", "reboot": "rebooted",
+    "reset": "reset", "suspend": "suspended", "pause": "paused", "resume": "resumed",
+    "create": "created", "restore": "restored", "destroy": "destroyed",
+    "reconfigure": "reconfigured", "template": "converted to a template",
+}
+STATUS_EVENTS = {"running": "started", "stopped": "stopped", "paused": "paused", "suspended": "suspended"}
+# Fields of /nodes/{node}/{type}/{vmid}/status/current copied onto the resource
+STATUS_FIELDS = (
+    "status", "name", "cpu", "mem", "maxmem", "disk", "maxdisk", "uptime",
+    "netin", "netout", "diskread", "diskwrite", "template", "tags", "lock",
+)
+NODE_FIELDS = ("status", "cpu", "maxcpu", "mem", "maxmem", "disk", "maxdisk", "uptime")
+
+# UPID:node:pid:pstart:starttime:type:id:user:
+_UPID = re.compile(r"UPID:([\w.-]+):[0-9A-Fa-f]+:[0-9A-Fa-f]+:[0-9A-Fa-f]+:(\w+):([^:]*):[^:]*:")
+_END_TASK = re.compile(r"end task (UPID:[\w.-]+:(?:[0-9A-Fa-f]+:){3}\w+:[^:]*:[^:]*:)\s*(.*)")
+# HA and other daemons name guests as vm:104 / ct:104
+_SERVICE_ID = re.compile(r"\b(?:vm|ct):(\d+)\b")
+_MIGRATION_TARGET = re.compile(r"to node '([\w.-]+)'")
+
+
+def _label(resource):
+    kind = "CT" if resource.get("type") == "lxc" else "VM"
+    name = f" ({resource['name']})" if resource.get("name") else ""
+    return f"{kind} {resource.get('vmid')}{name}"
+
+
+def describe_change(old, new):
+    """One feed line for a resource that changed, or None for usage-only changes."""
+    current = new or old
+    if current.get("type") == "node":
+        if old and new and old.get("status") != new.get("status"):
+            return f"Node {new.get('node')} is {new.get('status')}"
+        return None
+    if current.get("type") not in GUEST_TYPES:
+        return None
+    if old is None:
+        return f"{_label(new)} created on {new.get('node')}"
+    if new is None:
+        return f"{_label(old)} destroyed on {old.get('node')}"
+    if old.get("node") != new.get("node"):
+        return f"{_label(new)} migrated from {old.get('node')} to {new.get('node')}"
+    if old.get("status") != new.get("status"):
+        verb = STATUS_EVENTS.get(new.get("status"), f"is {new.get('status')}")
+        return f"{_label(new)} {verb} on {new.get('node')}"
+    if any(old.get(k) != new.get(k) for k in set(old) | set(new) if k not in VOLATILE_FIELDS):
+        return f"{_label(new)} reconfigured on {new.get('node')}"
+    return None
+
+
+class ChangeFeed:
+    """Bounded, sequence-numbered list of cluster changes."""
+
+    def __init__(self, size=CHANGE_FEED_SIZE):
+        self._events = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.last_seq = 0
+
+    def publish(self, message, **fields):
+        with self._lock:
+            self.last_seq += 1
+            event = {"seq": self.last_seq, "time": time.time(), "message": message, **fields}
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                debug("change feed subscriber failed: %s: %s", type(e).__name__, e)
+        return event
+
+    def subscribe(self, callback):
+        """Calls callback(event) for every change from now on (on the sync thread)."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def since(self, seq=0, max_age=None, limit=None):
+        """Events after sequence number seq (and newer than max_age seconds), oldest first."""
+        cutoff = time.time() - max_age if max_age else 0
+        with self._lock:
+            events = [e for e in self._events if e["seq"] > seq and e["time"] >= cutoff]
+        return events[-limit:] if limit else events
+
+
+class InventorySync:
+    """
+    Keeps the cached /cluster/resources snapshot current without
+    refetching it. Every poll reads /cluster/tasks and /cluster/log past
+    a cursor; guests named by finished tasks are refreshed one by one from
+    their status endpoint, and node rows from /nodes now and then. The
+    patched inventory is published as a new snapshot version.
+
+    A full refetch happens on start, after the connection was lost, when
+    either list moved further than one answer covers (a gap), for events
+    the sync cannot resolve alone (clones), and every full_interval.
+
+    `get(path, **params)` returns API data, or None while Proxmox is
+    unreachable; `load_inventory()` returns the inventory indexed from the
+    current snapshot in `cache`.
+    """
+
+    def __init__(self, get, cache, load_inventory, full_interval=PROXMOX_SYNC_FULL_INTERVAL,
+                 node_interval=PROXMOX_SYNC_NODE_INTERVAL, log_max=PROXMOX_SYNC_LOG_MAX):
+        self._get = get
+        self._cache = cache
+        self._load_inventory = load_inventory
+        self.full_interval = full_interval
+        self.node_interval = node_interval
+        self.log_max = log_max
+        self.interval = None
+        self.feed = ChangeFeed()
+        self._thread = None
+        self._stop = threading.Event()
+        # Serializes poll() and resync() between the thread and direct callers
+        self._poll_lock = threading.Lock()
+        self._resync_reason = "start"
+        self._primed = False
+        self._task_cursor = 0
+        self._log_cursor = 0
+        # Keys of entries at or just before the cursors, so ties are not replayed
+        self._seen_tasks = {}
+        self._seen_log = {}
+        self._fresh_log = []
+        self._inventory = None
+        self._last_full = 0.0
+        self._last_nodes = 0.0
+        self.polls = 0
+        self.requests = 0
+        self.guest_refreshes = 0
+        self.node_refreshes = 0
+        self.resyncs = collections.Counter()
+        self.errors = 0
+        self.last_error = None
+        self.last_poll = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self, interval):
+        """Polls every `interval` seconds on a daemon thread until stop()."""
+        if self._thread and self._thread.is_alive():
+            return
+        self.interval = interval
+        # Whatever happened while stopped is unknown
+        self._resync_reason = "start"
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="proxmox-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        delay = 0
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._resync_reason = "error"
+                debug("Inventory sync failed: %s", self.last_error)
+
+    # -- API ---------------------------------------------------------------
+
+    def _api(self, path, **params):
+        data = self._get(path, **params)
+        if data is not None:
+            self.requests += 1
+        return data
+
+    def poll(self):
+        """One sync step: a resync if one is due, else apply what the task and log lists show."""
+        with self._poll_lock, span("sync:poll") as current:
+            now = time.monotonic()
+            if self._resync_reason is None and self.full_interval and now - self._last_full >= self.full_interval:
+                self._resync_reason = "interval"
+            if self._resync_reason is not None:
+                current.set(resync=self._resync_reason)
+                self._resync()
+                return
+
+            tasks = self._api("/cluster/tasks")
+            log = self._read_log() if tasks is not None else None
+            if tasks is None or log is None:
+                self._resync_reason = "offline"
+                return
+            gap = self._gap(tasks, log)
+            if gap:
+                current.set(resync=gap)
+                self._resync_reason = gap
+                self._resync()
+                return
+
+            new_tasks = self._advance_tasks(tasks)
+            for upid, status, stamp in self._advance_log(log):
+                # Tasks that already dropped out of /cluster/tasks still have their end in the log
+                task = _parse_upid(upid)
+                if task and upid not in self._seen_tasks:
+                    self._seen_tasks[upid] = stamp
+                    task["status"] = status
+                    new_tasks.append(task)
+            current.set(tasks=len(new_tasks))
+            self._apply(new_tasks, self._log_vmids(log), now)
+            self.polls += 1
+            self.last_poll = time.time()
+
+    def resync(self, reason="manual"):
+        """Forces a full refetch now."""
+        with self._poll_lock:
+            self._resync_reason = reason
+            self._resync()
+
+    def _resync(self):
+        reason = self._resync_reason
+        with span("sync:resync", reason=reason):
+            # Cursors come first: anything finishing during the refetch is seen by the next poll
+            tasks = self._api("/cluster/tasks")
+            log = self._api("/cluster/log", max=self.log_max) if tasks is not None else None
+            if tasks is None or log is None:
+                self._resync_reason = "offline"
+                return
+            # The inventory as last published, without fetching if the cache was invalidated
+            before = {_resource_id(r): r for r in self._inventory.resources()} if self._primed else None
+            self._seen_tasks.clear()
+            self._seen_log.clear()
+            self._task_cursor = self._log_cursor = 0
+            self._advance_tasks(tasks)
+            self._advance_log(log)
+
+            # Readers keep the current (possibly stale startup) snapshot until this lands
+            self._cache.refresh()
+            self._inventory = self._load_inventory()
+            after = {_resource_id(r): r for r in self._inventory.resources()}
+        debug("Inventory resynced (%s)", reason)
+        self.resyncs[reason] += 1
+        self._resync_reason = None
+        self._last_full = self._last_nodes = time.monotonic()
+        self.last_poll = time.time()
+        if before is not None:
+            self._publish_diff(before, after, reason)
+        self._primed = True
+
+    def _publish_diff(self, before, after, reason):
+        changes = [
+            (before.get(rid), after.get(rid))
+            for rid in before.keys() | after.keys()
+            if before.get(rid) != after.get(rid)
+        ]
+        messages = [m for m in (describe_change(old, new) for old, new in changes) if m]
+        if len(messages) > MAX_RESYNC_EVENTS:
+            self.feed.publish(f"{len(messages)} changes found by a full resync ({reason})", kind="sync")
+            return
+        for message in sorted(messages):
+            self.feed.publish(message, kind="sync")
+
+    # -- cursors -----------------------------------------------------------
+
+    def _read_log(self):
+        """Newest log entries, enough of them to reach back to the cursor if log_max allows."""
+        window = min(LOG_WINDOW, self.log_max)
+        log = self._api("/cluster/log", max=window)
+        if log is not None and len(log) >= window and window < self.log_max:
+            if min(e.get("time") or 0 for e in log) >= self._log_cursor:
+                log = self._api("/cluster/log", max=self.log_max)
+        return log
+
+    def _gap(self, tasks, log):
+        """Why entries may have been missed since the last poll, or None."""
+        if self._log_cursor and len(log) >= self.log_max:
+            if min(e.get("time") or 0 for e in log) > self._log_cursor:
+                return "log gap"
+        finished = [t.get("endtime") for t in tasks if t.get("endtime")]
+        if self._task_cursor and finished and min(finished) > self._task_cursor:
+            return "task gap"
+        return None
+
+    def _advance_tasks(self, tasks):
+        """Finished tasks not seen before, oldest first; moves the cursor."""
+        fresh = []
+        # Newest first from the API; reversed so same-second tasks keep their order
+        for task in reversed(tasks):
+            end = task.get("endtime")
+            upid = task.get("upid")
+            if not end or not upid or end < self._task_cursor or upid in self._seen_tasks:
+                continue
+            self._seen_tasks[upid] = end
+            parsed = _parse_upid(upid)
+            if parsed:
+                parsed["status"] = task.get("status")
+                parsed["endtime"] = end
+                fresh.append(parsed)
+        if self._seen_tasks:
+            self._task_cursor = max(self._task_cursor, max(self._seen_tasks.values()))
+            _prune(self._seen_tasks, self._task_cursor - CURSOR_SLACK)
+        fresh.sort(key=lambda t: t["endtime"])
+        return fresh
+
+    def _advance_log(self, log):
+        """(upid, status, time) of 'end task' entries not seen before; moves the cursor."""
+        ended = []
+        self._fresh_log = []
+        for entry in log:
+            stamp = entry.get("time") or 0
+            key = (entry.get("node"), entry.get("uid"), stamp)
+            if stamp < self._log_cursor or key in self._seen_log:
+                continue
+            self._seen_log[key] = stamp
+            self._fresh_log.append(entry)
+            match = _END_TASK.search(entry.get("msg") or "")
+            if match:
+                ended.append((*match.groups(), stamp))
+        if self._seen_log:
+            self._log_cursor = max(self._log_cursor, max(self._seen_log.values()))
+            _prune(self._seen_log, self._log_cursor - CURSOR_SLACK)
+        return ended
+
+    def _log_vmids(self, log):
+        """vmids named by new log entries other than task start/end lines."""
+        vmids = set()
+        for entry in self._fresh_log:
+            msg = entry.get("msg") or ""
+            if "UPID:" not in msg:
+                vmids.update(int(v) for v in _SERVICE_ID.findall(msg))
+        return vmids
+
+    # -- applying changes --------------------------------------------------
+
+    def _apply(self, tasks, log_vmids, now):
+        inventory = self._inventory = self._load_inventory()
+        base = inventory.version
+        upserts = {}
+        removals = set()
+        # (task, resource id, verb) in the order the tasks ended, for the feed
+        touched = []
+
+        for task in tasks:
+            verb = GUEST_TASKS.get(task["type"])
+            if verb is None or not task["id"].isdigit():
+                continue
+            vmid = int(task["id"])
+            gtype = "qemu" if task["type"].startswith("qm") else "lxc"
+            rid = f"{gtype}/{vmid}"
+            ok = task["status"] == "OK"
+            if verb == "clone":
+                # The new guest's vmid is not part of the task
+                if ok:
+                    self._resync_reason = f"clone of {rid}"
+                continue
+            node = task["node"]
+            if verb == "migrate" and ok:
+                node = self._migration_target(task)
+                if node is None:
+                    self._resync_reason = f"migration of {rid}"
+                    continue
+            touched.append((task, rid, verb))
+            if verb == "destroy" and ok:
+                removals.add(rid)
+                upserts.pop(rid, None)
+                continue
+            resource = self._refresh_guest(inventory, gtype, vmid, node)
+            if resource is not None:
+                upserts[rid] = resource
+                removals.discard(rid)
+
+        for vmid in log_vmids:
+            current = inventory.get_guest(vmid)
+            if current is not None and all(rid != _resource_id(current) for _, rid, _ in touched):
+                resource = self._refresh_guest(inventory, current["type"], vmid, current["node"])
+                if resource is not None:
+                    upserts[_resource_id(resource)] = resource
+
+        if self.node_interval and now - self._last_nodes >= self.node_interval:
+            upserts.update(self._refresh_nodes(inventory))
+            self._last_nodes = now
+
+        changes = []
+        if upserts or removals:
+            # Published to the cache first; the shared indexes only change if that succeeds
+            changes = inventory.apply(
+                upserts.values(), removals, publish=lambda resources: self._cache.put(resources, base)
+            )
+            if changes is None:
+                # A full fetch or an invalidation won the race; readers reindex from it
+                return
+        self._cache.touch()
+        self._publish(changes, touched, inventory)
+
+    def _refresh_guest(self, inventory, gtype, vmid, node):
+        try:
+            status = self._api(f"/nodes/{node}/{gtype}/{vmid}/status/current")
+        except Exception as e:
+            # Gone again, or on another node than the task said
+            debug("refresh of %s/%s on %s failed: %s", gtype, vmid, node, e)
+            self._resync_reason = f"refresh of {gtype}/{vmid} failed"
+            return None
+        if status is None:
+            self._resync_reason = "offline"
+            return None
+        self.guest_refreshes += 1
+        current = inventory.get_guest(vmid)
+        if current is not None and current.get("type") == gtype:
+            resource = dict(current)
+        else:
+            resource = {"id": f"{gtype}/{vmid}", "type": gtype, "vmid": vmid}
+        resource["node"] = node
+        resource.pop("lock", None)
+        for field in STATUS_FIELDS:
+            if field in status:
+                resource[field] = status[field]
+        if "cpus" in status:
+            resource["maxcpu"] = status["cpus"]
+        return resource
+
+    def _refresh_nodes(self, inventory):
+        rows = self._api("/nodes")
+        if rows is None:
+            return {}
+        self.node_refreshes += 1
+        known = {n.get("node"): n for n in inventory.by_type("node")}
+        upserts = {}
+        for row in rows:
+            name = row.get("node")
+            current = known.get(name)
+            resource = dict(current) if current is not None else {"id": f"node/{name}", "type": "node", "node": name}
+            if row.get("status") != "online":
+                # Offline nodes report no usage; keep the capacity fields
+                for field in ("cpu", "mem", "disk", "uptime"):
+                    resource.pop(field, None)
+            for field in NODE_FIELDS:
+                if field in row:
+                    resource[field] = row[field]
+            upserts[_resource_id(resource)] = resource
+        return upserts
+
+    def _migration_target(self, task):
+        """Target node of a finished migration, read from the task log."""
+        try:
+            lines = self._api(f"/nodes/{task['node']}/tasks/{task['upid']}/log", limit=50) or []
+        except Exception as e:
+            debug("migration log of %s unavailable: %s", task["upid"], e)
+            return None
+        for line in lines:
+            match = _MIGRATION_TARGET.search(line.get("t") or "")
+            if match:
+                return match.group(1)
+        return None
+
+    def _publish(self, changes, touched, inventory):
+        by_id = {_resource_id(new or old): (old, new) for old, new in changes}
+        for task, rid, verb in touched:
+            old, new = by_id.get(rid, (None, None))
+            resource = new or old or inventory.get_guest(int(task["id"])) or {
+                "type": rid.split("/")[0], "vmid": int(task["id"]), "node": task["node"],
+            }
+            if task["status"] != "OK":
+                message = f"{verb.capitalize()} of {_label(resource)} on {task['node']} failed: {task['status']}"
+            elif verb == "migrate":
+                message = f"{_label(resource)} migrated from {task['node']} to {resource.get('node')}"
+            else:
+                message = f"{_label(resource)} {TASK_EVENTS[verb]} on {task['node']}"
+            self.feed.publish(message, kind="task", vmid=resource.get("vmid"),
+                              node=resource.get("node"), upid=task["upid"])
+        for rid in {rid for _, rid, _ in touched}:
+            by_id.pop(rid, None)
+        # Changes no task explains: HA actions from the log, node status
+        for old, new in by_id.values():
+            message = describe_change(old, new)
+            if message:
+                current = new or old
+                self.feed.publish(message, kind=current.get("type"), vmid=current.get("vmid"),
+                                  node=current.get("node"))
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "polls": self.polls,
+            "requests": self.requests,
+            "guest_refreshes": self.guest_refreshes,
+            "node_refreshes": self.node_refreshes,
+            "resyncs": dict(self.resyncs),
+            "changes": self.feed.last_seq,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_poll_age": round(time.time() - self.last_poll, 1) if self.last_poll else None,
+        }
+
+
+def _parse_upid(upid):
+    match = _UPID.match(upid or "")
+    if not match:
+        return None
+    node, task_type, task_id = match.groups()
+    return {"upid": upid, "node": node, "type": task_type, "id": task_id, "status": None, "endtime": 0}
+
+
+def _prune(seen, floor):
+    for key in [k for k, stamp in seen.items() if stamp < floor]:
+        del seen[key]
@@ -0,0 +1,326 @@
+# tools/metrics_store.py
+import json
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+# Samples kept per node/guest; the 'hour' rrd timeframe has one per minute
+METRICS_RING_SIZE = int(os.getenv("METRICS_RING_SIZE", "240"))
+# Directory for memory-mapped persistence across restarts; unset keeps metrics in RAM
+METRICS_PATH = os.getenv("METRICS_PATH")
+# rrddata fields kept per sample (float32); maxcpu/maxmem only as the latest value per series
+FIELDS = ("cpu", "mem", "netin", "netout", "diskread", "diskwrite")
+# What the query tools can rank by, and their units
+METRICS = {
+    "cpu": "% of own CPUs",
+    "cpu_cores": "cores",
+    "mem": "bytes",
+    "mem_pct": "% of own memory",
+    "netin": "bytes/s",
+    "netout": "bytes/s",
+    "diskread": "bytes/s",
+    "diskwrite": "bytes/s",
+}
+STATS = ("mean", "max", "p50", "p90", "p95", "p99")
+# Node rrddata names memory differently from guest rrddata
+NODE_FIELD_ALIASES = {"mem": "memused", "maxmem": "memtotal"}
+# Series kinds by resource id prefix
+KINDS = {"node": 0, "qemu": 1, "lxc": 2}
+GUEST_KINDS = (KINDS["qemu"], KINDS["lxc"])
+
+
+class MetricStore:
+    """
+    Fixed-size ring buffers of rrddata samples, one row per node or guest.
+
+    Each field is one [series, ring] array, so a window query over every
+    guest is a few NumPy reductions and never touches the API. With a
+    path the arrays are .npy files mapped into memory and survive a
+    restart; the series ids are kept next to them in index.json.
+    Memory is about series x ring x 32 bytes.
+    """
+
+    def __init__(self, ring=METRICS_RING_SIZE, path=METRICS_PATH):
+        self.ring = ring
+        self.path = path
+        self._lock = threading.RLock()
+        self.ids = []
+        self._rows = {}
+        self.last_ingest = None
+        if path and self._load():
+            return
+        self._allocate(64)
+
+    # -- storage -----------------------------------------------------------
+
+    def _array(self, name, shape, dtype, fill):
+        if not self.path:
+            return np.full(shape, fill, dtype=dtype)
+        array = np.lib.format.open_memmap(os.path.join(self.path, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape)
+        array[:] = fill
+        return array
+
+    def _allocate(self, capacity):
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+        self.times = self._array("times", (capacity, self.ring), np.int64, 0)
+        self.values = {f: self._array(f, (capacity, self.ring), np.float32, np.nan) for f in FIELDS}
+        # Per series: next write position, samples stored, latest (maxcpu, maxmem)
+        self.head = self._array("head", (capacity,), np.int64, 0)
+        self.count = self._array("count", (capacity,), np.int64, 0)
+        self.limits = self._array("limits", (capacity, 2), np.float64, 0)
+        self.kind = np.full(capacity, -1, dtype=np.int8)
+
+    def _grow(self, needed):
+        capacity = len(self.head)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        old = {"times": self.times, "head": self.head, "count": self.count, "limits": self.limits, **self.values}
+        kind = self.kind
+        if self.path:
+            # Map the old files under temporary names, then copy into fresh ones
+            for name in old:
+                os.replace(os.path.join(self.path, f"{name}.npy"), os.path.join(self.path, f"{name}.old.npy"))
+        self._allocate(new_capacity)
+        new = {"times": self.times, "head": self.head, "count": self.count, "limits": self.limits, **self.values}
+        for name in new:
+            new[name][:capacity] = old[name]
+        self.kind[:capacity] = kind
+        if self.path:
+            old.clear()
+            for name in new:
+                os.remove(os.path.join(self.path, f"{name}.old.npy"))
+
+    def _load(self):
+        index_path = os.path.join(self.path, "index.json")
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get("ring") != self.ring or tuple(index.get("fields", ())) != FIELDS:
+                print(f"⚠️ Metrics in {self.path} have a different layout; starting empty")
+                return False
+            arrays = {
+                name: np.lib.format.open_memmap(os.path.join(self.path, f"{name}.npy"), mode="r+")
+                for name in ("times", "head", "count", "limits", *FIELDS)
+            }
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load metrics from {self.path}: {type(e).__name__}: {str(e)}")
+            return False
+        self.times = arrays["times"]
+        self.head = arrays["head"]
+        self.count = arrays["count"]
+        self.limits = arrays["limits"]
+        self.values = {f: arrays[f] for f in FIELDS}
+        self.ids = index["ids"]
+        self._rows = {sid: i for i, sid in enumerate(self.ids)}
+        self.kind = np.full(len(self.head), -1, dtype=np.int8)
+        for i, sid in enumerate(self.ids):
+            self.kind[i] = KINDS.get(sid.split("/")[0], -1)
+        self.last_ingest = index.get("last_ingest")
+        return True
+
+    def flush(self):
+        """Writes mapped arrays and the series index to disk (no-op in memory)."""
+        if not self.path:
+            return
+        with self._lock:
+            for array in (self.times, self.head, self.count, self.limits, *self.values.values()):
+                array.flush()
+            index = {"ring": self.ring, "fields": FIELDS, "ids": self.ids, "last_ingest": self.last_ingest}
+            tmp = os.path.join(self.path, "index.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, os.path.join(self.path, "index.json"))
+
+    def __contains__(self, series_id):
+        return series_id in self._rows
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -- ingest ------------------------------------------------------------
+
+    def _row(self, series_id):
+        row = self._rows.get(series_id)
+        if row is None:
+            row = len(self.ids)
+            self._grow(row + 1)
+            self.ids.append(series_id)
+            self._rows[series_id] = row
+            self.kind[row] = KINDS.get(series_id.split("/")[0], -1)
+        return row
+
+    def ingest(self, series_id, samples):
+        """
+        Appends rrddata rows (dicts with 'time' and FIELDS) for one series,
+        skipping samples not newer than what is stored and rows without
+        data. Returns the number of samples added.
+        """
+        if series_id.startswith("node/"):
+            samples = [
+                {**s, **{field: s.get(alias) for field, alias in NODE_FIELD_ALIASES.items() if alias in s}}
+                for s in samples
+            ]
+        if not samples:
+            return 0
+        times = np.array([s.get("time") or 0 for s in samples], dtype=np.int64)
+        # None becomes NaN in a float array
+        columns = np.array([[s.get(f) for s in samples] for f in FIELDS], dtype=np.float64)
+        with self._lock:
+            row = self._row(series_id)
+            count = int(self.count[row])
+            newest = int(self.times[row, (self.head[row] - 1) % self.ring]) if count else 0
+            keep = np.flatnonzero((times > newest) & ~np.isnan(columns).all(axis=0))
+            keep = keep[np.argsort(times[keep], kind="stable")][-self.ring:]
+            if len(keep):
+                positions = (int(self.head[row]) + np.arange(len(keep))) % self.ring
+                self.times[row, positions] = times[keep]
+                for i, field in enumerate(FIELDS):
+                    self.values[field][row, positions] = columns[i, keep]
+                self.head[row] = (int(self.head[row]) + len(keep)) % self.ring
+                self.count[row] = min(self.ring, count + len(keep))
+                latest = samples[keep[-1]]
+                self.limits[row] = (latest.get("maxcpu") or self.limits[row, 0], latest.get("maxmem") or self.limits[row, 1])
+            self.last_ingest = time.time()
+            return len(keep)
+
+    # -- queries -----------------------------------------------------------
+
+    def _series(self, metric, rows):
+        """[rows, ring] float32 copy of a metric, NaN where there is no sample."""
+        if metric in ("cpu", "cpu_cores"):
+            scale = self.limits[rows, :1].astype(np.float32) if metric == "cpu_cores" else np.float32(100)
+            return self.values["cpu"][rows] * scale
+        if metric == "mem_pct":
+            maxmem = self.limits[rows, 1:2]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(maxmem > 0, self.values["mem"][rows] / maxmem * 100, np.nan).astype(np.float32)
+        if metric in self.values:
+            return np.asarray(self.values[metric][rows])
+        raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}")
+
+    def window(self, metric, seconds, kinds=None, ids=None, now=None):
+        """
+        (series ids, [rows, ring] values, [rows, ring] times) of the last
+        `seconds`, with NaN outside the window. Filter by kinds (KINDS
+        values) or explicit series ids.
+        """
+        now = now or time.time()
+        with self._lock:
+            n = len(self.ids)
+            if ids is not None:
+                rows = np.array([self._rows[i] for i in ids if i in self._rows], dtype=np.int64)
+            elif kinds is not None:
+                rows = np.flatnonzero(np.isin(self.kind[:n], kinds))
+            else:
+                rows = np.arange(n)
+            values = self._series(metric, rows)
+            times = np.asarray(self.times[rows])
+            selected = [self.ids[r] for r in rows]
+        values[(times == 0) | (times < now - seconds)] = np.nan
+        return selected, values, times
+
+    def summarize(self, metric, seconds, stat="mean", kinds=None, ids=None, now=None, trend=True):
+        """
+        Per series: the stat over the window, samples in it and the trend
+        per hour (None with trend=False).
+        """
+        selected, values, times = self.window(metric, seconds, kinds, ids, now)
+        result, samples = _reduce(values, stat)
+        return selected, result, samples, _trend_per_hour(values, times) if trend else None
+
+    def top(self, metric, seconds, stat="mean", k=10, kinds=GUEST_KINDS, now=None):
+        """The k series with the largest stat over the window, largest first."""
+        selected, values, times = self.window(metric, seconds, kinds, now=now)
+        result, samples = _reduce(values, stat)
+        valid = np.flatnonzero(~np.isnan(result))
+        if not len(valid) or k <= 0:
+            return []
+        k = min(k, len(valid))
+        picked = valid[np.argpartition(result[valid], -k)[-k:]]
+        picked = picked[np.argsort(result[picked])[::-1]]
+        # Trends only for the rows returned
+        trend = _trend_per_hour(values[picked], times[picked])
+        return [
+            {"id": selected[i], "value": float(result[i]), "samples": int(samples[i]), "trend_per_hour": float(slope)}
+            for i, slope in zip(picked, trend)
+        ]
+
+    def percentiles(self, metric, seconds, series_id=None, kinds=GUEST_KINDS, qs=(50, 90, 95, 99), now=None):
+        """
+        Percentiles of one series' samples over the window, or, without a
+        series, of every series' window mean (the spread across guests).
+        """
+        if series_id is not None:
+            _, values, _ = self.window(metric, seconds, ids=[series_id], now=now)
+            data = values[~np.isnan(values)]
+        else:
+            _, means, _, _ = self.summarize(metric, seconds, "mean", kinds, now=now, trend=False)
+            data = means[~np.isnan(means)]
+        if not len(data):
+            return None
+        points = np.percentile(data, qs)
+        return {"count": int(len(data)), "max": float(data.max()), **{f"p{q}": float(v) for q, v in zip(qs, points)}}
+
+    def stats(self):
+        with self._lock:
+            n = len(self.ids)
+            return {
+                "series": n,
+                "samples": int(self.count[:n].sum()),
+                "ring": self.ring,
+                "kib": (self.times[:n].nbytes + sum(v[:n].nbytes for v in self.values.values())) // 1024,
+                "persistent": bool(self.path),
+                "last_ingest_age": round(time.time() - self.last_ingest, 1) if self.last_ingest else None,
+            }
+
+
+def _reduce(values, stat):
+    """(stat of each row ignoring NaN, samples in each row)."""
+    if stat not in STATS:
+        raise ValueError(f"Unknown stat {stat!r}; use one of {', '.join(STATS)}")
+    samples = np.count_nonzero(~np.isnan(values), axis=1)
+    # Rows without samples in the window come out as NaN; nan* reductions warn about them
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if stat == "mean":
+            result = np.nanmean(values, axis=1, dtype=np.float64)
+        elif stat == "max":
+            result = np.nanmax(values, axis=1).astype(np.float64)
+        else:
+            result = _row_percentile(values, samples, float(stat[1:]))
+    return result, samples
+
+
+def _trend_per_hour(values, times):
+    """Least-squares slope of each row over its valid samples, per hour."""
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=1)
+    t = np.where(valid, times, 0).astype(np.float64)
+    v = np.where(valid, values, 0).astype(np.float64)
+    t_mean = t.sum(axis=1) / np.maximum(n, 1)
+    v_mean = v.sum(axis=1) / np.maximum(n, 1)
+    dt = np.where(valid, t - t_mean[:, None], 0)
+    dv = np.where(valid, v - v_mean[:, None], 0)
+    denominator = (dt * dt).sum(axis=1)
+    slope = np.where((n >= 2) & (denominator > 0), (dt * dv).sum(axis=1) / np.where(denominator > 0, denominator, 1), 0.0)
+    return slope * 3600
+
+
+def _row_percentile(values, samples, q):
+    """q-th percentile of each row ignoring NaN (linear interpolation, like np.percentile)."""
+    # np.sort puts NaN last, so each row's samples are its first `samples` entries
+    ordered = np.sort(values, axis=1)
+    position = (np.maximum(samples, 1) - 1) * q / 100
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, np.maximum(samples - 1, 0))
+    rows = np.arange(len(values))
+    fraction = position - low
+    result = ordered[rows, low].astype(np.float64) * (1 - fraction) + ordered[rows, high] * fraction
+    return np.where(samples > 0, result, np.nan)
@@ -0,0 +1,241 @@
+# tools/placement.py
+import os
+
+import numpy as np
+
+from tools.columnar import ColumnarInventory
+from tools.inventory import GUEST_TYPES
+
+# vCPUs that may be allocated per physical core
+PLACEMENT_CPU_OVERCOMMIT = float(os.getenv("PLACEMENT_CPU_OVERCOMMIT", "4.0"))
+# Guest memory that may be allocated per byte of node memory
+PLACEMENT_MEM_OVERCOMMIT = float(os.getenv("PLACEMENT_MEM_OVERCOMMIT", "1.0"))
+# Nodes busier than this CPU load fraction take no new guests
+PLACEMENT_MAX_CPU_LOAD = float(os.getenv("PLACEMENT_MAX_CPU_LOAD", "0.85"))
+# Share of every storage kept free
+PLACEMENT_STORAGE_RESERVE = float(os.getenv("PLACEMENT_STORAGE_RESERVE", "0.10"))
+# How much current CPU load lowers a node's score against free capacity
+LOAD_WEIGHT = 0.5
+# Storage content type a new disk needs
+DISK_CONTENT = {"qemu": "images", "lxc": "rootdir"}
+MIB = 1024 ** 2
+GIB = 1024 ** 3
+STRATEGIES = ("spread", "pack")
+
+
+class PlacementError(ValueError):
+    """Raised for a request the engine cannot evaluate (bad shape, unknown strategy)."""
+
+
+class PlacementModel:
+    """
+    Free CPU, memory and storage per node, precomputed once per snapshot
+    from the columnar inventory and the storage configuration.
+
+    Capacity is allocation-based: running guests count with their full
+    vCPUs and memory against the node's cores x PLACEMENT_CPU_OVERCOMMIT
+    and memory x PLACEMENT_MEM_OVERCOMMIT. Memory must also be physically
+    free right now. Shared storages are one pool seen by every node.
+    """
+
+    def __init__(self, inv: ColumnarInventory, storage_pools):
+        cols = inv.columns
+        node_codes = inv.codes["node"]
+        n_codes = len(inv.categories["node"])
+        is_node = inv.mask("type", "node")
+        online = is_node & inv.mask("status", "online")
+        running = inv.mask("type", *GUEST_TYPES) & inv.mask("status", "running")
+
+        def per_node(mask, values):
+            return np.bincount(node_codes[mask], weights=values[mask], minlength=n_codes)
+
+        # Index every array by position in self.nodes, not by category code
+        codes = np.flatnonzero(np.bincount(node_codes[online], minlength=n_codes) > 0)
+        self.version = inv.version
+        self.nodes = [inv.categories["node"].values[c] for c in codes]
+        cpus = per_node(is_node, cols["maxcpu"])[codes]
+        mem = per_node(is_node, cols["maxmem"])[codes]
+        self.cpu_free = cpus * PLACEMENT_CPU_OVERCOMMIT - per_node(running, cols["maxcpu"])[codes]
+        self.mem_free = mem * PLACEMENT_MEM_OVERCOMMIT - per_node(running, cols["maxmem"])[codes]
+        self.mem_physical_free = mem - per_node(is_node, cols["mem"])[codes]
+        self.cpu_capacity = np.maximum(cpus * PLACEMENT_CPU_OVERCOMMIT, 1)
+        self.mem_capacity = np.maximum(mem * PLACEMENT_MEM_OVERCOMMIT, 1)
+        self.cpu_load = np.divide(per_node(is_node, cols["cpu"] * cols["maxcpu"])[codes], np.maximum(cpus, 1))
+        self._build_storage(inv, storage_pools)
+
+    def _build_storage(self, inv, storage_pools):
+        position = {name: i for i, name in enumerate(self.nodes)}
+        pools = [p for p in storage_pools if p.get("enabled", 1) and not p.get("disable")]
+        self.storages = [p["storage"] for p in pools]
+        self.shared = np.array([bool(int(p.get("shared") or 0)) for p in pools], dtype=bool)
+        self.content = [set(str(p.get("content") or "").split(",")) for p in pools]
+        # free[node, storage] in bytes: -1 where unavailable, inf where usage is unknown
+        self.storage_free = np.full((len(self.nodes), len(pools)), -1.0)
+        for j, pool in enumerate(pools):
+            allowed = [n.strip() for n in str(pool.get("nodes") or "").split(",") if n.strip()]
+            for node in allowed or self.nodes:
+                if node in position:
+                    self.storage_free[position[node], j] = np.inf
+
+        column = {name: j for j, name in enumerate(self.storages)}
+        is_storage = inv.mask("type", "storage")
+        node_values = inv.categories["node"].values
+        for row in np.flatnonzero(is_storage):
+            i = position.get(node_values[inv.codes["node"][row]])
+            j = column.get(inv.storage[row])
+            if i is None or j is None or self.storage_free[i, j] < 0:
+                continue
+            total = inv.columns["maxdisk"][row]
+            self.storage_free[i, j] = total * (1 - PLACEMENT_STORAGE_RESERVE) - inv.columns["disk"][row]
+
+    def place(self, cores, memory_mb, disk_gb=0, count=1, vm_type="qemu", strategy="spread",
+              anti_affinity=True, avoid_nodes=(), separate_from=(), inv=None):
+        """
+        Places `count` guests of one shape. Each guest goes to the feasible
+        node with the best score: most headroom left ('spread') or least
+        ('pack', best-fit bin-packing), minus a penalty for current CPU load.
+
+        With anti_affinity the batch uses distinct nodes while any are
+        feasible. separate_from is a list of name prefixes: nodes already
+        hosting a guest whose name starts with one of them are avoided.
+
+        Returns {"placements": [{index, node, storage}], "unplaced": n,
+        "reason": str or None, "nodes": {node: {...headroom after}}}.
+        """
+        if strategy not in STRATEGIES:
+            raise PlacementError(f"Unknown strategy {strategy!r}; use one of {', '.join(STRATEGIES)}")
+        if cores <= 0 or memory_mb <= 0 or count <= 0 or disk_gb < 0:
+            raise PlacementError("cores, memory_mb and count must be positive")
+        if vm_type not in DISK_CONTENT:
+            raise PlacementError(f"vm_type must be one of {', '.join(DISK_CONTENT)}")
+
+        cpu_free = self.cpu_free.copy()
+        mem_free = self.mem_free.copy()
+        mem_physical_free = self.mem_physical_free.copy()
+        storage_free = self.storage_free.copy()
+        memory = memory_mb * MIB
+        disk = disk_gb * GIB
+        usable = np.array([DISK_CONTENT[vm_type] in c for c in self.content], dtype=bool)
+        if disk and not usable.any():
+            return self._result([], count, f"no storage accepts {DISK_CONTENT[vm_type]} disks", cpu_free, mem_free)
+
+        allowed = self.cpu_load <= PLACEMENT_MAX_CPU_LOAD
+        for node in avoid_nodes or ():
+            if node in self.nodes:
+                allowed[self.nodes.index(node)] = False
+        if separate_from and inv is not None:
+            allowed &= ~self._hosting(inv, separate_from)
+        used = np.zeros(len(self.nodes), dtype=bool)
+
+        placements = []
+        reason = None
+        for index in range(count):
+            if disk:
+                candidates = np.where(usable, storage_free, -1.0)
+                best_storage = candidates.argmax(axis=1)
+                best_free = candidates[np.arange(len(self.nodes)), best_storage]
+            else:
+                best_free = np.full(len(self.nodes), np.inf)
+            feasible = (
+                allowed
+                & (cpu_free >= cores)
+                & (mem_free >= memory)
+                & (mem_physical_free >= memory)
+                & (best_free >= disk)
+            )
+            if anti_affinity and (feasible & ~used).any():
+                feasible &= ~used
+            if not feasible.any():
+                reason = self._why_not(allowed, cpu_free, mem_free, mem_physical_free, best_free, cores, memory, disk)
+                break
+
+            headroom = np.minimum(
+                (cpu_free - cores) / self.cpu_capacity,
+                (mem_free - memory) / self.mem_capacity,
+            )
+            score = headroom if strategy == "spread" else -headroom
+            score = np.where(feasible, score - LOAD_WEIGHT * self.cpu_load, -np.inf)
+            node = int(score.argmax())
+
+            cpu_free[node] -= cores
+            mem_free[node] -= memory
+            mem_physical_free[node] -= memory
+            storage = None
+            if disk:
+                j = int(best_storage[node])
+                storage = self.storages[j]
+                if np.isfinite(storage_free[node, j]):
+                    if self.shared[j]:
+                        storage_free[:, j] -= disk
+                    else:
+                        storage_free[node, j] -= disk
+            used[node] = True
+            placements.append({"index": index, "node": self.nodes[node], "storage": storage})
+
+        return self._result(placements, count - len(placements), reason, cpu_free, mem_free)
+
+    def _hosting(self, inv, prefixes):
+        """Mask of nodes that already run a guest named with one of the prefixes."""
+        prefixes = tuple(prefixes)
+        hosting = np.zeros(len(self.nodes), dtype=bool)
+        position = {name: i for i, name in enumerate(self.nodes)}
+        node_values = inv.categories["node"].values
+        for row in np.flatnonzero(inv.mask("type", *GUEST_TYPES)):
+            name = inv.name[row]
+            if name and name.startswith(prefixes):
+                i = position.get(node_values[inv.codes["node"][row]])
+                if i is not None:
+                    hosting[i] = True
+        return hosting
+
+    def _why_not(self, allowed, cpu_free, mem_free, mem_physical_free, best_free, cores, memory, disk):
+        if not allowed.any():
+            return "every node is excluded (CPU load above limit, avoided, or anti-affinity)"
+        checks = (
+            ("vCPU allocation", cpu_free >= cores),
+            ("memory allocation", mem_free >= memory),
+            ("physical free memory", mem_physical_free >= memory),
+            ("storage space", best_free >= disk),
+        )
+        for label, ok in checks:
+            if not (allowed & ok).any():
+                return f"no eligible node has enough {label}"
+        return "no single node satisfies all constraints at once"
+
+    def _result(self, placements, unplaced, reason, cpu_free, mem_free):
+        touched = {p["node"] for p in placements}
+        return {
+            "placements": placements,
+            "unplaced": unplaced,
+            "reason": reason,
+            "nodes": {
+                name: {
+                    "vcpus_free": int(cpu_free[i]),
+                    "mem_free_gib": round(float(mem_free[i]) / GIB, 1),
+                    "cpu_load_pct": round(float(self.cpu_load[i]) * 100, 1),
+                }
+                for i, name in enumerate(self.nodes) if name in touched
+            },
+        }
+
+
+_model = None
+_model_key = None
+
+
+def _storage_key(storage_pools):
+    """Everything _build_storage reads from the storage configuration, hashable."""
+    return tuple(
+        (p.get("storage"), p.get("enabled", 1), p.get("disable"), p.get("shared"), p.get("content"), p.get("nodes"))
+        for p in storage_pools
+    )
+
+
+def get_placement_model(inv: ColumnarInventory, storage_pools):
+    """Returns the model for this snapshot and storage configuration, building it on first use."""
+    global _model, _model_key
+    key = (inv.version, _storage_key(storage_pools))
+    if _model is None or inv.version is None or _model_key != key:
+        _model = PlacementModel(inv, storage_pools)
+        _model_key = key
+    return _model
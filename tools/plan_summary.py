@@ -0,0 +1,174 @@
+# tools/plan_summary.py
+import os
+import re
+from collections import Counter, OrderedDict
+
+# Beyond this many resource lines, instances of the same resource are grouped
+TF_PLAN_SUMMARY_MAX_RESOURCES = int(os.getenv("TF_PLAN_SUMMARY_MAX_RESOURCES", "40"))
+# Attributes worth showing for a resource that is being created
+KEY_ATTRIBUTES = (
+    "name", "vmid", "target_node", "clone", "os_type", "cores", "sockets",
+    "memory", "hostname", "ostemplate", "storage", "size", "pool",
+)
+MAX_VALUE_LENGTH = 40
+# Grouped lines list individual values only up to this many distinct ones
+MAX_DISTINCT_VALUES = 8
+
+ACTION_LABELS = {
+    ("create",): "create",
+    ("update",): "update",
+    ("delete",): "delete",
+    ("delete", "create"): "replace",
+    ("create", "delete"): "replace",
+    ("read",): "read",
+    ("no-op",): "no-op",
+}
+
+
+def _action(change):
+    return ACTION_LABELS.get(tuple(change.get("actions", [])), "/".join(change.get("actions", [])))
+
+
+def _short(value):
+    if isinstance(value, (dict, list)):
+        return f"<{type(value).__name__}>"
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH - 3] + "..."
+
+
+def _is_sensitive(sensitive, key):
+    return isinstance(sensitive, dict) and sensitive.get(key) is True
+
+
+def _changed_attributes(change):
+    """Returns [(attribute, before, after)] for top-level attributes that change."""
+    before = change.get("before") or {}
+    after = change.get("after") or {}
+    unknown = change.get("after_unknown") or {}
+    sensitive = change.get("after_sensitive") or {}
+    changed = []
+    for key in sorted(set(before) | set(after) | set(unknown)):
+        if unknown.get(key) is True:
+            changed.append((key, _short(before.get(key)), "(known after apply)"))
+        elif before.get(key) != after.get(key):
+            if _is_sensitive(sensitive, key):
+                changed.append((key, "(sensitive)", "(sensitive)"))
+            else:
+                changed.append((key, _short(before.get(key)), _short(after.get(key))))
+    return changed
+
+
+def summarize_plan(plan: dict):
+    """
+    Turns the output of 'terraform show -json <planfile>' into a compact
+    structured diff: action counts plus, per resource, the action and
+    the attributes that change.
+    """
+    counts = Counter()
+    resources = []
+    for rc in plan.get("resource_changes", []):
+        change = rc.get("change", {})
+        action = _action(change)
+        if action in ("no-op", "read"):
+            continue
+        counts[action] += 1
+        entry = {"address": rc.get("address"), "action": action}
+        if action == "create":
+            after = change.get("after") or {}
+            sensitive = change.get("after_sensitive") or {}
+            entry["attributes"] = {
+                k: "(sensitive)" if _is_sensitive(sensitive, k) else _short(after[k])
+                for k in KEY_ATTRIBUTES if after.get(k) not in (None, "")
+            }
+        elif action in ("update", "replace"):
+            entry["changes"] = _changed_attributes(change)
+            if change.get("replace_paths"):
+                entry["forces_replacement"] = sorted({str(p[0]) for p in change["replace_paths"] if p})
+        resources.append(entry)
+
+    outputs = [
+        name for name, oc in (plan.get("output_changes") or {}).items()
+        if _action(oc) not in ("no-op", "read")
+    ]
+    return {
+        "counts": {
+            "add": counts["create"] + counts["replace"],
+            "change": counts["update"],
+            "destroy": counts["delete"] + counts["replace"],
+            "replace": counts["replace"],
+        },
+        "resources": resources,
+        "outputs": outputs,
+    }
+
+
+def _resource_line(entry):
+    line = f"{entry['action']:<8} {entry['address']}"
+    if entry.get("attributes"):
+        line += " (" + ", ".join(f"{k}={v}" for k, v in entry["attributes"].items()) + ")"
+    if entry.get("changes"):
+        line += ": " + ", ".join(f"{k}: {b} -> {a}" for k, b, a in entry["changes"])
+    if entry.get("forces_replacement"):
+        line += f" [forces replacement: {', '.join(entry['forces_replacement'])}]"
+    return line
+
+
+def _describe_values(values):
+    """'4' when all equal, 'pve1 x3, pve2 x2' for a few values, else a distinct count."""
+    counts = Counter(values)
+    if len(counts) == 1:
+        return str(values[0])
+    if len(counts) <= MAX_DISTINCT_VALUES:
+        return ", ".join(f"{v} x{n}" for v, n in counts.most_common())
+    return f"{len(counts)} distinct"
+
+
+def _group_line(action, address, entries):
+    line = f"{action:<8} {address} x{len(entries)}"
+    if action == "create":
+        keys = [k for k in KEY_ATTRIBUTES if any(k in e.get("attributes", {}) for e in entries)]
+        parts = [f"{k}={_describe_values([e.get('attributes', {}).get(k) for e in entries])}" for k in keys]
+    else:
+        changes = {}
+        for entry in entries:
+            for key, before, after in entry.get("changes", []):
+                changes.setdefault(key, []).append(f"{before} -> {after}")
+        parts = [f"{k}: {_describe_values(v)}" for k, v in sorted(changes.items())]
+    if parts:
+        line += " (" + "; ".join(parts) + ")"
+    return line
+
+
+def _group_key(address):
+    # proxmox_vm_qemu.web[3] and proxmox_vm_qemu.web["a"] group as proxmox_vm_qemu.web[*]
+    return re.sub(r"\[[^\]]*\]$", "[*]", address or "")
+
+
+def format_plan_summary(summary: dict, max_resources: int = None):
+    """Renders summarize_plan() output as a few lines of text for the LLM."""
+    max_resources = max_resources or TF_PLAN_SUMMARY_MAX_RESOURCES
+    counts = summary["counts"]
+    lines = [
+        f"Plan: {counts['add']} to add, {counts['change']} to change, {counts['destroy']} to destroy"
+        + (f" ({counts['replace']} replaced)" if counts["replace"] else "")
+    ]
+    resources = summary["resources"]
+    if not resources:
+        lines.append("No changes. Infrastructure matches the configuration.")
+    elif len(resources) <= max_resources:
+        lines.extend(_resource_line(entry) for entry in resources)
+    else:
+        # Collapse count/for_each instances that share an action
+        groups = OrderedDict()
+        for entry in resources:
+            groups.setdefault((entry["action"], _group_key(entry["address"])), []).append(entry)
+        for (action, address), entries in list(groups.items())[:max_resources]:
+            if len(entries) == 1:
+                lines.append(_resource_line(entries[0]))
+            else:
+                lines.append(_group_line(action, address, entries))
+        if len(groups) > max_resources:
+            lines.append(f"... and {len(groups) - max_resources} more resource groups")
+    if summary["outputs"]:
+        lines.append(f"Outputs changing: {', '.join(summary['outputs'])}")
+    return "\n".join(lines)
@@ -0,0 +1,133 @@
+# tools/proxmox_async.py
+import asyncio
+import re
+import threading
+import time
+
+import httpx
+
+from tools.telemetry import span
+
+# Proxmox tickets are valid for 2 hours; renew a little before that
+TICKET_LIFETIME = 110 * 60
+# Collapses per-guest paths so metrics have one series per endpoint
+_PATH_IDS = re.compile(r"^/nodes/[^/]+|/\d+(?=/|$)")
+
+
+def _endpoint(path):
+    """'/nodes/pve1/qemu/100/config' -> '/nodes/{node}/qemu/{vmid}/config'."""
+    return _PATH_IDS.sub(lambda m: "/nodes/{node}" if m.group().startswith("/nodes") else "/{vmid}", path)
+
+
+class LoopThread:
+    """
+    An asyncio event loop running in a daemon thread.
+    The pooled HTTP client lives on this loop, so synchronous code can
+    run() coroutines on it and async code on other loops can call() them.
+    """
+
+    def __init__(self, name="proxmox-io"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """Runs a coroutine on the loop from synchronous code and returns its result."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("LoopThread.run() called from its own loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def call(self, coro):
+        """Awaits a coroutine on the loop from any event loop."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+class AsyncProxmoxClient:
+    """
+    Minimal asyncio client for the Proxmox VE API.
+    All requests share one keep-alive connection pool capped at
+    `max_connections`, and the auth ticket (or API token) is reused
+    across requests instead of logging in per call.
+    """
+
+    def __init__(self, host, port=8006, user=None, password=None, token_name=None,
+                 token_value=None, verify_ssl=False, timeout=60, max_connections=20, scheme="https"):
+        self.base_url = f"{scheme}://{host}:{port}/api2/json"
+        self.user = user
+        self._password = password
+        self._token_name = token_name
+        self._token_value = token_value
+        self._verify_ssl = verify_ssl
+        self._timeout = timeout
+        self._max_connections = max_connections
+        self._http = None
+        self._ticket_at = 0.0
+        self._login_lock = None
+
+    def _session(self):
+        # Created lazily so it binds to the loop that first uses it
+        if self._http is None:
+            limits = httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+                keepalive_expiry=30,
+            )
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                verify=self._verify_ssl,
+                timeout=self._timeout,
+                limits=limits,
+            )
+            self._login_lock = asyncio.Lock()
+        return self._http
+
+    async def login(self):
+        """Authenticates with an API token header or a ticket cookie."""
+        http = self._session()
+        async with self._login_lock:
+            if self._token_name and self._token_value:
+                http.headers["Authorization"] = (
+                    f"PVEAPIToken={self.user}!{self._token_name}={self._token_value}"
+                )
+                self._ticket_at = float("inf")
+                return
+
+            response = await http.post(
+                "/access/ticket", data={"username": self.user, "password": self._password}
+            )
+            response.raise_for_status()
+            data = response.json()["data"]
+            http.cookies.set("PVEAuthCookie", data["ticket"])
+            http.headers["CSRFPreventionToken"] = data["CSRFPreventionToken"]
+            self._ticket_at = time.monotonic()
+
+    async def _ensure_auth(self):
+        if time.monotonic() - self._ticket_at > TICKET_LIFETIME:
+            await self.login()
+
+    async def get(self, path, **params):
+        """GETs an API path and returns its 'data' payload."""
+        await self._ensure_auth()
+        http = self._session()
+        with span(f"proxmox.http:{_endpoint(path)}") as current:
+            response = await http.get(path, params=params or None)
+            if response.status_code == 401:
+                # Ticket expired or was revoked; log in again once
+                self._ticket_at = 0.0
+                await self._ensure_auth()
+                response = await http.get(path, params=params or None)
+            current.set(status=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+            return response.json()["data"]
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,111 @@
+# tools/proxmox_connection.py
+import threading
+import time
+
+
+class ProxmoxConnection:
+    """
+    Owns the API client for one Proxmox endpoint.
+    Connecting happens in a background thread so nothing blocks on a slow
+    or unreachable host; failed attempts are retried with exponential
+    backoff until one succeeds. Callers ask for the client per call and
+    get None (i.e. use mock data) while it is not connected.
+    """
+
+    def __init__(self, name, connect, initial_backoff=2.0, max_backoff=60.0, on_state_change=None):
+        self.name = name
+        # Callable that builds a client and verifies it (e.g. GET /version)
+        self._connect = connect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._client = None
+        self._thread = None
+        # Set whenever a connection attempt has finished, cleared while one runs
+        self._attempt_done = threading.Event()
+        self.attempts = 0
+        self.last_error = None
+        self.connected_at = None
+
+    def start(self):
+        """Starts connecting in the background unless already connected or trying."""
+        with self._lock:
+            if self._client is not None or (self._thread and self._thread.is_alive()):
+                return
+            self._attempt_done.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"proxmox-connect-{self.name}", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        delay = self.initial_backoff
+        while True:
+            self._attempt_done.clear()
+            self.attempts += 1
+            try:
+                client = self._connect()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {str(e)}"
+                print(f"❌ Failed to connect to Proxmox ({self.name}): {self.last_error}")
+                print(f"⚠️ Using mock data until reconnected - retrying in {delay:.0f}s")
+                self._attempt_done.set()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            with self._lock:
+                self._client = client
+                self.connected_at = time.time()
+                self.last_error = None
+            # Notify before releasing waiters so they never see stale state
+            self._notify(True)
+            self._attempt_done.set()
+            return
+
+    def _notify(self, connected):
+        if self._on_state_change:
+            try:
+                self._on_state_change(connected)
+            except Exception as e:
+                print(f"❌ Error in connection state callback: {type(e).__name__}: {str(e)}")
+
+    def get_client(self, wait: float = 0):
+        """
+        Returns the connected client, or None when Proxmox is unavailable.
+        If a connection attempt is in flight, waits up to `wait` seconds for it.
+        """
+        client = self._client
+        if client is not None:
+            return client
+        self.start()
+        if wait:
+            self._attempt_done.wait(wait)
+        return self._client
+
+    def mark_failed(self, client, error):
+        """Drops a client whose request failed at the connection level and reconnects."""
+        with self._lock:
+            if client is None or self._client is not client:
+                return
+            self._client = None
+            self.last_error = f"{type(error).__name__}: {str(error)}"
+        print(f"❌ Lost connection to Proxmox ({self.name}): {self.last_error}")
+        self._notify(False)
+        self.start()
+
+    @property
+    def is_connected(self):
+        return self._client is not None
+
+    def status(self):
+        """Returns a summary of the connection state."""
+        return {
+            "name": self.name,
+            "connected": self.is_connected,
+            "connecting": bool(self._thread and self._thread.is_alive()),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "connected_at": self.connected_at,
+        }
@@ -1,275 +1,855 @@
 # tools/proxmox_reader.py
+import asyncio
+import hashlib
 import os
-from proxmoxer import ProxmoxAPI
-import requests
-from urllib3.exceptions import InsecureRequestWarning
-
-# Suppress SSL warnings
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlparse
+import httpx
+from tools.clusters import (
+    PROXMOX_CLUSTER_NAME,
+    ClusterRegistry,
+    ClusterUnavailable,
+    RemoteCluster,
+    connect_client,
+    fanout_timeout,
+    load_cluster_configs
+)
+from tools.columnar import ColumnarInventory
+from tools.inventory import Inventory, SnapshotCache, _resource_id, register_invalidation_hook
+from tools.inventory_sync import InventorySync
+from tools.metrics_store import MetricStore
+from tools.proxmox_async import LoopThread
+from tools.proxmox_connection import ProxmoxConnection
+from tools.snapshot_store import PROXMOX_SNAPSHOT_PATH, SnapshotStore
+from tools.telemetry import debug, span
 
 # Get credentials from environment variables
 PROXMOX_HOST = os.getenv("PROXMOX_HOST")
 PROXMOX_PORT = os.getenv("PROXMOX_PORT", "8006")
+PROXMOX_SCHEME = os.getenv("PROXMOX_SCHEME", "https")
 PROXMOX_USER = os.getenv("PROXMOX_USER")
 PROXMOX_PASSWORD = os.getenv("PROXMOX_PASSWORD")
 PROXMOX_TOKEN_ID = os.getenv("PROXMOX_TOKEN_ID")
 PROXMOX_TOKEN_SECRET = os.getenv("PROXMOX_TOKEN_SECRET")
+# How long (seconds) a /cluster/resources snapshot is shared between tool calls
+PROXMOX_CACHE_TTL = float(os.getenv("PROXMOX_CACHE_TTL", "30"))
+# Upper bound on concurrent config requests in get_vm_configs()
+PROXMOX_MAX_WORKERS = int(os.getenv("PROXMOX_MAX_WORKERS", "8"))
+# Keep-alive connections shared by all API requests
+PROXMOX_POOL_SIZE = int(os.getenv("PROXMOX_POOL_SIZE", "20"))
+# rrddata timeframe fetched per metrics collection ('hour' = 1-minute samples)
+METRICS_TIMEFRAME = os.getenv("METRICS_TIMEFRAME", "hour")
+# Seconds between background metrics collections; 0 leaves collection off
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "0"))
 
 if not PROXMOX_HOST:
     raise ValueError("PROXMOX_HOST environment variable not set")
 
-client = None
-MOCK_MODE = False
+# Accept PROXMOX_HOST as a bare host or as a URL like https://pve.local:8006
+if "://" in PROXMOX_HOST:
+    _url = urlparse(PROXMOX_HOST)
+    PROXMOX_SCHEME = _url.scheme
+    PROXMOX_HOST = _url.hostname
+    if _url.port:
+        PROXMOX_PORT = str(_url.port)
+
+# Per-request timeout and how long a reader waits for an in-flight connect
+PROXMOX_TIMEOUT = int(os.getenv("PROXMOX_TIMEOUT", "60"))
+PROXMOX_CONNECT_WAIT = float(os.getenv("PROXMOX_CONNECT_WAIT", "5"))
+PROXMOX_RECONNECT_MAX = float(os.getenv("PROXMOX_RECONNECT_MAX", "60"))
+
+debug("PROXMOX_HOST = %s:%s", PROXMOX_HOST, PROXMOX_PORT)
+debug("PROXMOX_USER = %s", PROXMOX_USER)
+debug("PROXMOX_TOKEN_ID = %s", PROXMOX_TOKEN_ID)
+
+# Event loop that owns the pooled HTTP session; sync readers delegate to it
+_loop = LoopThread()
+
+def _connect():
+    """Builds an authenticated client and verifies it with /version."""
+    debug("Attempting to connect to Proxmox...")
+    client, version = connect_client(
+        _loop,
+        PROXMOX_HOST,
+        PROXMOX_PORT,
+        PROXMOX_SCHEME,
+        user=PROXMOX_USER,
+        password=PROXMOX_PASSWORD,
+        token_name='automation-agent' if PROXMOX_TOKEN_ID else None,
+        token_value=PROXMOX_TOKEN_SECRET,
+        timeout=PROXMOX_TIMEOUT,
+        max_connections=PROXMOX_POOL_SIZE
+    )
+    print(f"✅ Connected to Proxmox Version: {version.get('version')}")
+    return client
+
+def _on_connection_change(connected):
+    # A stale startup snapshot stays up until its background refresh replaces it
+    if connected and _resources_cache.stale:
+        return
+    # Never serve a mock snapshot as live data (or the other way round)
+    _resources_cache.invalidate()
+
+_connection = ProxmoxConnection(
+    PROXMOX_HOST,
+    _connect,
+    max_backoff=PROXMOX_RECONNECT_MAX,
+    on_state_change=_on_connection_change
+)
+
+def _get_client():
+    """Returns the live client for this call, or None to use mock data."""
+    return _connection.get_client(wait=PROXMOX_CONNECT_WAIT)
+
+def is_mock_mode():
+    """True while Proxmox is unreachable and readers serve mock data."""
+    return not _connection.is_connected
+
+def get_connection_status():
+    """Returns the state of the Proxmox connection."""
+    return _connection.status()
+
+async def _api_get(client, path, **params):
+    """GETs an API path, dropping the client if the host went away."""
+    try:
+        return await client.get(path, **params)
+    except httpx.TransportError as e:
+        _connection.mark_failed(client, e)
+        raise
+
+def _live_get(client, path, **params):
+    """Synchronous _api_get() for code running outside the event loop."""
+    return _loop.run(_api_get(client, path, **params))
+
+# Mock /cluster/resources used when Proxmox is unavailable
+MOCK_RESOURCES = [
+    {"id": "node/pve1", "type": "node", "node": "pve1", "status": "online", "uptime": 3600000,
+     "cpu": 0.35, "maxcpu": 16, "mem": 25769803776, "maxmem": 68719476736},
+    {"id": "node/pve2", "type": "node", "node": "pve2", "status": "online", "uptime": 2800000,
+     "cpu": 0.2, "maxcpu": 16, "mem": 17179869184, "maxmem": 68719476736},
+    {
+        "id": "qemu/100",
+        "vmid": 100,
+        "name": "ubuntu-web",
+        "type": "qemu",
+        "status": "running",
+        "node": "pve1",
+        "cpu": 2,
+        "maxcpu": 4,
+        "mem": 2147483648,
+        "maxmem": 4294967296
+    },
+    {
+        "id": "qemu/101",
+        "vmid": 101,
+        "name": "debian-db",
+        "type": "qemu",
+        "status": "running",
+        "node": "pve2",
+        "cpu": 4,
+        "maxcpu": 8,
+        "mem": 4294967296,
+        "maxmem": 8589934592
+    },
+    {
+        "id": "lxc/102",
+        "vmid": 102,
+        "name": "test-container",
+        "type": "lxc",
+        "status": "stopped",
+        "node": "pve1",
+        "cpu": 1,
+        "maxcpu": 2,
+        "mem": 0,
+        "maxmem": 1073741824
+    }
+]
+
+# Mock /storage used when Proxmox is unavailable and no snapshot was saved
+MOCK_STORAGE = [
+    {
+        "storage": "local",
+        "type": "dir",
+        "content": "images,rootdir",
+        "enabled": 1,
+        "nodes": "pve1,pve2"
+    },
+    {
+        "storage": "local-lvm",
+        "type": "lvmthin",
+        "content": "images,rootdir",
+        "enabled": 1,
+        "nodes": "pve1,pve2"
+    }
+]
+
+# Last live responses on disk, served at startup and while Proxmox is unreachable
+_snapshot = SnapshotStore(PROXMOX_SNAPSHOT_PATH) if PROXMOX_SNAPSHOT_PATH else None
+# Where the last inventory fetch got its data: 'live', 'snapshot' (stale, from disk) or 'mock'
+_source = {"source": None, "saved": None}
+
+def _record(path, data):
+    """Queues a live response for the snapshot file (no-op without one)."""
+    if _snapshot:
+        _snapshot.put_later(path, data)
+
+def _offline(path, mock):
+    """Data for an API path while Proxmox is unreachable: the snapshot's if saved, else mock."""
+    data, saved = _snapshot.get(path) if _snapshot else (None, None)
+    if data is None:
+        print("(Using mock data - Proxmox unavailable)")
+        return mock, None
+    print(f"(Using snapshot saved {time.strftime('%Y-%m-%d %H:%M', time.localtime(saved))} - Proxmox unavailable)")
+    return data, saved
+
+def _fetch_cluster_resources():
+    client = _get_client()
+    if not client:
+        resources, saved = _offline("/cluster/resources", MOCK_RESOURCES)
+        _source.update(source="snapshot" if saved else "mock", saved=saved)
+        return resources
+    debug("Fetching cluster resources snapshot from Proxmox...")
+    resources = _live_get(client, "/cluster/resources")
+    _source.update(source="live", saved=None)
+    _record("/cluster/resources", resources)
+    return resources
+
+# Shared by every reader below so one agent turn pulls the list only once
+_resources_cache = SnapshotCache(_fetch_cluster_resources, ttl=PROXMOX_CACHE_TTL)
+register_invalidation_hook(_resources_cache.invalidate)
+
+# Indexed view of the cached snapshot, refreshed incrementally
+_inventory = Inventory()
+
+# Array-backed copy of the snapshot for capacity aggregates, built lazily
+_columnar = None
+_columnar_lock = threading.Lock()
+
+def _load_snapshot():
+    """Serves the saved inventory, marked stale, until the first live fetch replaces it."""
+    if not _snapshot:
+        return
+    with span("snapshot:load") as current:
+        resources, saved = _snapshot.get("/cluster/resources")
+        current.set(resources=len(resources or ()))
+    if resources is not None and _resources_cache.seed(resources):
+        _source.update(source="snapshot", saved=saved)
+        debug("Loaded %s resources from snapshot %s", len(resources), PROXMOX_SNAPSHOT_PATH)
+
+_load_snapshot()
+
+# Warm up the connection and auth in the background; importing never blocks
+_connection.start()
+
+def get_data_source():
+    """
+    Where the inventory comes from: {'source': 'live', 'snapshot' (stale,
+    from disk) or 'mock', 'saved': unix time of a snapshot, 'refreshing':
+    True while a stale startup snapshot is being replaced}.
+    """
+    source = _source["source"] or ("mock" if is_mock_mode() else "live")
+    return {"source": source, "saved": _source["saved"], "refreshing": _resources_cache.stale}
+
+def get_snapshot_stats():
+    """Returns the snapshot file's stats, or None when PROXMOX_SNAPSHOT_PATH is unset."""
+    return _snapshot.stats() if _snapshot else None
+
+def _get_inventory():
+    """Returns the inventory, re-indexing it if the snapshot changed."""
+    # Settle live vs mock first so a connect mid-fetch doesn't discard the
+    # snapshot; a stale startup snapshot is served without waiting
+    if not _resources_cache.stale:
+        _get_client()
+    resources, version = _resources_cache.get_versioned()
+    if _inventory.version != version:
+        with span("inventory:reindex", resources=len(resources)) as current:
+            delta = _inventory.update(resources, version)
+            current.set(**delta)
+        debug("Inventory re-indexed: %s", delta)
+    return _inventory
+
+async def _async_get_inventory():
+    # The snapshot cache is thread-based; never block the event loop on it
+    return await asyncio.to_thread(_get_inventory)
 
-print(f"DEBUG: PROXMOX_HOST = {PROXMOX_HOST}:{PROXMOX_PORT}")
-print(f"DEBUG: PROXMOX_USER = {PROXMOX_USER}")
-print(f"DEBUG: PROXMOX_TOKEN_ID = {PROXMOX_TOKEN_ID}")
+def get_columnar_inventory():
+    """Returns the columnar view of the current snapshot, built once per snapshot."""
+    global _columnar
+    if not _resources_cache.stale:
+        _get_client()
+    resources, version = _resources_cache.get_versioned()
+    with _columnar_lock:
+        if _columnar is None or _columnar.version != version:
+            with span("inventory:columnar", resources=len(resources)):
+                _columnar = ColumnarInventory(resources, version)
+        return _columnar
 
-try:
-    print(f"Attempting to connect to Proxmox...")
+def _sync_get(path, **params):
+    """Live GET for the sync thread; None while Proxmox is unreachable (no mock data)."""
+    client = _connection.get_client()
+    if not client:
+        return None
+    return _live_get(client, path, **params)
+
+# Follows /cluster/tasks and /cluster/log to patch the snapshot in place (off until started)
+_sync = InventorySync(_sync_get, _resources_cache, _get_inventory)
+
+def start_sync(interval: float):
+    """Keeps the inventory current in the background, polling every `interval` seconds."""
+    _sync.start(interval)
+
+def stop_sync():
+    _sync.stop()
+
+def is_sync_running():
+    return _sync.running
+
+def get_recent_changes(since: int = 0, max_age: float = None, limit: int = None):
+    """Changes seen by the sync (dicts with seq, time, message), oldest first."""
+    return _sync.feed.since(since, max_age, limit)
+
+def subscribe_changes(callback):
+    """Calls callback(change) on the sync thread for every new change."""
+    _sync.feed.subscribe(callback)
+
+def get_sync_stats():
+    return _sync.stats()
+
+class _PrimaryCluster:
+    """
+    The PROXMOX_HOST cluster as a ClusterRegistry member. In a fan-out it
+    answers from the live inventory or a saved snapshot, never from mock
+    data, so an unreachable cluster is left out rather than made up.
+    """
     
-    if PROXMOX_TOKEN_ID and PROXMOX_TOKEN_SECRET:
-        print(f"Using token-based authentication...")
-        client = ProxmoxAPI(
-            PROXMOX_HOST,
-            port=int(PROXMOX_PORT),
-            user=PROXMOX_USER,
-            token_name='automation-agent',
-            token_value=PROXMOX_TOKEN_SECRET,
-            verify_ssl=False,
-            timeout=60
-        )
-    elif PROXMOX_USER and PROXMOX_PASSWORD:
-        print(f"Using password-based authentication...")
-        client = ProxmoxAPI(
-            PROXMOX_HOST,
-            port=int(PROXMOX_PORT),
-            user=PROXMOX_USER,
-            password=PROXMOX_PASSWORD,
-            verify_ssl=False,
-            timeout=60
-        )
-    else:
-        raise ValueError("No authentication credentials provided")
+    name = PROXMOX_CLUSTER_NAME
+    timeout = fanout_timeout(PROXMOX_CLUSTER_NAME)
+    cache = _resources_cache
     
-    # Test the connection by getting version
-    print(f"Testing connection with /api2/json/version...")
-    version = client.version.get()
-    print(f"✅ Connected to Proxmox Version: {version.get('version')}")
+    def _unavailable(self):
+        return ClusterUnavailable(f"not connected ({_connection.last_error or 'connecting'})")
     
-except Exception as e:
-    print(f"❌ Failed to connect to Proxmox: {type(e).__name__}: {str(e)}")
-    print(f"⚠️ Running in MOCK MODE - using test data instead")
-    MOCK_MODE = True
-    client = None
-
-def get_all_nodes():
-    """Returns a list of all nodes in the cluster."""
-    if MOCK_MODE or not client:
-        print("(Using mock data - Proxmox unavailable)")
-        return [
-            {"node": "pve1", "status": "online", "uptime": 3600000},
-            {"node": "pve2", "status": "online", "uptime": 2800000},
-        ]
+    def inventory(self):
+        inventory = _get_inventory()
+        if get_data_source()["source"] == "mock":
+            raise self._unavailable()
+        return inventory
     
+    def storage(self):
+        client = _connection.get_client() if _resources_cache.stale else _get_client()
+        if client:
+            return _live_storage(client)
+        storage, _ = _snapshot.get("/storage") if _snapshot else (None, None)
+        if storage is None:
+            raise self._unavailable()
+        return storage
+    
+    async def fetch_config(self, vm_resource):
+        return await _fetch_guest_config(vm_resource)
+    
+    def status(self):
+        return {**get_connection_status(), "cache": get_cache_stats(), "source": get_data_source()["source"]}
+
+# The PROXMOX_HOST cluster plus every cluster named in PROXMOX_CLUSTERS.
+# With more than one, the inventory readers below fan out to all of them
+# (or the one passed as `cluster`) and tag each row with its cluster.
+# Sync, snapshots, metrics, capacity and the async readers stay on PROXMOX_HOST.
+_clusters = ClusterRegistry()
+_clusters.register(_PrimaryCluster())
+for _config in load_cluster_configs():
+    _clusters.register(RemoteCluster(
+        _config,
+        _loop,
+        cache_ttl=PROXMOX_CACHE_TTL,
+        connect_wait=PROXMOX_CONNECT_WAIT,
+        request_timeout=PROXMOX_TIMEOUT,
+        pool_size=PROXMOX_POOL_SIZE,
+        max_backoff=PROXMOX_RECONNECT_MAX
+    )).start()
+
+def _federated(read, cluster=None):
+    """
+    Runs read(member) on the named cluster, or on every cluster at once,
+    and returns [(name, result)] of those that answered (the rest go to
+    an enclosing left_out_clusters()); returns None when PROXMOX_HOST is
+    the only cluster, for the callers' untagged single-cluster path.
+    Raises ValueError for an unknown cluster and ClusterUnavailable when
+    the named one did not answer.
+    """
+    if cluster:
+        _clusters.get(cluster)
+    if not _clusters.federated:
+        return None
+    return _clusters.fan_out(read, cluster)[0]
+
+def _tagged(results):
+    """Merges [(name, rows)] into one list, each row tagged with its cluster."""
+    return [{**row, "cluster": name} for name, rows in results for row in rows]
+
+def get_cluster_names():
+    """Names of the configured clusters, PROXMOX_HOST's (PROXMOX_CLUSTER_NAME) first."""
+    return _clusters.names()
+
+def is_federated():
+    """True when readers merge several clusters and tag rows with 'cluster'."""
+    return _clusters.federated
+
+def get_cluster_stats():
+    """Connection and cache state of every cluster."""
+    return _clusters.stats()
+
+def invalidate_inventory():
+    """Drops the cached cluster snapshots so the next read refetches them."""
+    for member in _clusters.members():
+        member.cache.invalidate()
+
+@contextmanager
+def pinned_inventory():
+    """
+    Every read inside the block sees the same inventory snapshot (batch
+    runs): it is loaded first (live when Proxmox is reachable, rather than
+    a stale one from disk) and does not expire until the block ends;
+    Terraform apply/destroy still invalidate it. With several clusters
+    every cluster's snapshot is pinned. Yields its fingerprint.
+    """
+    with ExitStack() as stack:
+        for member in _clusters.members():
+            stack.enter_context(member.cache.pinned())
+        if _resources_cache.stale and _get_client():
+            _resources_cache.refresh()
+        yield get_inventory_fingerprint()
+
+def get_inventory_fingerprint():
+    """
+    Returns a content hash of the current snapshot (see
+    Inventory.fingerprint); with several clusters, a hash over the
+    fingerprints of those that answered.
+    """
+    if not _clusters.federated:
+        return _get_inventory().fingerprint
+    fingerprints, _ = _clusters.fan_out(lambda member: member.inventory().fingerprint)
+    joined = "\n".join(f"{name}:{fingerprint}" for name, fingerprint in fingerprints)
+    return hashlib.blake2b(joined.encode(), digest_size=16).hexdigest()
+
+def get_cache_stats():
+    """Returns hit/miss counters for the cluster resources cache."""
+    return _resources_cache.stats()
+
+async def async_get_all_nodes():
+    """Async version of get_all_nodes()."""
+    return (await _async_get_inventory()).by_type("node")
+
+def get_all_nodes(cluster: str = None):
+    """Returns a list of all nodes in the cluster (see list_all_vms() for `cluster`)."""
+    results = _federated(lambda member: member.inventory().by_type("node"), cluster)
+    if results is not None:
+        return _tagged(results)
     try:
-        print(f"Fetching nodes from Proxmox...")
-        nodes = client.nodes.get()
-        print(f"✅ Successfully fetched {len(nodes)} nodes")
+        nodes = _get_inventory().by_type("node")
+        debug("Successfully fetched %s nodes", len(nodes))
         return nodes
     except Exception as e:
         print(f"❌ Error fetching nodes: {type(e).__name__}: {str(e)}")
         return []
 
-def get_cluster_resources():
-    """Returns all cluster resources (nodes, VMs, containers, etc.)."""
-    if MOCK_MODE or not client:
-        print("(Using mock data - Proxmox unavailable)")
+def _organize(inventory):
+    return {
+        "nodes": inventory.by_type("node"),
+        "vms": inventory.guests(),
+        "storage": inventory.by_type("storage"),
+    }
+
+async def async_get_cluster_resources():
+    """Async version of get_cluster_resources()."""
+    return _organize(await _async_get_inventory())
+
+def get_cluster_resources(cluster: str = None):
+    """Returns all cluster resources (nodes, VMs, containers, etc.; see list_all_vms() for `cluster`)."""
+    results = _federated(lambda member: _organize(member.inventory()), cluster)
+    if results is not None:
         return {
-            "nodes": [
-                {"type": "node", "node": "pve1", "status": "online"},
-                {"type": "node", "node": "pve2", "status": "online"},
-            ],
-            "vms": [
-                {"type": "qemu", "vmid": 100, "name": "ubuntu-web", "status": "running", "node": "pve1"},
-                {"type": "qemu", "vmid": 101, "name": "debian-db", "status": "running", "node": "pve2"},
-                {"type": "lxc", "vmid": 102, "name": "test-container", "status": "stopped", "node": "pve1"},
-            ]
+            key: _tagged((name, organized[key]) for name, organized in results)
+            for key in ("nodes", "vms", "storage")
         }
-    
     try:
-        print(f"Fetching cluster resources from Proxmox...")
-        resources = client.cluster.resources.get()
-        
-        # Organize by type
-        organized = {
-            "nodes": [r for r in resources if r.get("type") == "node"],
-            "vms": [r for r in resources if r.get("type") in ["qemu", "lxc"]],
-            "storage": [r for r in resources if r.get("type") == "storage"],
-        }
-        print(f"✅ Successfully fetched cluster resources")
+        organized = _organize(_get_inventory())
+        debug("Successfully fetched cluster resources")
         return organized
     except Exception as e:
         print(f"❌ Error fetching cluster resources: {type(e).__name__}: {str(e)}")
         return {"nodes": [], "vms": [], "storage": []}
 
-def list_all_vms():
-    """Returns a list of all VMs and Containers on the cluster with hierarchy info."""
-    if MOCK_MODE or not client:
-        print("(Using mock data - Proxmox unavailable)")
-        return [
-            {
-                "vmid": 100,
-                "name": "ubuntu-web",
-                "type": "qemu",
-                "status": "running",
-                "node": "pve1",
-                "cpu": 2,
-                "maxcpu": 4,
-                "mem": 2147483648,
-                "maxmem": 4294967296
-            },
-            {
-                "vmid": 101,
-                "name": "debian-db",
-                "type": "qemu",
-                "status": "running",
-                "node": "pve2",
-                "cpu": 4,
-                "maxcpu": 8,
-                "mem": 4294967296,
-                "maxmem": 8589934592
-            },
-            {
-                "vmid": 102,
-                "name": "test-container",
-                "type": "lxc",
-                "status": "stopped",
-                "node": "pve1",
-                "cpu": 1,
-                "maxcpu": 2,
-                "mem": 0,
-                "maxmem": 1073741824
-            }
-        ]
-    
+def list_all_vms(cluster: str = None):
+    """
+    Returns a list of all VMs and Containers on the cluster with hierarchy info.
+    With several clusters configured they come from every cluster, or only
+    from `cluster`, each tagged with its cluster name; clusters that do not
+    answer within their timeout are left out (see left_out_clusters()).
+    """
+    results = _federated(lambda member: member.inventory().guests(), cluster)
+    if results is not None:
+        return _tagged(results)
     try:
-        print(f"Fetching all VMs and containers from Proxmox...")
-        resources = client.cluster.resources.get()
-        
-        # Filter for VMs (qemu) and containers (lxc)
-        vms = [r for r in resources if r.get("type") in ["qemu", "lxc"]]
+        vms = _get_inventory().guests()
         
         if len(vms) == 0:
-            print(f"✅ No VMs or containers found in cluster")
+            debug("No VMs or containers found in cluster")
             return []
         
-        print(f"✅ Successfully fetched {len(vms)} VMs/containers")
+        debug("Successfully fetched %s VMs/containers", len(vms))
         return vms
     except Exception as e:
         print(f"❌ Error fetching VMs: {type(e).__name__}: {str(e)}")
         return []
 
-def get_vm_config(vmid: int):
-    """Gets the full configuration for a specific VMID."""
-    if MOCK_MODE or not client:
-        return {
-            "vmid": vmid,
-            "name": "test-vm",
-            "memory": 2048,
-            "cores": 2,
+def find_vms_by_name(name: str, cluster: str = None):
+    """Returns all VMs and containers with the given name."""
+    results = _federated(lambda member: member.inventory().find_by_name(name), cluster)
+    if results is not None:
+        return _tagged(results)
+    try:
+        return _get_inventory().find_by_name(name)
+    except Exception as e:
+        print(f"❌ Error looking up VM {name}: {type(e).__name__}: {str(e)}")
+        return []
+
+async def _fetch_guest_config(vm_resource):
+    """Fetches the config of one guest resource and adds hierarchy info."""
+    vmid = vm_resource.get("vmid")
+    node = vm_resource.get("node")
+    vm_type = vm_resource.get("type")
+    
+    # The inventory lookup already waited for any in-flight connect
+    client = _connection.get_client()
+    path = f"/nodes/{node}/{vm_type}/{vmid}/config"
+    if not client:
+        config, _ = _snapshot.get(path) if _snapshot else (None, None)
+        # Copies: hierarchy info is added below and must not reach the snapshot
+        config = dict(config) if config else {
+            "name": vm_resource.get("name"),
+            "memory": (vm_resource.get("maxmem") or 0) // (1024 * 1024),
+            "cores": vm_resource.get("maxcpu", 1),
             "sockets": 1,
-            "node": "pve1"
         }
+    elif vm_type in ("qemu", "lxc"):
+        config = await _api_get(client, path)
+        _record(path, dict(config))
+    else:
+        raise ValueError(f"Unknown VM type: {vm_type}")
     
+    # Add hierarchy info
+    config["vmid"] = vmid
+    config["node"] = node
+    config["type"] = vm_type
+    config["status"] = vm_resource.get("status", "unknown")
+    return config
+
+async def _get_vm_config(vmid):
+    vm_resource = (await _async_get_inventory()).get_guest(vmid)
+    if not vm_resource:
+        return f"VM {vmid} not found"
+    return await _fetch_guest_config(vm_resource)
+
+async def async_get_vm_config(vmid: int):
+    """Async version of get_vm_config()."""
+    return await _loop.call(_get_vm_config(vmid))
+
+def _get_federated_vm_config(vmid, cluster):
+    found = _federated(lambda member: (member, member.inventory().get_guest(vmid)), cluster)
+    matches = [(name, member, vm_resource) for name, (member, vm_resource) in found if vm_resource]
+    if not matches:
+        return f"VM {vmid} not found"
+    if len(matches) > 1:
+        clusters = ", ".join(name for name, _, _ in matches)
+        return {"vmid": vmid, "error": f"VM {vmid} exists in clusters {clusters}; pass the cluster"}
+    name, member, vm_resource = matches[0]
     try:
-        print(f"Fetching config for VM {vmid}...")
-        # First find which node has this VM
-        resources = client.cluster.resources.get()
-        vm_resource = None
-        for resource in resources:
-            if resource.get("vmid") == vmid and resource.get("type") in ["qemu", "lxc"]:
-                vm_resource = resource
-                break
-        
-        if not vm_resource:
-            return f"VM {vmid} not found"
-        
-        node = vm_resource.get("node")
-        vm_type = vm_resource.get("type")
-        
-        # Get full config based on type
-        if vm_type == "qemu":
-            config = client.nodes(node).qemu(vmid).config.get()
-        elif vm_type == "lxc":
-            config = client.nodes(node).lxc(vmid).config.get()
-        else:
-            return f"Unknown VM type: {vm_type}"
-        
-        # Add hierarchy info
-        config["vmid"] = vmid
-        config["node"] = node
-        config["type"] = vm_type
-        config["status"] = vm_resource.get("status", "unknown")
-        
-        print(f"✅ Successfully fetched config for VM {vmid}")
+        config = _loop.run(asyncio.wait_for(member.fetch_config(vm_resource), member.timeout))
+    except Exception as e:
+        print(f"❌ Error fetching VM config: {type(e).__name__}: {str(e)}")
+        return {"vmid": vmid, "cluster": name, "error": str(e) or type(e).__name__}
+    return {**config, "cluster": name}
+
+def get_vm_config(vmid: int, cluster: str = None):
+    """
+    Gets the full configuration for a specific VMID. With several clusters
+    the guest is looked up in all of them (or in `cluster`); a VMID used
+    in more than one cluster needs `cluster`.
+    """
+    if cluster:
+        _clusters.get(cluster)
+    if _clusters.federated:
+        return _get_federated_vm_config(vmid, cluster)
+    try:
+        debug("Fetching config for VM %s...", vmid)
+        config = _loop.run(_get_vm_config(vmid))
+        if isinstance(config, dict):
+            debug("Successfully fetched config for VM %s", vmid)
         return config
     except Exception as e:
         print(f"❌ Error fetching VM config: {type(e).__name__}: {str(e)}")
         return {"vmid": vmid, "error": str(e)}
 
-def list_storage_pools():
-    """Returns all available storage pools."""
-    if MOCK_MODE or not client:
-        print("(Using mock data - Proxmox unavailable)")
-        return [
-            {
-                "storage": "local",
-                "type": "dir",
-                "content": "images,rootdir",
-                "enabled": 1,
-                "nodes": "pve1,pve2"
-            },
-            {
-                "storage": "local-lvm",
-                "type": "lvmthin",
-                "content": "images,rootdir",
-                "enabled": 1,
-                "nodes": "pve1,pve2"
-            }
-        ]
+def _select_guests(inventory, vmids=None, node=None, vm_type=None, status=None):
+    """Resolves a vmid list and/or node/type/status filter to guest resources."""
+    if vmids:
+        candidates = []
+        for vmid in vmids:
+            vm_resource = inventory.get_guest(int(vmid))
+            candidates.append(vm_resource or {"vmid": int(vmid), "missing": True})
+    elif node:
+        candidates = inventory.node_guests(node)
+    else:
+        candidates = inventory.guests()
+    
+    return [
+        r for r in candidates
+        if r.get("missing")
+        or ((not node or r.get("node") == node)
+            and (not vm_type or r.get("type") == vm_type)
+            and (not status or r.get("status") == status))
+    ]
+
+async def _fetch_configs(selected, fetch_config, max_workers=None):
+    """Fetches the configs of selected guests with at most `max_workers` requests in flight."""
+    if not selected:
+        return []
+    
+    workers = max(1, min(max_workers or PROXMOX_MAX_WORKERS, len(selected)))
+    limit = asyncio.Semaphore(workers)
     
+    async def fetch(vm_resource):
+        if vm_resource.get("missing"):
+            return {"vmid": vm_resource["vmid"], "error": "not found"}
+        try:
+            async with limit:
+                return await fetch_config(vm_resource)
+        except Exception as e:
+            return {"vmid": vm_resource.get("vmid"), "node": vm_resource.get("node"), "error": str(e)}
+    
+    debug("Fetching configs for %s VMs with %s concurrent requests...", len(selected), workers)
+    return await asyncio.gather(*(fetch(r) for r in selected))
+
+async def _get_vm_configs(vmids=None, node=None, vm_type=None, status=None, max_workers=None):
+    inventory = await _async_get_inventory()
+    selected = _select_guests(inventory, vmids, node, vm_type, status)
+    return await _fetch_configs(selected, _fetch_guest_config, max_workers)
+
+def _get_federated_vm_configs(vmids, node, vm_type, status, max_workers, cluster):
+    # Each cluster selects and fetches its own guests within its own timeout
+    results = _federated(
+        lambda member: _loop.run(_fetch_configs(
+            _select_guests(member.inventory(), vmids, node, vm_type, status), member.fetch_config, max_workers
+        )),
+        cluster
+    )
+    # A vmid is only missing if no cluster that answered has it
+    found = {c.get("vmid") for _, configs in results for c in configs if c.get("error") != "not found"}
+    configs, missing = [], set()
+    for name, cluster_configs in results:
+        for config in cluster_configs:
+            if config.get("error") != "not found":
+                configs.append({**config, "cluster": name})
+            elif config["vmid"] not in found and config["vmid"] not in missing:
+                missing.add(config["vmid"])
+                configs.append(config)
+    return configs
+
+async def async_get_vm_configs(vmids=None, node=None, vm_type=None, status=None, max_workers=None):
+    """Async version of get_vm_configs()."""
+    return await _loop.call(_get_vm_configs(vmids, node, vm_type, status, max_workers))
+
+def get_vm_configs(vmids=None, node=None, vm_type=None, status=None, max_workers=None, cluster: str = None):
+    """
+    Gets the configuration of many VMs/containers in one call.
+    Guests are picked by explicit vmids and/or filtered by node, type and
+    status, resolved from one inventory snapshot, and their configs are
+    fetched concurrently with at most `max_workers` requests in flight.
+    With several clusters every cluster (or only `cluster`) is searched at
+    once and configs are tagged with their cluster.
+    Returns a list of configs; failed or unknown guests carry an "error" key.
+    """
+    if cluster:
+        _clusters.get(cluster)
     try:
-        print(f"Fetching storage pools from Proxmox...")
-        storage = client.storage.get()
+        if _clusters.federated:
+            configs = _get_federated_vm_configs(vmids, node, vm_type, status, max_workers, cluster)
+        else:
+            configs = _loop.run(_get_vm_configs(vmids, node, vm_type, status, max_workers))
+    except ClusterUnavailable:
+        raise
+    except Exception as e:
+        print(f"❌ Error fetching VM configs: {type(e).__name__}: {str(e)}")
+        return []
+    
+    failed = sum(1 for c in configs if "error" in c)
+    debug("Fetched %s VM configs (%s failed)", len(configs) - failed, failed)
+    return configs
+
+def _live_storage(client):
+    debug("Fetching storage pools from Proxmox...")
+    storage = _live_get(client, "/storage")
+    _record("/storage", storage)
+    return storage
+
+def list_storage_pools(cluster: str = None):
+    """Returns all available storage pools (see list_all_vms() for `cluster`)."""
+    results = _federated(lambda member: member.storage(), cluster)
+    if results is not None:
+        return _tagged(results)
+    # While a stale startup snapshot is up, don't wait for the connection either
+    client = _connection.get_client() if _resources_cache.stale else _get_client()
+    if not client:
+        return _offline("/storage", MOCK_STORAGE)[0]
+    
+    try:
+        storage = _live_storage(client)
         
         if len(storage) == 0:
-            print(f"✅ No storage pools found")
+            debug("No storage pools found")
             return []
         
-        print(f"✅ Successfully fetched {len(storage)} storage pools")
+        debug("Successfully fetched %s storage pools", len(storage))
         return storage
     except Exception as e:
         print(f"❌ Error fetching storage pools: {type(e).__name__}: {str(e)}")
         return []
 
-def get_node_vms(node: str):
-    """Returns all VMs on a specific node."""
-    if MOCK_MODE or not client:
-        return [
-            {"vmid": 100, "name": "ubuntu-web", "type": "qemu", "status": "running", "node": node},
-            {"vmid": 102, "name": "test-container", "type": "lxc", "status": "stopped", "node": node}
-        ]
-    
+async def async_get_node_vms(node: str):
+    """Async version of get_node_vms()."""
+    return (await _async_get_inventory()).node_guests(node)
+
+def get_node_vms(node: str, cluster: str = None):
+    """Returns all VMs on a specific node (see list_all_vms() for `cluster`)."""
+    results = _federated(lambda member: member.inventory().node_guests(node), cluster)
+    if results is not None:
+        return _tagged(results)
     try:
-        print(f"Fetching VMs on node {node}...")
-        resources = client.cluster.resources.get()
-        node_vms = [
-            r for r in resources 
-            if r.get("type") in ["qemu", "lxc"] and r.get("node") == node
-        ]
-        print(f"✅ Successfully fetched {len(node_vms)} VMs on node {node}")
+        node_vms = _get_inventory().node_guests(node)
+        debug("Successfully fetched %s VMs on node %s", len(node_vms), node)
         return node_vms
     except Exception as e:
         print(f"❌ Error fetching VMs on node {node}: {type(e).__name__}: {str(e)}")
         return []
+
+async def _record_configs(client, guests, workers):
+    limit = asyncio.Semaphore(workers)
+    
+    async def fetch(guest):
+        path = f"/nodes/{guest['node']}/{guest['type']}/{guest['vmid']}/config"
+        try:
+            async with limit:
+                return path, await _api_get(client, path), None
+        except Exception as e:
+            debug("Skipping config of %s: %s", guest.get("vmid"), e)
+            return None
+    
+    return [entry for entry in await asyncio.gather(*(fetch(g) for g in guests)) if entry]
+
+def record_snapshot(store: SnapshotStore, configs: bool = True, max_workers: int = None):
+    """
+    Records the live cluster into `store` for offline use or replay: the
+    version, nodes, inventory, storage pools and, with configs, every
+    guest config. Returns counts; raises ConnectionError while Proxmox is
+    unreachable (a recording never contains mock data).
+    """
+    client = _get_client()
+    if not client:
+        raise ConnectionError(f"Proxmox ({PROXMOX_HOST}) is unreachable: {_connection.last_error}")
+    with span("snapshot:record") as current:
+        entries = [(path, _live_get(client, path), None) for path in ("/version", "/nodes", "/cluster/resources", "/storage")]
+        guests = [r for r in entries[2][1] if r.get("type") in ("qemu", "lxc")]
+        recorded = []
+        if configs and guests:
+            workers = max(1, min(max_workers or PROXMOX_MAX_WORKERS, len(guests)))
+            recorded = _loop.run(_record_configs(client, guests, workers))
+        store.put_many(entries + recorded)
+        store.set_meta(host=PROXMOX_HOST, recorded_at=time.time(), guests=len(guests))
+        current.set(guests=len(guests), configs=len(recorded))
+    return {"guests": len(guests), "configs": len(recorded), "config_errors": len(guests) - len(recorded) if configs else 0}
+
+# Ring buffers of rrddata samples; queries never call the API
+_metrics = MetricStore()
+_metrics_thread = None
+_metrics_stop = threading.Event()
+
+def _rrd_path(resource):
+    if resource.get("type") == "node":
+        return f"/nodes/{resource['node']}/rrddata"
+    return f"/nodes/{resource['node']}/{resource['type']}/{resource['vmid']}/rrddata"
+
+async def _collect_metrics(timeframe, max_workers):
+    inventory = await _async_get_inventory()
+    client = _connection.get_client()
+    if not client:
+        return None
+    # Stopped guests and offline nodes have nothing new to report
+    targets = [n for n in inventory.by_type("node") if n.get("status") == "online"]
+    targets += [g for g in inventory.guests() if g.get("status") == "running"]
+    workers = max(1, min(max_workers or PROXMOX_MAX_WORKERS, len(targets) or 1))
+    limit = asyncio.Semaphore(workers)
+    counts = {"series": len(targets), "samples": 0, "errors": 0}
+    
+    async def fetch(resource):
+        try:
+            async with limit:
+                rows = await _api_get(client, _rrd_path(resource), timeframe=timeframe, cf="AVERAGE")
+        except Exception as e:
+            counts["errors"] += 1
+            debug("rrddata for %s failed: %s: %s", resource.get("id"), type(e).__name__, e)
+            return
+        # Ingest as answers arrive so the raw rows never pile up; the NumPy
+        # work runs on a worker thread so other requests on the loop go on
+        counts["samples"] += await asyncio.to_thread(_metrics.ingest, _resource_id(resource), rows or [])
+    
+    debug("Fetching rrddata for %s series with %s concurrent requests...", len(targets), workers)
+    await asyncio.gather(*(fetch(r) for r in targets))
+    return counts
+
+def collect_metrics(timeframe: str = None, max_workers: int = None):
+    """
+    Fetches rrddata for every online node and running guest concurrently
+    (at most `max_workers` requests in flight) and appends the samples to
+    the metric ring buffers. Returns counts of series, samples and errors.
+    """
+    start = time.perf_counter()
+    with span("metrics:collect") as current:
+        try:
+            counts = _loop.run(_collect_metrics(timeframe or METRICS_TIMEFRAME, max_workers))
+        except Exception as e:
+            print(f"❌ Error collecting metrics: {type(e).__name__}: {str(e)}")
+            return {"series": 0, "samples": 0, "errors": 1}
+        if counts is None:
+            return {"series": 0, "samples": 0, "errors": 0, "skipped": "Proxmox unavailable"}
+        _metrics.flush()
+        current.set(**counts)
+    counts["seconds"] = round(time.perf_counter() - start, 2)
+    debug("Collected metrics: %s", counts)
+    return counts
+
+def _run_metrics_collection(interval):
+    while True:
+        collect_metrics()
+        if _metrics_stop.wait(interval):
+            return
+
+def start_metrics_collection(interval: float):
+    """Collects rrddata every `interval` seconds on a daemon thread (first run right away)."""
+    global _metrics_thread
+    if _metrics_thread and _metrics_thread.is_alive():
+        return
+    _metrics_stop.clear()
+    _metrics_thread = threading.Thread(
+        target=_run_metrics_collection, args=(interval,), name="proxmox-metrics", daemon=True
+    )
+    _metrics_thread.start()
+
+def stop_metrics_collection():
+    _metrics_stop.set()
+
+def get_metric_store():
+    """Returns the MetricStore the collector fills."""
+    return _metrics
+
@@ -0,0 +1,175 @@
+# tools/rate_limit.py
+import asyncio
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Groq requests allowed per minute across every session of this process; 0 = unlimited
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+# Requests that may start back to back before the per-minute rate applies;
+# enough for the few model calls of one agent turn
+GROQ_BURST = int(os.getenv("GROQ_BURST", "5"))
+# Groq tokens (prompt + completion) allowed per minute; 0 = unlimited
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "0"))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second refill up to
+    `capacity`. acquire() takes tokens, waiting for the refill if needed;
+    waiters are not queued, so under contention the first to wake wins.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.waited_s = 0.0
+
+    def _take(self, tokens):
+        """
+        Takes the tokens if they are there; otherwise returns the seconds
+        until they will be. Taking 0 only waits for the bucket to be out of debt.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.acquired += 1
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, blocking: bool = True, timeout: float = None):
+        """Returns True once the tokens are taken, False if not blocking or timed out."""
+        start = time.monotonic()
+        waited = False
+        while True:
+            delay = self._take(tokens)
+            if delay == 0.0:
+                if waited:
+                    self._record_wait(time.monotonic() - start)
+                return True
+            if not blocking or (timeout is not None and time.monotonic() - start + delay > timeout):
+                return False
+            waited = True
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: float = 1, blocking: bool = True, timeout: float = None):
+        start = time.monotonic()
+        waited = False
+        while True:
+            delay = self._take(tokens)
+            if delay == 0.0:
+                if waited:
+                    self._record_wait(time.monotonic() - start)
+                return True
+            if not blocking or (timeout is not None and time.monotonic() - start + delay > timeout):
+                return False
+            waited = True
+            await asyncio.sleep(delay)
+
+    def debit(self, tokens: float):
+        """Takes tokens already spent; the bucket may go into debt, which later acquires wait out."""
+        with self._lock:
+            self._tokens -= tokens
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.waited_s += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "per_minute": round(self.rate * 60, 1),
+                "capacity": self.capacity,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "waited_s": round(self.waited_s, 2),
+            }
+
+
+class GroqRateLimiter(BaseRateLimiter):
+    """
+    The rate limiter handed to ChatGroq: every model call, from any chat
+    session, batch worker or thread, takes one request from one shared
+    bucket, so the whole process stays within the account's quota
+    instead of collecting 429s.
+
+    With tokens_per_minute a second bucket holds the token quota. A call's
+    size is only known afterwards, so TokenUsageCallback charges what Groq
+    reports and the next calls wait while the bucket is in debt.
+
+    While `enabled` is False every call passes straight through and
+    nothing is charged (agent-main's interactive CLI).
+    """
+
+    def __init__(self, requests_per_minute: float = None, burst: int = None, tokens_per_minute: float = None):
+        requests_per_minute = GROQ_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        tokens_per_minute = GROQ_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute / 60.0, burst or GROQ_BURST) if requests_per_minute > 0 else None
+        # A full minute of tokens may be spent at once, as Groq allows
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute > 0 else None
+        self.enabled = True
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not self.enabled:
+            return True
+        if self.tokens and not self.tokens.acquire(0, blocking=blocking):
+            return False
+        return self.requests.acquire(blocking=blocking) if self.requests else True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not self.enabled:
+            return True
+        if self.tokens and not await self.tokens.aacquire(0, blocking=blocking):
+            return False
+        return await self.requests.aacquire(blocking=blocking) if self.requests else True
+
+    def record_usage(self, tokens: int):
+        if self.enabled and self.tokens and tokens:
+            self.tokens.debit(tokens)
+
+    def stats(self):
+        stats = {}
+        if self.requests:
+            stats["requests"] = self.requests.stats()
+        if self.tokens:
+            stats["tokens"] = self.tokens.stats()
+        return stats
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Charges the tokens each model call used to the limiter's token bucket."""
+
+    def __init__(self, limiter: GroqRateLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tokens = usage.get("total_tokens")
+        if tokens is None:
+            # Streamed calls report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    tokens = (tokens or 0) + ((getattr(message, "usage_metadata", None) or {}).get("total_tokens") or 0)
+        self.limiter.record_usage(tokens or 0)
+
+
+def get_groq_limiter(requests_per_minute: float = None, burst: int = None, tokens_per_minute: float = None):
+    """Returns a GroqRateLimiter, or None when both rates are 0 (unlimited)."""
+    requests_per_minute = GROQ_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+    tokens_per_minute = GROQ_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+    if requests_per_minute <= 0 and tokens_per_minute <= 0:
+        return None
+    return GroqRateLimiter(requests_per_minute, burst, tokens_per_minute)
@@ -0,0 +1,122 @@
+# tools/response_cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from tools.router import normalize
+
+# Entries kept before the least recently used one is evicted
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Seconds an answer stays valid even if the inventory does not change
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+# JSON file the cache is persisted to; unset keeps it in memory only
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")
+
+# Questions that lean on earlier turns ("show its config") depend on the
+# conversation, not just on the question and the inventory
+CONTEXT_WORDS = frozenset(("it", "its", "that", "those", "them", "this", "these", "same", "again", "above"))
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of final agent answers for read-only turns.
+    Keys are the normalized question plus the inventory fingerprint the
+    tools saw, so any change to the cluster misses naturally; clear() is
+    registered for Terraform apply/destroy as well. With a path, entries
+    survive restarts (expiry uses wall-clock time for that reason).
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, path: str = None):
+        self.max_entries = max_entries or RESPONSE_CACHE_SIZE
+        self.ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.path = path if path is not None else RESPONSE_CACHE_PATH
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._load()
+
+    @staticmethod
+    def cacheable_question(question: str):
+        words = normalize(question).split()
+        return bool(words) and not CONTEXT_WORDS.intersection(words)
+
+    @staticmethod
+    def _key(question, fingerprint):
+        return f"{fingerprint}:{normalize(question)}"
+
+    def get(self, question: str, fingerprint: str):
+        """Returns the cached answer, or None."""
+        if not self.cacheable_question(question):
+            self.skipped += 1
+            return None
+        key = self._key(question, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["stored_at"] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, question: str, fingerprint: str, answer: str):
+        """Stores an answer; the caller decides the turn was read-only."""
+        if not self.cacheable_question(question):
+            return
+        with self._lock:
+            key = self._key(question, fingerprint)
+            self._entries[key] = {"answer": answer, "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        """Drops every entry (e.g. after a Terraform apply or destroy)."""
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable response cache {self.path}: {e}")
+            return
+        now = time.time()
+        for key, entry in entries.items():
+            if now - entry.get("stored_at", 0) <= self.ttl:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        if not self.path:
+            return
+        # Write then rename so a crash never leaves a half-written file
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not persist response cache: {e}")
+
+    def stats(self):
+        """Returns hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
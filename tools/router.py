@@ -0,0 +1,80 @@
+# tools/router.py
+import re
+import time
+from collections import Counter
+
+# Anything that might change the cluster always goes to the agent
+WRITE_INTENT = re.compile(
+    r"\b(create|delete|destroy|remove|add|apply|plan|modify|change|increase|decrease|resize|"
+    r"migrate|start|stop|shutdown|reboot|restart|clone|provision|deploy|make|set|update|"
+    r"upgrade|attach|detach|terraform|hcl|approve|yes|no)\b"
+)
+# Phrasing that asks for reasoning rather than a lookup
+AMBIGUOUS_INTENT = re.compile(
+    r"\b(why|which|should|compare|more than|less than|over|under|busiest|best|recommend|except|not)\b"
+)
+# Politeness and filler that does not change a read query
+FILLER = re.compile(r"\b(please|can you|could you|would you|tell me|show me|give me|i want to see|kindly)\b")
+
+
+def normalize(text: str):
+    """Lower-cases, strips filler words and punctuation, collapses spaces."""
+    text = FILLER.sub(" ", text.lower())
+    text = re.sub(r"[^\w\s.-]", " ", text)
+    return " ".join(text.replace("?", " ").split()).strip(" .")
+
+
+class IntentRouter:
+    """
+    Answers simple read-only questions straight from the inventory.
+    Each route is a full-match regex on the normalized question and a
+    handler taking the match's named groups; a handler may return None to
+    decline. Anything that is not an exact match - and anything that could
+    be a write - falls through to the LLM agent.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.hits = Counter()
+        self.fallthroughs = 0
+        self.declined = 0
+        self._latencies = []
+
+    def add_route(self, name: str, pattern: str, handler):
+        self.routes.append((name, re.compile(pattern), handler))
+
+    def route(self, text: str):
+        """Returns an answer, or None if the question should go to the agent."""
+        start = time.perf_counter()
+        question = normalize(text)
+        if not question or WRITE_INTENT.search(question) or AMBIGUOUS_INTENT.search(question):
+            self.fallthroughs += 1
+            return None
+        for name, pattern, handler in self.routes:
+            match = pattern.fullmatch(question)
+            if not match:
+                continue
+            answer = handler(**match.groupdict())
+            if answer is None:
+                self.declined += 1
+                break
+            self.hits[name] += 1
+            self._latencies.append(time.perf_counter() - start)
+            return answer
+        self.fallthroughs += 1
+        return None
+
+    def stats(self):
+        """Returns hit rate and fast-path latency."""
+        hits = sum(self.hits.values())
+        total = hits + self.fallthroughs
+        latencies = sorted(self._latencies)
+        return {
+            "questions": total,
+            "hits": hits,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "declined": self.declined,
+            "by_route": dict(self.hits),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
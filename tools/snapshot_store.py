@@ -0,0 +1,181 @@
+# tools/snapshot_store.py
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+# SQLite file holding the last live inventory, guest configs and storage pools; unset = off
+PROXMOX_SNAPSHOT_PATH = os.getenv("PROXMOX_SNAPSHOT_PATH")
+# Seconds between background writes of newly fetched responses
+PROXMOX_SNAPSHOT_SAVE_INTERVAL = float(os.getenv("PROXMOX_SNAPSHOT_SAVE_INTERVAL", "60"))
+# Bumped when the table layout changes; older files are ignored, not migrated
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    saved REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def response_key(path: str, **params):
+    """Store key of a GET: the API path plus its sorted query string."""
+    params = {k: v for k, v in params.items() if v is not None}
+    return f"{path}?{urlencode(sorted(params.items()))}" if params else path
+
+
+class SnapshotStore:
+    """
+    API responses persisted in one SQLite file, keyed by path and query
+    (see response_key). Bodies are the 'data' field as zlib-compressed JSON.
+
+    The reader saves what it fetched live and reads it back at startup and
+    while Proxmox is unreachable. A recording of a real cluster
+    (benchmarks/record_cluster.py) is the same file, so it can be replayed
+    by the reader offline or by the fake API (SyntheticCluster.from_snapshot).
+
+    put_later() queues a write for the background writer, which commits at
+    most every save_interval seconds; flush() commits the queue now and
+    runs at exit.
+    """
+
+    def __init__(self, path: str, save_interval: float = None):
+        self.path = path
+        self.save_interval = PROXMOX_SNAPSHOT_SAVE_INTERVAL if save_interval is None else save_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._writer = None
+        self._last_write = 0.0
+        self.writes = 0
+        self._db = self._open()
+        atexit.register(self.flush)
+
+    def _open(self):
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.executescript(SCHEMA)
+            row = db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None:
+                with db:
+                    db.execute("INSERT INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+            elif row[0] != str(SCHEMA_VERSION):
+                print(f"⚠️ Snapshot {self.path} has schema {row[0]}, expected {SCHEMA_VERSION}; not using it")
+                db.close()
+                return None
+            return db
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not open snapshot {self.path}: {type(e).__name__}: {str(e)}")
+            return None
+
+    @property
+    def available(self):
+        return self._db is not None
+
+    # -- reads -------------------------------------------------------------
+
+    def get(self, key: str):
+        """Returns (data, saved unix time), or (None, None) if the key was never saved."""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+            if self._db is None:
+                return None, None
+            row = self._db.execute("SELECT body, saved FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def items(self, prefix: str = "", suffix: str = ""):
+        """Yields (key, data, saved) for every saved key with the prefix and suffix."""
+        self.flush()
+        if self._db is None:
+            return
+        pattern = prefix.replace("%", r"\%").replace("_", r"\_") + "%" + suffix.replace("%", r"\%").replace("_", r"\_")
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, body, saved FROM responses WHERE key LIKE ? ESCAPE '\\' ORDER BY key", (pattern,)
+            ).fetchall()
+        for key, body, saved in rows:
+            yield key, json.loads(zlib.decompress(body)), saved
+
+    def meta(self):
+        """Returns the meta table (schema, host, recorded_at, ...) as a dict."""
+        if self._db is None:
+            return {}
+        with self._lock:
+            return dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+
+    # -- writes ------------------------------------------------------------
+
+    def put(self, key: str, data, saved: float = None):
+        """Writes one response now."""
+        self.put_many([(key, data, saved)])
+
+    def put_many(self, entries):
+        """Writes (key, data, saved) entries in one transaction."""
+        if self._db is None:
+            return
+        now = time.time()
+        rows = [
+            (key, saved or now, zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 1))
+            for key, data, saved in entries
+        ]
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", rows)
+                self.writes += len(rows)
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not save snapshot {self.path}: {type(e).__name__}: {str(e)}")
+
+    def put_later(self, key: str, data, saved: float = None):
+        """Queues a write for the background writer; a newer put of the same key replaces it."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._pending[key] = (data, saved or time.time())
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="snapshot-writer", daemon=True)
+                self._writer.start()
+        self._wake.set()
+
+    def set_meta(self, **values):
+        if self._db is None:
+            return
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in values.items()])
+
+    def flush(self):
+        """Commits queued writes now."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self.put_many((key, data, saved) for key, (data, saved) in pending.items())
+            self._last_write = time.monotonic()
+
+    def _run_writer(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Coalesce: everything fetched within one interval is one transaction
+            time.sleep(max(0.0, self._last_write + self.save_interval - time.monotonic()))
+            self.flush()
+
+    def stats(self):
+        if self._db is None:
+            return {"path": self.path, "available": False}
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+            pending = len(self._pending)
+        return {"path": self.path, "entries": entries, "kib": size // 1024, "pending": pending, "writes": self.writes}
@@ -0,0 +1,117 @@
+# tools/streaming.py
+import sys
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Tool arguments longer than this are elided in the progress line (HCL can be huge)
+MAX_ARGS_CHARS = 80
+
+
+def _short_args(args):
+    text = ", ".join(f"{k}={v!r}" for k, v in (args or {}).items())
+    return text if len(text) <= MAX_ARGS_CHARS else text[:MAX_ARGS_CHARS - 3] + "..."
+
+
+class TurnTimings:
+    """Wall-clock timings of one agent turn: time to first token and each step."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.steps = []
+        self._step_start = self.start
+        self._tool_starts = {}
+
+    def _elapsed(self, since):
+        return time.perf_counter() - since
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = self._elapsed(self.start)
+
+    def llm_done(self, tool_calls):
+        self.steps.append(("llm", self._elapsed(self._step_start)))
+        now = time.perf_counter()
+        for call in tool_calls:
+            self._tool_starts[call["id"]] = now
+        self._step_start = now
+
+    def tool_done(self, name, call_id):
+        started = self._tool_starts.pop(call_id, self._step_start)
+        seconds = self._elapsed(started)
+        self.steps.append((name, seconds))
+        # The next LLM step starts when the last tool result is in
+        self._step_start = time.perf_counter()
+        return seconds
+
+    @property
+    def total(self):
+        return self._elapsed(self.start)
+
+    def as_dict(self):
+        return {
+            "ttft_s": round(self.first_token, 3) if self.first_token is not None else None,
+            "total_s": round(self.total, 3),
+            "steps": [{"step": name, "s": round(seconds, 3)} for name, seconds in self.steps],
+        }
+
+    def __str__(self):
+        first = f"first token {self.first_token:.2f}s" if self.first_token is not None else "no tokens"
+        steps = " -> ".join(f"{name} {seconds:.2f}s" for name, seconds in self.steps)
+        return f"⏱ {first} | {steps} | total {self.total:.2f}s"
+
+
+def stream_turn(agent, messages, out=None):
+    """
+    Runs one agent turn through agent.stream(), printing LLM tokens and
+    tool start/finish events as they arrive instead of waiting for the
+    whole answer.
+
+    Returns (result, timings) where result has the same shape as
+    agent.invoke() ({"messages": input + new messages}).
+    """
+    out = out or sys.stdout
+    timings = TurnTimings()
+    new_messages = []
+    names = {}
+    in_answer = False
+
+    for mode, chunk in agent.stream({"messages": messages}, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            token, _metadata = chunk
+            if isinstance(token, AIMessageChunk) and isinstance(token.content, str) and token.content:
+                timings.token()
+                if not in_answer:
+                    out.write("Agent: ")
+                    in_answer = True
+                out.write(token.content)
+                out.flush()
+            continue
+
+        # mode == "updates": {node: state update} once a node finishes
+        for update in chunk.values():
+            for message in (update or {}).get("messages", []):
+                new_messages.append(message)
+                if isinstance(message, AIMessage) and not isinstance(message, AIMessageChunk):
+                    timings.llm_done(message.tool_calls)
+                    if in_answer:
+                        out.write("\n")
+                        in_answer = False
+                    elif isinstance(message.content, str) and message.content:
+                        # The model did not stream; show the text in one piece
+                        timings.token()
+                        out.write(f"Agent: {message.content}\n")
+                    for call in message.tool_calls:
+                        names[call["id"]] = call["name"]
+                        out.write(f"🔧 {call['name']}({_short_args(call['args'])}) ...\n")
+                elif isinstance(message, ToolMessage):
+                    name = names.get(message.tool_call_id, message.name or "tool")
+                    seconds = timings.tool_done(name, message.tool_call_id)
+                    status = "❌" if message.status == "error" else "✓"
+                    out.write(f"   {status} {name} finished in {seconds:.2f}s ({len(str(message.content))} chars)\n")
+                out.flush()
+
+    if in_answer:
+        out.write("\n")
+    return {"messages": list(messages) + new_messages}, timings
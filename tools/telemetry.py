@@ -0,0 +1,323 @@
+# tools/telemetry.py
+import contextvars
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# off: nothing is recorded; metrics: latency histograms and counters;
+# trace: metrics plus one JSON line per span; debug: trace plus a line on stderr per span
+LEVELS = {"off": 0, "metrics": 1, "trace": 2, "debug": 3}
+TELEMETRY_TRACE_FILE = os.getenv("TELEMETRY_TRACE_FILE", "telemetry-trace.jsonl")
+# Serves /metrics in Prometheus text format when set (and telemetry is on)
+TELEMETRY_METRICS_PORT = os.getenv("TELEMETRY_METRICS_PORT")
+# Upper bounds in seconds, from a cached lookup to a Terraform apply
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+_level = LEVELS.get(os.getenv("TELEMETRY", "off").lower(), 0)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+_trace_lock = threading.Lock()
+_trace_file = None
+
+
+def set_level(level: str):
+    """Switches verbosity at runtime ('off', 'metrics', 'trace' or 'debug')."""
+    global _level
+    if level not in LEVELS:
+        raise ValueError(f"Unknown telemetry level {level!r}; use one of {', '.join(LEVELS)}")
+    _level = LEVELS[level]
+
+
+def enabled():
+    return _level > 0
+
+
+class Histogram:
+    """Cumulative latency histogram with Prometheus-style buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.errors = {}
+        self.payload_bytes = {}
+
+    def record(self, name, seconds, error, size):
+        with self._lock:
+            histogram = self.latency.get(name)
+            if histogram is None:
+                histogram = self.latency[name] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            if size:
+                self.payload_bytes[name] = self.payload_bytes.get(name, 0) + size
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.errors.clear()
+            self.payload_bytes.clear()
+
+
+_registry = _Registry()
+
+
+class _NoopSpan:
+    """Returned by span() when telemetry is off; every method does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed operation; attributes set on it end up in the trace."""
+
+    __slots__ = ("name", "attrs", "id", "parent", "start", "_token", "_wall")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_span_ids)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._begin()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self._finish(exc_type)
+        return False
+
+    def _begin(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent else None
+        self._wall = time.time()
+        self.start = time.perf_counter()
+
+    def _finish(self, exc_type=None):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _registry.record(self.name, seconds, "error" in self.attrs, self.attrs.get("bytes"))
+        if _level >= LEVELS["trace"]:
+            _write_trace(self, seconds)
+
+
+def span(name: str, **attrs):
+    """
+    Times the enclosed block as `name`. Use set(bytes=..., ...) on the
+    returned span to attach payload sizes and other attributes.
+    """
+    if not _level:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def annotate(**attrs):
+    """Adds attributes to the innermost open span (e.g. error=...)."""
+    if _level:
+        current = _current_span.get()
+        if current is not None:
+            current.set(**attrs)
+
+
+def traced(name: str):
+    """Decorator: runs the function inside span(name); string results count as payload bytes."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _level:
+                return fn(*args, **kwargs)
+            with Span(name, {}) as current:
+                result = fn(*args, **kwargs)
+                if isinstance(result, str):
+                    current.attrs["bytes"] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def debug(message: str, *args):
+    """Prints to stderr at the 'debug' level only; formatting is skipped otherwise."""
+    if _level >= LEVELS["debug"]:
+        print(f"DEBUG: {message % args if args else message}", file=sys.stderr)
+
+
+def _write_trace(current, seconds):
+    global _trace_file
+    record = {
+        "ts": round(current._wall, 6),
+        "span": current.name,
+        "id": current.id,
+        "parent": current.parent,
+        "ms": round(seconds * 1000, 3),
+        "thread": threading.current_thread().name,
+    }
+    record.update(current.attrs)
+    line = json.dumps(record, default=str)
+    with _trace_lock:
+        if _trace_file is None:
+            _trace_file = open(TELEMETRY_TRACE_FILE, "a", buffering=1)
+        _trace_file.write(line + "\n")
+    if _level >= LEVELS["debug"]:
+        extras = " ".join(f"{k}={v}" for k, v in current.attrs.items())
+        print(f"DEBUG: {current.name} {seconds * 1000:.1f}ms {extras}".rstrip(), file=sys.stderr)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus():
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP agent_span_duration_seconds Duration of tool calls, API requests, Terraform phases and LLM calls.",
+        "# TYPE agent_span_duration_seconds histogram",
+    ]
+    with _registry._lock:
+        latency = {name: (h.buckets, list(h.counts), h.total, h.count) for name, h in _registry.latency.items()}
+        errors = dict(_registry.errors)
+        payload = dict(_registry.payload_bytes)
+    for name, (buckets, counts, total, count) in sorted(latency.items()):
+        label = _label(name)
+        cumulative = 0
+        for bound, n in zip(buckets, counts):
+            cumulative += n
+            lines.append(f'agent_span_duration_seconds_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'agent_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {count}')
+        lines.append(f'agent_span_duration_seconds_sum{{span="{label}"}} {total:.6f}')
+        lines.append(f'agent_span_duration_seconds_count{{span="{label}"}} {count}')
+    lines += ["# HELP agent_span_errors_total Spans that ended in an error.", "# TYPE agent_span_errors_total counter"]
+    lines += [f'agent_span_errors_total{{span="{_label(name)}"}} {n}' for name, n in sorted(errors.items())]
+    lines += ["# HELP agent_span_payload_bytes_total Payload bytes moved by spans.", "# TYPE agent_span_payload_bytes_total counter"]
+    lines += [f'agent_span_payload_bytes_total{{span="{_label(name)}"}} {n}' for name, n in sorted(payload.items())]
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """Returns count, p50/p99 bucket bounds, errors and bytes per span name."""
+    with _registry._lock:
+        return {
+            name: {
+                "count": h.count,
+                "p50_s": h.quantile(0.5),
+                "p99_s": h.quantile(0.99),
+                "mean_s": round(h.total / h.count, 4) if h.count else None,
+                "errors": _registry.errors.get(name, 0),
+                "bytes": _registry.payload_bytes.get(name, 0),
+            }
+            for name, h in sorted(_registry.latency.items())
+        }
+
+
+def reset():
+    _registry.reset()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serves GET /metrics on a daemon thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+class LLMTelemetryCallback(BaseCallbackHandler):
+    """Records an 'llm' span per chat model call with prompt/completion sizes and token usage."""
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        if not _level:
+            return
+        prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        # Start and end callbacks may run in different contexts, so the
+        # span is not made current
+        current = Span("llm", {"bytes": prompt_chars})
+        current._begin()
+        self._runs[run_id] = current
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        current = self._runs.pop(run_id, None)
+        if current is None:
+            return
+        generations = [g for batch in response.generations for g in batch]
+        current.attrs["completion_bytes"] = sum(len(g.text or "") for g in generations)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        for key in ("prompt_tokens", "completion_tokens"):
+            if key in usage:
+                current.attrs[key] = usage[key]
+        current._finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        current = self._runs.pop(run_id, None)
+        if current is not None:
+            current._finish(type(error))
@@ -1,9 +1,56 @@
 # tools/terraform_manager.py
+import contextvars
+import fcntl
+import hashlib
+import json
+import queue
+import re
+import signal
 import subprocess
+import threading
+import time
 import os
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from tools.inventory import invalidate_all
+from tools.telemetry import span
+from tools.plan_summary import format_plan_summary, summarize_plan
 
 TERRAFORM_DIR = "terraform_workspace"
 TF_FILE_PATH = os.path.join(TERRAFORM_DIR, "main.tf")
+# Every non-default workspace gets its own directory (and state) under here
+TF_WORKSPACES_DIR = os.getenv("TF_WORKSPACES_DIR", "terraform_workspaces")
+DEFAULT_WORKSPACE = "default"
+# How many independent plans may run at the same time
+TF_MAX_PARALLEL_PLANS = int(os.getenv("TF_MAX_PARALLEL_PLANS", "4"))
+# How long to wait for a busy workspace before giving up
+TF_WORKSPACE_LOCK_TIMEOUT = float(os.getenv("TF_WORKSPACE_LOCK_TIMEOUT", "30"))
+# The plan the user approved; apply runs exactly this file
+PLAN_FILE = "tfplan"
+# Session that staged the saved plan, kept next to it so it survives restarts
+PLAN_OWNER_FILE = "tfplan.owner"
+LOCK_FILE = ".terraform.lock.hcl"
+# Written after a successful init; init is skipped while it still matches
+INIT_FINGERPRINT_FILE = os.path.join(".terraform", "init-fingerprint")
+# Providers are downloaded once here and shared by every init
+TF_PLUGIN_CACHE_DIR = os.path.expanduser(
+    os.getenv("TF_PLUGIN_CACHE_DIR", os.path.join("~", ".terraform.d", "plugin-cache"))
+)
+
+# Per-phase time limits in seconds; on expiry Terraform is interrupted cleanly
+PHASE_TIMEOUTS = {
+    "init": float(os.getenv("TF_INIT_TIMEOUT", "300")),
+    "plan": float(os.getenv("TF_PLAN_TIMEOUT", "600")),
+    "apply": float(os.getenv("TF_APPLY_TIMEOUT", "1800")),
+    "destroy": float(os.getenv("TF_DESTROY_TIMEOUT", "1800")),
+}
+# How long Terraform gets to release its state lock after SIGINT before SIGKILL
+TF_INTERRUPT_GRACE = float(os.getenv("TF_INTERRUPT_GRACE", "60"))
+# 'terraform show' only reads the saved plan, so it gets a short limit
+TF_SHOW_TIMEOUT = float(os.getenv("TF_SHOW_TIMEOUT", "120"))
+# Only the last lines of output are returned to the LLM
+TF_OUTPUT_TAIL_LINES = int(os.getenv("TF_OUTPUT_TAIL_LINES", "60"))
 
 # This file provides the Proxmox provider config
 PROVIDER_TF = """
@@ -20,51 +67,508 @@ terraform {
 provider "proxmox" {}
 """
 
-def _run_command(command: list[str]):
-    """Helper to run shell commands in the terraform directory."""
+def _terraform_env():
+    env = dict(os.environ) # Pass environment variables
+    env["TF_PLUGIN_CACHE_DIR"] = TF_PLUGIN_CACHE_DIR
+    env["TF_IN_AUTOMATION"] = "1"
+    return env
+
+# Where live Terraform output goes; the CLI just prints it
+_output_handler = print
+
+def set_output_handler(handler):
+    """Routes live Terraform output lines to handler(line) instead of stdout."""
+    global _output_handler
+    _output_handler = handler
+
+# The chat session (server mode) the current thread works for: (session id, output handler)
+_session = contextvars.ContextVar("terraform_session", default=(None, None))
+
+def bind_session(session_id: str, output_handler=None):
+    """
+    Makes Terraform calls in the current context act for one chat session:
+    plans it stages are owned by it and its live output goes to
+    output_handler (when given) instead of the process-wide handler.
+    The server calls this inside a copied context for every turn.
+    """
+    _session.set((session_id, output_handler))
+
+# How long an operation waits for its workspace; the server raises it so
+# sessions queue behind each other instead of failing
+_lock_timeout = TF_WORKSPACE_LOCK_TIMEOUT
+
+def set_lock_timeout(seconds: float):
+    global _lock_timeout
+    _lock_timeout = seconds
+
+class _Run:
+    """One running Terraform process that can be cancelled from another thread."""
+
+    def __init__(self, process):
+        self.process = process
+        self.cancel_requested = threading.Event()
+        self.interrupted_at = None
+
+    def interrupt(self):
+        # SIGINT lets Terraform stop cleanly and release its state lock
+        if self.interrupted_at is None and self.process.poll() is None:
+            self.interrupted_at = time.monotonic()
+            os.killpg(self.process.pid, signal.SIGINT)
+
+_active_runs = set()
+_active_lock = threading.Lock()
+
+def cancel_running(wait: bool = True):
+    """
+    Interrupts every running Terraform command (e.g. on Ctrl-C).
+    With wait=True, blocks until they have shut down and released their locks.
+    """
+    with _active_lock:
+        runs = list(_active_runs)
+    for run in runs:
+        run.cancel_requested.set()
+    if wait:
+        for run in runs:
+            run.process.wait()
+    return len(runs)
+
+def _stream_command(command: list[str], timeout: float = None, cwd: str = TERRAFORM_DIR):
+    """
+    Runs a command in the terraform directory and yields its output line by
+    line as it is produced. Stops it with SIGINT when `timeout` expires or it
+    is cancelled (SIGKILL only if it ignores that for TF_INTERRUPT_GRACE).
+    Finally yields a dict with the exit code and whether it was stopped.
+    """
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        bufsize=1,
+        env=_terraform_env(),
+        # Own process group: a terminal Ctrl-C must not hit Terraform twice
+        start_new_session=True
+    )
+    run = _Run(process)
+    with _active_lock:
+        _active_runs.add(run)
+
+    lines = queue.Queue()
+    def read_output():
+        for line in process.stdout:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+    threading.Thread(target=read_output, daemon=True).start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    stopped = None
     try:
-        result = subprocess.run(
-            command,
-            cwd=TERRAFORM_DIR,
-            capture_output=True,
-            text=True,
-            check=True,
-            env=os.environ # Pass environment variables
-        )
-        return {"success": True, "output": result.stdout}
-    except subprocess.CalledProcessError as e:
-        return {"success": False, "output": f"Error: {e.stderr}"}
-
-def generate_and_plan_infrastructure(hcl_code: str):
+        while True:
+            try:
+                line = lines.get(timeout=0.2)
+            except queue.Empty:
+                line = ""
+            except KeyboardInterrupt:
+                run.cancel_requested.set()
+                continue
+            if line is None:
+                break
+            if line:
+                yield line
+
+            if run.interrupted_at is None:
+                if run.cancel_requested.is_set():
+                    stopped = "cancelled"
+                    run.interrupt()
+                elif deadline and time.monotonic() > deadline:
+                    stopped = f"timed out after {timeout:.0f}s"
+                    run.interrupt()
+            elif time.monotonic() - run.interrupted_at > TF_INTERRUPT_GRACE:
+                process.kill()
+        yield {"returncode": process.wait(), "stopped": stopped}
+    finally:
+        if process.poll() is None:
+            run.interrupt()
+            process.wait()
+        with _active_lock:
+            _active_runs.discard(run)
+
+def _run_command(command: list[str], echo: bool = True, cwd: str = TERRAFORM_DIR, prefix: str = ""):
+    """
+    Helper to run shell commands in a terraform directory.
+    Output is streamed to the CLI as it arrives; only a bounded tail is
+    kept and returned.
+    """
+    phase = command[1] if len(command) > 1 else command[0]
+    tail = deque(maxlen=TF_OUTPUT_TAIL_LINES)
+    total = 0
+    size = 0
+    result = {"returncode": None, "stopped": None}
+    with span(f"terraform:{phase}", workspace=os.path.basename(os.path.abspath(cwd))) as current:
+        try:
+            for item in _stream_command(command, timeout=PHASE_TIMEOUTS.get(phase), cwd=cwd):
+                if isinstance(item, dict):
+                    result = item
+                    continue
+                total += 1
+                size += len(item) + 1
+                tail.append(item)
+                if echo:
+                    (_session.get()[1] or _output_handler)(f"{prefix}{item}")
+        except OSError as e:
+            current.set(error=type(e).__name__)
+            return {"success": False, "output": f"Error: {e}"}
+        current.set(bytes=size, lines=total, returncode=result["returncode"])
+        if result["stopped"] or result["returncode"] != 0:
+            current.set(error=result["stopped"] or f"exit {result['returncode']}")
+
+    output = "\n".join(tail)
+    if total > len(tail):
+        output = f"... ({total - len(tail)} earlier lines omitted)\n{output}"
+    if result["stopped"]:
+        return {"success": False, "output": f"Error: terraform {phase} {result['stopped']}\n{output}"}
+    if result["returncode"] != 0:
+        return {"success": False, "output": f"Error: {output}"}
+    return {"success": True, "output": output}
+
+def _capture_command(command: list[str], cwd: str = TERRAFORM_DIR):
+    """Runs a short, quiet command and returns its complete stdout."""
+    with span(f"terraform:{command[1] if len(command) > 1 else command[0]}") as current:
+        try:
+            result = subprocess.run(
+                command,
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+                check=True,
+                env=_terraform_env(),
+                timeout=TF_SHOW_TIMEOUT
+            )
+            current.set(bytes=len(result.stdout))
+            return {"success": True, "output": result.stdout}
+        except subprocess.CalledProcessError as e:
+            current.set(error=f"exit {e.returncode}")
+            return {"success": False, "output": f"Error: {e.stderr}"}
+        except (OSError, subprocess.TimeoutExpired) as e:
+            current.set(error=type(e).__name__)
+            return {"success": False, "output": f"Error: {e}"}
+
+class _FileLock:
+    """
+    Exclusive lock on a file that works across threads and processes.
+    The holder's pid and operation are written into the file so a busy
+    workspace can say who is using it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, operation: str, timeout: float):
+        deadline = time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=timeout):
+            return False
+        self._file = open(self.path, "a+")
+        while True:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    self._file.close()
+                    self._file = None
+                    self._thread_lock.release()
+                    return False
+                time.sleep(0.2)
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(json.dumps({"pid": os.getpid(), "operation": operation, "since": time.time()}))
+        self._file.flush()
+        return True
+
+    def release(self):
+        self._file.truncate(0)
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+        self._thread_lock.release()
+
+    def holder(self):
+        """Returns who holds the lock (as recorded in the file), if anyone."""
+        try:
+            with open(self.path) as f:
+                return json.loads(f.read() or "null")
+        except (OSError, ValueError):
+            return None
+
+# Terraform's plugin cache is not safe for concurrent installs
+_plugin_cache_lock = None
+
+def _plugin_cache_locked():
+    global _plugin_cache_lock
+    if _plugin_cache_lock is None:
+        os.makedirs(TF_PLUGIN_CACHE_DIR, exist_ok=True)
+        _plugin_cache_lock = _FileLock(os.path.join(TF_PLUGIN_CACHE_DIR, ".agent-init.lock"))
+    return _plugin_cache_lock
+
+class WorkspaceBusyError(Exception):
+    pass
+
+class TerraformWorkspace:
+    """
+    An isolated Terraform working directory with its own HCL, saved plan
+    and state. Operations on one workspace are serialized by its lock;
+    different workspaces run independently and share the plugin cache.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.tf_file = os.path.join(path, "main.tf")
+        self.plan_path = os.path.join(path, PLAN_FILE)
+        self.plan_owner_path = os.path.join(path, PLAN_OWNER_FILE)
+        self._lock = _FileLock(os.path.join(path, ".agent.lock"))
+
+    @property
+    def plan_owner(self):
+        """Session that staged the current plan (server mode); only it may apply it."""
+        try:
+            with open(self.plan_owner_path) as f:
+                return (json.loads(f.read() or "null") or {}).get("session")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _save_plan_owner(self, session_id):
+        with open(self.plan_owner_path, "w") as f:
+            f.write(json.dumps({"session": session_id, "since": time.time()}))
+
+    def _prefix(self):
+        return "" if self.name == DEFAULT_WORKSPACE else f"[{self.name}] "
+
+    def _run(self, command: list[str]):
+        return _run_command(command, cwd=self.path, prefix=self._prefix())
+
+    @contextmanager
+    def _locked(self, operation: str):
+        """Holds this workspace's lock for the duration of an operation."""
+        os.makedirs(self.path, exist_ok=True)
+        if not self._lock.acquire(operation, _lock_timeout):
+            holder = self._lock.holder() or {}
+            raise WorkspaceBusyError(
+                f"Workspace '{self.name}' is busy "
+                f"({holder.get('operation', 'unknown operation')} by pid {holder.get('pid', '?')})"
+            )
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def status(self):
+        """Returns whether a plan is staged and who (if anyone) holds the lock."""
+        return {
+            "name": self.name,
+            "path": self.path,
+            "plan_staged": os.path.exists(self.plan_path),
+            "plan_owner": self.plan_owner,
+            "locked_by": self._lock.holder(),
+        }
+
+    def _init_fingerprint(self):
+        """Hash of everything that decides what 'terraform init' installs."""
+        digest = hashlib.sha256(PROVIDER_TF.encode())
+        lock_path = os.path.join(self.path, LOCK_FILE)
+        if os.path.exists(lock_path):
+            with open(lock_path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def _ensure_init(self, force: bool = False):
+        """Runs 'terraform init' only when the provider setup has changed."""
+        fingerprint_path = os.path.join(self.path, INIT_FINGERPRINT_FILE)
+        if not force and os.path.exists(fingerprint_path):
+            with open(fingerprint_path) as f:
+                if f.read().strip() == self._init_fingerprint():
+                    return {"success": True, "output": "terraform init skipped (providers unchanged)"}
+
+        cache_lock = _plugin_cache_locked()
+        if not cache_lock.acquire(f"init {self.name}", PHASE_TIMEOUTS["init"]):
+            return {"success": False, "output": "Error: timed out waiting for the plugin cache"}
+        try:
+            init_result = self._run(["terraform", "init", "-input=false"])
+        finally:
+            cache_lock.release()
+        if init_result["success"]:
+            # Fingerprint after init so a freshly written lock file is included
+            with open(fingerprint_path, "w") as f:
+                f.write(self._init_fingerprint())
+        return init_result
+
+    def _discard_plan(self):
+        for path in (self.plan_path, self.plan_owner_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def plan(self, hcl_code: str):
+        """Writes the HCL, inits if needed and saves a plan. Returns the plan output."""
+        try:
+            with self._locked("plan"):
+                try:
+                    # A plan for the previous HCL must never be applied by mistake
+                    self._discard_plan()
+                    full_hcl = f"{PROVIDER_TF}\n\n{hcl_code}"
+                    with open(self.tf_file, "w") as f:
+                        f.write(full_hcl)
+                except Exception as e:
+                    return f"Error writing HCL file: {e}"
+
+                init_result = self._ensure_init()
+                if not init_result["success"]:
+                    return f"Terraform Init Failed: {init_result['output']}"
+
+                plan_command = ["terraform", "plan", "-input=false", f"-out={PLAN_FILE}"]
+                plan_result = self._run(plan_command)
+                if not plan_result["success"] and "terraform init" in plan_result["output"]:
+                    # The HCL needs something init has not installed yet (e.g. a module)
+                    init_result = self._ensure_init(force=True)
+                    if not init_result["success"]:
+                        return f"Terraform Init Failed: {init_result['output']}"
+                    plan_result = self._run(plan_command)
+                if not plan_result["success"]:
+                    return f"Terraform Plan:\n{plan_result['output']}"
+                self._save_plan_owner(_session.get()[0])
+
+                # The operator has seen the full plan stream by; the LLM gets a compact diff
+                summary = self._summarize_saved_plan()
+                if summary is None:
+                    return f"Terraform Plan:\n{plan_result['output']}"
+                return (
+                    f"Terraform Plan Summary (workspace '{self.name}'):\n{summary}\n"
+                    f"(The full plan is available with show_full_terraform_plan.)"
+                )
+        except WorkspaceBusyError as e:
+            return f"Terraform Plan: {e}"
+
+    def _summarize_saved_plan(self):
+        show_result = _capture_command(["terraform", "show", "-json", PLAN_FILE], cwd=self.path)
+        if not show_result["success"]:
+            return None
+        try:
+            return format_plan_summary(summarize_plan(json.loads(show_result["output"])))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"❌ Could not summarize plan: {type(e).__name__}: {str(e)}")
+            return None
+
+    def full_plan(self):
+        """Returns the complete human-readable text of the saved plan."""
+        try:
+            with self._locked("show"):
+                if not os.path.exists(self.plan_path):
+                    return "No saved plan found. Run a plan first."
+                show_result = _capture_command(["terraform", "show", "-no-color", PLAN_FILE], cwd=self.path)
+                return show_result["output"]
+        except WorkspaceBusyError as e:
+            return str(e)
+
+    def apply(self):
+        """Applies the saved plan of this workspace."""
+        try:
+            with self._locked("apply"):
+                if not os.path.exists(self.plan_path):
+                    return "Terraform Apply: No saved plan found. Run a plan first and get it approved."
+                if self.plan_owner not in (None, _session.get()[0]):
+                    # Another session's user approved nothing here; never apply their plan
+                    return (
+                        f"Terraform Apply: The staged plan in workspace '{self.name}' belongs to another "
+                        f"session. Plan the change again (or use a separate workspace) and get it approved."
+                    )
+
+                apply_result = self._run(["terraform", "apply", "-input=false", PLAN_FILE])
+                # A saved plan can only be applied once
+                self._discard_plan()
+                # Even a failed apply may have changed the cluster
+                invalidate_all()
+                return f"Terraform Apply:\n{apply_result['output']}"
+        except WorkspaceBusyError as e:
+            return f"Terraform Apply: {e}"
+
+    def destroy(self):
+        """Destroys everything managed by this workspace."""
+        try:
+            with self._locked("destroy"):
+                destroy_result = self._run(["terraform", "destroy", "-input=false", "-auto-approve"])
+                self._discard_plan()
+                invalidate_all()
+                return f"Terraform Destroy:\n{destroy_result['output']}"
+        except WorkspaceBusyError as e:
+            return f"Terraform Destroy: {e}"
+
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+def get_workspace(name: str = DEFAULT_WORKSPACE):
+    """
+    Returns the workspace with this name, creating it on first use.
+    'default' is the original terraform_workspace directory.
+    """
+    name = name or DEFAULT_WORKSPACE
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", name):
+        raise ValueError(f"Invalid workspace name: {name!r} (use letters, digits, '-' and '_')")
+    with _workspaces_lock:
+        if name not in _workspaces:
+            path = TERRAFORM_DIR if name == DEFAULT_WORKSPACE else os.path.join(TF_WORKSPACES_DIR, name)
+            _workspaces[name] = TerraformWorkspace(name, path)
+        return _workspaces[name]
+
+def list_workspaces():
+    """Returns the status of every workspace on disk."""
+    names = {DEFAULT_WORKSPACE} | set(_workspaces)
+    if os.path.isdir(TF_WORKSPACES_DIR):
+        names |= {n for n in os.listdir(TF_WORKSPACES_DIR) if os.path.isdir(os.path.join(TF_WORKSPACES_DIR, n))}
+    return [get_workspace(n).status() for n in sorted(names)]
+
+def plan_many(changes: dict, max_parallel: int = None):
+    """
+    Plans several independent change sets at once, one workspace each.
+    `changes` maps workspace name to HCL. Returns workspace name -> plan output.
+    The heavy lifting happens in Terraform child processes, so a small
+    thread pool capped at TF_MAX_PARALLEL_PLANS is enough to run them in parallel.
+    """
+    if not changes:
+        return {}
+    workspaces = {name: get_workspace(name) for name in changes}
+    workers = max(1, min(max_parallel or TF_MAX_PARALLEL_PLANS, len(changes)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each plan runs in a copy of the caller's context, so it is owned by the caller's session
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, workspaces[name].plan, hcl)
+            for name, hcl in changes.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+def generate_and_plan_infrastructure(hcl_code: str, workspace: str = DEFAULT_WORKSPACE):
     """
     Takes a string of Terraform HCL code, writes it to main.tf,
-    runs 'terraform init' and 'terraform plan'.
+    runs 'terraform init' (only if the providers changed) and
+    'terraform plan', saving the plan so apply runs exactly it.
     Returns the plan output or an error.
     This is the main tool for creating or updating infrastructure.
     """
-    try:
-        full_hcl = f"{PROVIDER_TF}\n\n{hcl_code}"
-        with open(TF_FILE_PATH, "w") as f:
-            f.write(full_hcl)
-    except Exception as e:
-        return f"Error writing HCL file: {e}"
-
-    init_result = _run_command(["terraform", "init"])
-    if not init_result["success"]:
-        return f"Terraform Init Failed: {init_result['output']}"
+    return get_workspace(workspace).plan(hcl_code)
 
-    plan_result = _run_command(["terraform", "plan"])
-    return f"Terraform Plan:\n{plan_result['output']}"
-
-def apply_infrastructure_plan():
+def apply_infrastructure_plan(workspace: str = DEFAULT_WORKSPACE):
     """
     Applies the currently staged terraform plan.
     Should only be called after user confirms the plan.
     """
-    apply_result = _run_command(["terraform", "apply", "-auto-approve"])
-    return f"Terraform Apply:\n{apply_result['output']}"
+    return get_workspace(workspace).apply()
+
+def show_full_plan(workspace: str = DEFAULT_WORKSPACE):
+    """Returns the full text of the saved plan (plans only return a summary)."""
+    return get_workspace(workspace).full_plan()
 
-def destroy_infrastructure():
+def destroy_infrastructure(workspace: str = DEFAULT_WORKSPACE):
     """Destroys all infrastructure defined in main.tf."""
-    destroy_result = _run_command(["terraform", "destroy", "-auto-approve"])
-    return f"Terraform Destroy:\n{destroy_result['output']}"
+    return get_workspace(workspace).destroy()